@@ -0,0 +1,250 @@
+'''
+Headless flight log analysis, no GUI involved.
+Every log is decoded at full speed by the same UASInterface handlers used
+by the GCS, one log per worker process. The messages are routed to one
+UASInterface per vehicle as in the GCS, and each vehicle of a log is
+summarized as one row of a CSV table. Battery curves can also be written,
+one CSV file per vehicle of a log.
+
+Usage: python analyze.py LOG|DIR [LOG|DIR ...] [-o summary.csv] [-j JOBS] [--curves DIR] [--dialect ardupilotmega]
+'''
+import argparse
+import csv
+import math
+import os
+import sys
+from multiprocessing import Pool
+
+from chunkedlog import CHUNKED_LOG_EXTENSION, openLogFile
+from vehiclestate import STATE_AIR, STATE_BATTERY, STATE_GPS, STATE_POSITION
+
+LOG_EXTENSIONS = ('.bin', '.tlog', CHUNKED_LOG_EXTENSION)
+DEFAULT_DIALECT = 'ardupilotmega'
+BATTERY_CURVE_INTERVAL = 1.0 # seconds of log time between battery curve samples
+GPS_3D_FIX = 3
+
+SUMMARY_FIELDS = ['log', 'vehicle', 'messages', 'bad_data', 'autopilot', 'start_time', 'duration',
+                  'max_gps_altitude', 'max_pressure_altitude', 'max_ground_speed',
+                  'battery_start_voltage', 'battery_min_voltage', 'battery_max_current',
+                  'battery_start_remaining', 'battery_end_remaining',
+                  'gps_fix_dropouts', 'gps_no_fix_time', 'error']
+BATTERY_CURVE_FIELDS = ['time', 'voltage', 'current', 'remaining']
+
+class FlightSummary:
+    '''Collect summary values from the state changes of a UASInterface'''
+
+    def __init__(self, logName, vehicle = '', autopilot = ''):
+        self.row = {key : '' for key in SUMMARY_FIELDS}
+        self.row['log'] = logName
+        self.row['vehicle'] = vehicle
+        self.row['autopilot'] = autopilot
+        self.messages = 0
+        self.badData = 0
+        self.startTime = None
+        self.logTime = 0.0
+        self.maxGPSAltitude = None
+        self.maxPressureAltitude = None
+        self.maxGroundSpeed = None
+        self.batteryStart = None # (voltage, remaining)
+        self.batteryMinVoltage = None
+        self.batteryMaxCurrent = None
+        self.batteryRemaining = None
+        self.batteryCurve = []
+        self.gpsFix = None
+        self.gpsFixDropouts = 0
+        self.gpsNoFixSince = None
+        self.gpsNoFixTime = 0.0
+
+    def connectUAS(self, uas):
+        uas.stateChangedSignal.connect(self.updateState)
+
+    def countMessage(self, timestamp):
+        self.messages += 1
+        self.logTime = timestamp
+        if self.startTime == None:
+            self.startTime = timestamp
+
+    def updateState(self, uas, changed):
+        state = uas.state
+        if changed & STATE_POSITION:
+            self.updatePosition(state.position)
+        if changed & STATE_AIR:
+            self.updatePressureAltitude(state.air.altitude)
+        if changed & STATE_BATTERY:
+            battery = state.battery
+            self.updateBattery(battery.voltage, battery.current, battery.percent)
+        if changed & STATE_GPS:
+            self.updateGPSStatus(state.gps.fixType)
+
+    def updatePosition(self, position):
+        altitude, speed = position.altitude, position.groundSpeed
+        self.maxGPSAltitude = altitude if self.maxGPSAltitude == None else max(self.maxGPSAltitude, altitude)
+        if math.isnan(speed) == False:
+            self.maxGroundSpeed = speed if self.maxGroundSpeed == None else max(self.maxGroundSpeed, speed)
+
+    def updatePressureAltitude(self, altitude):
+        self.maxPressureAltitude = altitude if self.maxPressureAltitude == None else max(self.maxPressureAltitude, altitude)
+
+    def updateBattery(self, voltage, current, remaining):
+        if self.batteryStart == None:
+            self.batteryStart = (voltage, remaining)
+        self.batteryMinVoltage = voltage if self.batteryMinVoltage == None else min(self.batteryMinVoltage, voltage)
+        self.batteryMaxCurrent = current if self.batteryMaxCurrent == None else max(self.batteryMaxCurrent, current)
+        self.batteryRemaining = remaining
+        t = self.logTime - self.startTime
+        if len(self.batteryCurve) == 0 or t - self.batteryCurve[-1][0] >= BATTERY_CURVE_INTERVAL:
+            self.batteryCurve.append((round(t, 3), voltage, current, remaining))
+
+    def updateGPSStatus(self, fixType):
+        if fixType >= GPS_3D_FIX:
+            if self.gpsNoFixSince != None:
+                self.gpsNoFixTime += self.logTime - self.gpsNoFixSince
+                self.gpsNoFixSince = None
+        elif self.gpsNoFixSince == None:
+            if self.gpsFix != None and self.gpsFix >= GPS_3D_FIX:
+                self.gpsFixDropouts += 1
+            self.gpsNoFixSince = self.logTime
+        self.gpsFix = fixType
+
+    def finish(self):
+        if self.gpsNoFixSince != None:
+            self.gpsNoFixTime += self.logTime - self.gpsNoFixSince
+        self.row['messages'] = self.messages
+        self.row['bad_data'] = self.badData
+        if self.startTime != None:
+            self.row['start_time'] = round(self.startTime, 3)
+            self.row['duration'] = round(self.logTime - self.startTime, 3)
+        self.row['max_gps_altitude'] = self.maxGPSAltitude
+        self.row['max_pressure_altitude'] = self.maxPressureAltitude
+        self.row['max_ground_speed'] = self.maxGroundSpeed
+        if self.batteryStart != None:
+            self.row['battery_start_voltage'], self.row['battery_start_remaining'] = self.batteryStart
+            self.row['battery_min_voltage'] = self.batteryMinVoltage
+            self.row['battery_max_current'] = self.batteryMaxCurrent
+            self.row['battery_end_remaining'] = self.batteryRemaining
+        self.row['gps_fix_dropouts'] = self.gpsFixDropouts
+        self.row['gps_no_fix_time'] = round(self.gpsNoFixTime, 3)
+        return self.row
+
+def analyzeLog(task):
+    '''
+    Decode one log and return a (summary row, battery curve) per vehicle,
+    a single row for a log without any vehicle. Runs in a worker process.
+    '''
+    fileName, logName, dialect = task
+    logSummary = FlightSummary(logName) # the whole log
+    summaries = {} # (sysid, compid) -> FlightSummary
+    try:
+        from pymavlink import mavutil
+        from uas import UASRegistry
+        from UserData import UserData
+        ud = UserData.getInstance()
+        try:
+            ud.loadGCSConfiguration()
+        except (IOError, ValueError):
+            ud.userData = {}
+        mavutil.set_dialect(dialect)
+        log = openLogFile(fileName)
+        vehicles = UASRegistry()
+        while True:
+            msg = log.recv_msg()
+            if msg == None:
+                break
+            tp = msg.get_type()
+            if tp == 'BAD_DATA':
+                logSummary.badData += 1
+                continue
+            logSummary.countMessage(msg._timestamp)
+            uas = vehicles.routes.get((msg.get_srcSystem(), msg.get_srcComponent()))
+            if uas == None:
+                uas = vehicles.route(msg)
+                if uas == None:
+                    continue  # no HEARTBEAT from this system yet, or a GCS
+            key = (uas.systemId, uas.componentId)
+            summary = summaries.get(key)
+            if summary == None:
+                # msg is the HEARTBEAT the vehicle was created from
+                summary = FlightSummary(logName, '{}:{}'.format(*key), msg.autopilot)
+                summary.connectUAS(uas)
+                summaries[key] = summary
+            summary.countMessage(msg._timestamp)
+            if tp in uas.messageHandlers:
+                uas.messageHandlers[tp](uas, msg)
+                uas.notifyStateChanged() # every value counts, not only the latest of a tick
+        log.close()
+    except Exception as e:
+        logSummary.row['error'] = '{}: {}'.format(type(e).__name__, e)
+    if len(summaries) == 0:
+        return [(logSummary.finish(), logSummary.batteryCurve)]
+    results = []
+    for key in sorted(summaries):
+        summary = summaries[key]
+        summary.badData = logSummary.badData # not attributable to a vehicle
+        summary.row['error'] = logSummary.row['error']
+        results.append((summary.finish(), summary.batteryCurve))
+    return results
+
+def findLogFiles(paths):
+    '''Return (file, name) of the logs, named by their path below the folder they were found in'''
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, names in os.walk(path):
+                dirs.sort()
+                files += [(os.path.join(root, n), os.path.relpath(os.path.join(root, n), path))
+                          for n in sorted(names) if n.endswith(LOG_EXTENSIONS)]
+        else:
+            files.append((path, os.path.basename(path)))
+    return files
+
+def curveFileName(row, usedNames):
+    '''Battery curve file of a summary row, from the log path with its extension and the vehicle'''
+    name = row['log'].replace(os.sep, '_')
+    if row['vehicle'] != '':
+        name += '_' + row['vehicle'].replace(':', '-')
+    unique = name
+    n = 1
+    while unique in usedNames:
+        n += 1
+        unique = '{}_{}'.format(name, n)
+    if unique != name:
+        print('Battery curve of {} written as {}_battery.csv, the name is taken'.format(row['log'], unique))
+    usedNames.add(unique)
+    return unique + '_battery.csv'
+
+def main(argv):
+    parser = argparse.ArgumentParser(description = 'Headless flight log analysis')
+    parser.add_argument('logs', nargs = '+', help = 'log files or folders of logs')
+    parser.add_argument('-o', '--output', default = 'summary.csv', help = 'summary table, one row per vehicle of each log')
+    parser.add_argument('-j', '--jobs', type = int, default = os.cpu_count(), help = 'number of worker processes')
+    parser.add_argument('--curves', help = 'folder to write the battery curve of each log to')
+    parser.add_argument('--dialect', default = DEFAULT_DIALECT)
+    args = parser.parse_args(argv)
+    files = findLogFiles(args.logs)
+    if len(files) == 0:
+        print('No log files found')
+        return 1
+    if args.curves != None:
+        os.makedirs(args.curves, exist_ok = True)
+    rows = []
+    curveNames = set()
+    with Pool(processes = max(1, min(args.jobs, len(files)))) as pool:
+        for results in pool.imap_unordered(analyzeLog, [(f, name, args.dialect) for f, name in files]):
+            for row, curve in results:
+                rows.append(row)
+                print('{} {} {} messages{}'.format(row['log'], row['vehicle'], row['messages'], ' ' + row['error'] if row['error'] else ''))
+                if args.curves != None and len(curve) > 0:
+                    with open(os.path.join(args.curves, curveFileName(row, curveNames)), 'w', newline = '') as f:
+                        writer = csv.writer(f)
+                        writer.writerow(BATTERY_CURVE_FIELDS)
+                        writer.writerows(curve)
+    rows.sort(key = lambda row: (row['log'], row['vehicle']))
+    with open(args.output, 'w', newline = '') as f:
+        writer = csv.DictWriter(f, fieldnames = SUMMARY_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    print('{} logs summarized in {} rows of {}'.format(len(files), len(rows), args.output))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
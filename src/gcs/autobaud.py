@@ -0,0 +1,99 @@
+'''
+Serial baud rate detection by sampling. The port is opened once and
+switched from rate to rate, each rate listens for a short window and the
+bytes received are scored by the number of MAVLink frames with a valid
+CRC. Rates are tried in the order of their past success on the same port,
+then the common telemetry radio rates, and detection stops at the first
+confident match instead of waiting for a heartbeat at every rate.
+'''
+from time import monotonic
+
+import serial
+from pymavlink.dialects.v20 import common as mavlink2
+
+AUTOBAUD_SAMPLE_TIME = 0.3 # seconds of listening per rate
+AUTOBAUD_READ_TIMEOUT = 0.02 # seconds, single read of the sampling loop
+AUTOBAUD_CONFIDENT_FRAMES = 2 # valid frames ending the detection early
+COMMON_BAUD_RATES = (57600, 115200, 921600, 230400, 38400, 19200, 9600)
+MAVLINK_MARKERS = (0xFE, 0xFD) # start of frame, MAVLink 1 and 2
+
+class SampleScore:
+    '''What was received at one baud rate'''
+
+    __slots__ = ('baud', 'bytes', 'frames', 'badData', 'markers')
+
+    def __init__(self, baud):
+        self.baud = baud
+        self.bytes = 0
+        self.frames = 0
+        self.badData = 0
+        self.markers = 0
+
+    def isConfident(self):
+        return self.frames >= AUTOBAUD_CONFIDENT_FRAMES or (self.frames > 0 and self.badData == 0)
+
+    def rank(self):
+        return (self.frames, self.markers / self.bytes if self.bytes > 0 else 0.0)
+
+def orderBaudRates(candidates, history = None):
+    '''
+    Return `candidates` sorted by the number of past successes in `history`
+    ({baud as string : count}), then common rates first, then fastest first.
+    '''
+    history = {} if history == None else history
+    def key(baud):
+        common = COMMON_BAUD_RATES.index(baud) if baud in COMMON_BAUD_RATES else len(COMMON_BAUD_RATES)
+        return (-history.get(str(baud), 0), common, -baud)
+    return sorted(candidates, key = key)
+
+class BaudRateDetector:
+    '''Find the baud rate of a MAVLink stream on `port`'''
+
+    def __init__(self, port, candidates, history = None, sampleTime = AUTOBAUD_SAMPLE_TIME):
+        self.port = port
+        self.candidates = orderBaudRates(candidates, history)
+        self.sampleTime = sampleTime
+        self.scores = []
+
+    def detect(self, progress = None):
+        '''
+        Return the detected baud rate, or None if no frame was received
+        at any rate. `progress(baud)` is called before each rate is tried.
+        '''
+        self.scores = []
+        port = serial.Serial(self.port, self.candidates[0], timeout = AUTOBAUD_READ_TIMEOUT)
+        try:
+            for baud in self.candidates:
+                if progress != None:
+                    progress(baud)
+                port.baudrate = baud
+                port.reset_input_buffer() # drop what was received at the previous rate
+                score = self.__sample(port, baud)
+                self.scores.append(score)
+                if score.isConfident():
+                    return baud
+        finally:
+            port.close()
+        best = max(self.scores, key = SampleScore.rank, default = None)
+        return best.baud if best != None and best.frames > 0 else None
+
+    def __sample(self, port, baud):
+        score = SampleScore(baud)
+        parser = mavlink2.MAVLink(None)
+        parser.robust_parsing = True
+        end = monotonic() + self.sampleTime
+        while monotonic() < end:
+            data = port.read(max(1, port.in_waiting))
+            if len(data) == 0:
+                continue
+            score.bytes += len(data)
+            score.markers += sum(data.count(m) for m in MAVLINK_MARKERS)
+            for msg in parser.parse_buffer(data) or []:
+                # messages unknown to the dialect are returned without a CRC check
+                if msg.get_type() != 'BAD_DATA' and msg.get_msgId() in mavlink2.mavlink_map:
+                    score.frames += 1
+                else:
+                    score.badData += 1
+            if score.isConfident():
+                break
+        return score
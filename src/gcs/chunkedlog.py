@@ -0,0 +1,457 @@
+'''
+Compressed, chunked telemetry log format.
+
+A plain tlog (MAV_<ts>.bin) is a sequence of records, each one a big endian
+64 bit timestamp in microseconds followed by a raw MAVLink frame. A chunked
+log stores the same byte stream split into independently compressed chunks:
+
+    file header   magic, version, codec
+    chunk         chunk header (sizes, record count, first/last timestamp) + compressed records
+    ...
+    footer        one index entry per chunk (offset, sizes, timestamps, message ids)
+    trailer       footer offset, magic
+
+The footer lets readers jump to a timestamp or to the chunks containing a
+message type without decompressing the whole file. Chunk headers are self
+describing, so a log missing its footer (e.g. after a crash) is recovered by
+scanning the chunks. Decompressing all chunks in order gives back the
+original tlog byte for byte.
+
+Usage: python chunkedlog.py compress MAV_<ts>.bin [MAV_<ts>.tlz] [--codec zstd|lz4|zlib]
+       python chunkedlog.py decompress MAV_<ts>.tlz [MAV_<ts>.bin]
+       python chunkedlog.py info MAV_<ts>.tlz
+'''
+import argparse
+import logging
+import os
+import struct
+import sys
+import zlib
+from bisect import bisect_right
+from collections import namedtuple
+from time import monotonic
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import lz4.frame as lz4frame
+except ImportError:
+    lz4frame = None
+
+CHUNKED_LOG_EXTENSION = '.tlz'
+DEFAULT_CHUNK_SIZE = 1024 * 1024 # uncompressed bytes per chunk
+DEFAULT_CHUNK_MAX_AGE = 60.0 # seconds before a partial chunk is written anyway, 0 to disable
+
+FILE_MAGIC = b'MGCSTLZ1'
+FILE_HEADER = struct.Struct('<8sBBH') # magic, version, codec, reserved
+FILE_VERSION = 1
+CHUNK_MAGIC = b'CHNK'
+CHUNK_HEADER = struct.Struct('<4sIIIQQ') # magic, compressed size, raw size, records, first ts, last ts
+INDEX_ENTRY = struct.Struct('<QIIIQQI') # offset, compressed size, raw size, records, first ts, last ts, number of message ids
+MSG_ID = struct.Struct('<I')
+TRAILER_MAGIC = b'MGCSIDX1'
+TRAILER = struct.Struct('<Q8s') # footer offset, magic
+
+# plain logging here, this module is also used by the Qt free export tools
+logger = logging.getLogger('gcs.chunkedlog')
+
+TIMESTAMP = struct.Struct('>Q')
+MAVLINK_V1_MARKER = 0xFE
+MAVLINK_V2_MARKER = 0xFD
+MAVLINK_IFLAG_SIGNED = 0x01
+MAVLINK_SIGNATURE_LEN = 13
+
+CODEC_NONE = 0
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+CODEC_LZ4 = 3
+CODEC_NAMES = {
+    'none' : CODEC_NONE,
+    'zlib' : CODEC_ZLIB,
+    'zstd' : CODEC_ZSTD,
+    'lz4' : CODEC_LZ4
+}
+
+ChunkInfo = namedtuple('ChunkInfo', 'offset compressedSize rawSize records firstTimestamp lastTimestamp msgIds rawOffset')
+
+class ChunkedLogError(Exception):
+    pass
+
+def availableCodec(preferred = None):
+    '''
+    Return the codec id to use, `preferred` is a name from CODEC_NAMES.
+    Falls back to zstd, lz4 then zlib, depending on the installed modules.
+    '''
+    codec = CODEC_NAMES.get(preferred, None)
+    if codec == CODEC_ZSTD and zstandard != None or codec == CODEC_LZ4 and lz4frame != None \
+       or codec in (CODEC_ZLIB, CODEC_NONE):
+        return codec
+    if zstandard != None:
+        return CODEC_ZSTD
+    if lz4frame != None:
+        return CODEC_LZ4
+    return CODEC_ZLIB
+
+def compressChunk(codec, data):
+    if codec == CODEC_ZSTD:
+        return zstandard.ZstdCompressor(level = 3).compress(data)
+    if codec == CODEC_LZ4:
+        return lz4frame.compress(data)
+    if codec == CODEC_ZLIB:
+        return zlib.compress(data, 6)
+    return bytes(data)
+
+def decompressChunk(codec, data, rawSize):
+    if codec == CODEC_ZSTD:
+        if zstandard == None:
+            raise ChunkedLogError('zstandard module is required to read this log')
+        return zstandard.ZstdDecompressor().decompress(data, max_output_size = rawSize)
+    if codec == CODEC_LZ4:
+        if lz4frame == None:
+            raise ChunkedLogError('lz4 module is required to read this log')
+        return lz4frame.decompress(data)
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(data)
+    return data
+
+def scanRecords(data, start = 0):
+    '''
+    Iterate over the tlog records in `data`, yields (offset, timestamp, msgId, length).
+    Stops at the first byte that does not start a MAVLink frame.
+    '''
+    pos = start
+    end = len(data)
+    while pos + TIMESTAMP.size + 2 <= end:
+        ts = TIMESTAMP.unpack_from(data, pos)[0]
+        frame = pos + TIMESTAMP.size
+        marker = data[frame]
+        payloadLen = data[frame + 1]
+        if marker == MAVLINK_V1_MARKER:
+            if frame + 6 > end:
+                return
+            msgId = data[frame + 5]
+            length = 6 + payloadLen + 2
+        elif marker == MAVLINK_V2_MARKER:
+            if frame + 10 > end:
+                return
+            msgId = data[frame + 7] | data[frame + 8] << 8 | data[frame + 9] << 16
+            length = 10 + payloadLen + 2
+            if data[frame + 2] & MAVLINK_IFLAG_SIGNED:
+                length += MAVLINK_SIGNATURE_LEN
+        else:
+            return
+        length += TIMESTAMP.size
+        if pos + length > end:
+            return
+        yield pos, ts, msgId, length
+        pos += length
+
+def isChunkedLog(fileName):
+    try:
+        with open(fileName, 'rb') as f:
+            return f.read(len(FILE_MAGIC)) == FILE_MAGIC
+    except OSError:
+        return False
+
+def openLogFile(fileName):
+    '''Open a plain or chunked log for reading as a pymavlink mavlogfile'''
+    from pymavlink import mavutil
+    log = mavutil.mavlogfile(fileName)
+    if isChunkedLog(fileName):
+        log.f.close()
+        log.f = ChunkedLogStream(fileName)
+        log.filesize = log.f.size
+    return log
+
+class ChunkedLogFile:
+    '''
+    Write only file object producing a chunked log. Accepts whole tlog
+    records, as written by TLogWriter, and can be used as its log file.
+    A chunk is written once `chunkSize` bytes are pending, or when its
+    first record is older than `maxAge` seconds, which bounds the data
+    lost on a crash for slow links. flush() leaves the pending chunk alone.
+    '''
+
+    def __init__(self, fileName, codec = None, chunkSize = DEFAULT_CHUNK_SIZE, maxAge = DEFAULT_CHUNK_MAX_AGE):
+        self.fileName = fileName
+        self.codec = availableCodec(codec)
+        self.chunkSize = chunkSize
+        self.maxAge = maxAge
+        self.chunkStarted = 0.0 # monotonic time of the first pending write
+        self.f = open(fileName, 'wb')
+        self.f.write(FILE_HEADER.pack(FILE_MAGIC, FILE_VERSION, self.codec, 0))
+        self.index = []
+        self.pending = bytearray()
+        self.scanned = 0 # bytes of pending already scanned for the index
+        self.records = 0
+        self.firstTimestamp = None
+        self.lastTimestamp = 0
+        self.msgIds = set()
+        self.closed = False
+
+    def write(self, data):
+        if len(self.pending) == 0:
+            self.chunkStarted = monotonic()
+        self.pending += data
+        for pos, ts, msgId, length in scanRecords(self.pending, self.scanned):
+            if self.firstTimestamp == None:
+                self.firstTimestamp = ts
+            self.lastTimestamp = ts
+            self.msgIds.add(msgId)
+            self.records += 1
+            self.scanned = pos + length
+        if len(self.pending) >= self.chunkSize \
+           or self.maxAge > 0 and monotonic() - self.chunkStarted >= self.maxAge:
+            self.__writeChunk()
+        return len(data)
+
+    def __writeChunk(self):
+        if len(self.pending) == 0:
+            return
+        payload = compressChunk(self.codec, self.pending)
+        firstTs = 0 if self.firstTimestamp == None else self.firstTimestamp
+        offset = self.f.tell()
+        self.f.write(CHUNK_HEADER.pack(CHUNK_MAGIC, len(payload), len(self.pending), self.records, firstTs, self.lastTimestamp))
+        self.f.write(payload)
+        self.f.flush()
+        self.index.append((offset, len(payload), len(self.pending), self.records, firstTs, self.lastTimestamp, sorted(self.msgIds)))
+        self.pending = bytearray()
+        self.scanned = 0
+        self.records = 0
+        self.firstTimestamp = None
+        self.msgIds = set()
+
+    def flush(self):
+        '''Flush the chunks written so far, the pending chunk is kept to reach its size'''
+        self.f.flush()
+
+    def fileno(self):
+        return self.f.fileno()
+
+    def close(self):
+        if self.closed:
+            return
+        self.__writeChunk()
+        footerOffset = self.f.tell()
+        for offset, compressedSize, rawSize, records, firstTs, lastTs, msgIds in self.index:
+            self.f.write(INDEX_ENTRY.pack(offset, compressedSize, rawSize, records, firstTs, lastTs, len(msgIds)))
+            for msgId in msgIds:
+                self.f.write(MSG_ID.pack(msgId))
+        self.f.write(TRAILER.pack(footerOffset, TRAILER_MAGIC))
+        self.f.close()
+        self.closed = True
+
+class ChunkedLogReader:
+    '''Random access to the chunks of a chunked log through its index'''
+
+    def __init__(self, fileName):
+        self.fileName = fileName
+        self.f = open(fileName, 'rb')
+        magic, version, self.codec, _ = FILE_HEADER.unpack(self.f.read(FILE_HEADER.size))
+        if magic != FILE_MAGIC or version != FILE_VERSION:
+            self.f.close()
+            raise ChunkedLogError('Not a chunked log file: {}'.format(fileName))
+        self.chunks = self.__loadIndex()
+        if self.__indexComplete == False:
+            logger.warning('Chunked log index missing, scanned %d chunks: %s', len(self.chunks), fileName)
+        self.rawSize = 0 if len(self.chunks) == 0 else self.chunks[-1].rawOffset + self.chunks[-1].rawSize
+        self.chunkTimestamps = [c.firstTimestamp for c in self.chunks]
+        self.chunkRawOffsets = [c.rawOffset for c in self.chunks]
+
+    def __loadIndex(self):
+        self.__indexComplete = False
+        fileSize = os.fstat(self.f.fileno()).st_size
+        entries = []
+        if fileSize >= FILE_HEADER.size + TRAILER.size:
+            self.f.seek(fileSize - TRAILER.size)
+            footerOffset, magic = TRAILER.unpack(self.f.read(TRAILER.size))
+            if magic == TRAILER_MAGIC and FILE_HEADER.size <= footerOffset < fileSize:
+                self.f.seek(footerOffset)
+                footer = self.f.read(fileSize - TRAILER.size - footerOffset)
+                pos = 0
+                while pos + INDEX_ENTRY.size <= len(footer):
+                    entry = INDEX_ENTRY.unpack_from(footer, pos)
+                    pos += INDEX_ENTRY.size
+                    msgIds = [MSG_ID.unpack_from(footer, pos + i * MSG_ID.size)[0] for i in range(entry[6])]
+                    pos += entry[6] * MSG_ID.size
+                    entries.append(entry[:6] + (frozenset(msgIds),))
+                self.__indexComplete = True
+        if self.__indexComplete == False:
+            entries = self.__scanChunks(fileSize)
+        chunks = []
+        rawOffset = 0
+        for entry in entries:
+            chunks.append(ChunkInfo(*entry, rawOffset))
+            rawOffset += entry[2]
+        return chunks
+
+    def __scanChunks(self, fileSize):
+        '''Rebuild the index from the chunk headers, message ids are read from the records'''
+        entries = []
+        offset = FILE_HEADER.size
+        while offset + CHUNK_HEADER.size <= fileSize:
+            self.f.seek(offset)
+            magic, compressedSize, rawSize, records, firstTs, lastTs = CHUNK_HEADER.unpack(self.f.read(CHUNK_HEADER.size))
+            if magic != CHUNK_MAGIC or offset + CHUNK_HEADER.size + compressedSize > fileSize:
+                break # truncated
+            raw = decompressChunk(self.codec, self.f.read(compressedSize), rawSize)
+            msgIds = frozenset(msgId for _, _, msgId, _ in scanRecords(raw))
+            entries.append((offset, compressedSize, rawSize, records, firstTs, lastTs, msgIds))
+            offset += CHUNK_HEADER.size + compressedSize
+        return entries
+
+    def readChunk(self, i):
+        chunk = self.chunks[i]
+        self.f.seek(chunk.offset + CHUNK_HEADER.size)
+        return decompressChunk(self.codec, self.f.read(chunk.compressedSize), chunk.rawSize)
+
+    def findChunk(self, timestamp):
+        '''Index of the chunk holding the records at `timestamp` (microseconds)'''
+        return max(0, bisect_right(self.chunkTimestamps, timestamp) - 1)
+
+    def findChunkAt(self, rawOffset):
+        '''Index of the chunk holding byte `rawOffset` of the uncompressed stream'''
+        return max(0, bisect_right(self.chunkRawOffsets, rawOffset) - 1)
+
+    def chunksWithMessage(self, msgId):
+        return [i for i, c in enumerate(self.chunks) if msgId in c.msgIds]
+
+    def records(self, msgIds = None, startTimestamp = 0):
+        '''
+        Iterate over (timestamp, frame) from `startTimestamp` on, skipping
+        the chunks without any of `msgIds` when it is given.
+        '''
+        wanted = None if msgIds == None else set(msgIds)
+        for i in range(self.findChunk(startTimestamp), len(self.chunks)):
+            chunk = self.chunks[i]
+            if chunk.lastTimestamp < startTimestamp or (wanted != None and wanted.isdisjoint(chunk.msgIds)):
+                continue
+            raw = self.readChunk(i)
+            for pos, ts, msgId, length in scanRecords(raw):
+                if ts >= startTimestamp and (wanted == None or msgId in wanted):
+                    yield ts, raw[pos + TIMESTAMP.size : pos + length]
+
+    def close(self):
+        self.f.close()
+
+class ChunkedLogStream:
+    '''
+    Read only, seekable file object over the uncompressed record stream,
+    a drop in replacement of the plain tlog file used by mavlogfile.
+    '''
+
+    def __init__(self, fileName):
+        self.reader = ChunkedLogReader(fileName)
+        self.size = self.reader.rawSize
+        self.pos = 0
+        self.chunkIndex = -1
+        self.chunkData = b''
+        self.closed = False
+
+    def __load(self, i):
+        if i != self.chunkIndex:
+            self.chunkData = self.reader.readChunk(i)
+            self.chunkIndex = i
+
+    def read(self, n = -1):
+        if n == None or n < 0:
+            n = self.size - self.pos
+        out = bytearray()
+        while n > 0 and self.pos < self.size:
+            i = self.reader.findChunkAt(self.pos)
+            self.__load(i)
+            start = self.pos - self.reader.chunks[i].rawOffset
+            data = self.chunkData[start : start + n]
+            if len(data) == 0:
+                break
+            out += data
+            self.pos += len(data)
+            n -= len(data)
+        return bytes(out)
+
+    def seek(self, offset, whence = os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self.pos
+        elif whence == os.SEEK_END:
+            offset += self.size
+        self.pos = min(max(0, offset), self.size)
+        return self.pos
+
+    def tell(self):
+        return self.pos
+
+    def close(self):
+        if self.closed == False:
+            self.reader.close()
+            self.closed = True
+
+def compressLog(src, dest, codec = None, chunkSize = DEFAULT_CHUNK_SIZE):
+    '''Convert a plain tlog to a chunked log'''
+    out = ChunkedLogFile(dest, codec, chunkSize)
+    with open(src, 'rb') as f:
+        carry = b''
+        while True:
+            data = f.read(chunkSize)
+            if len(data) == 0:
+                break
+            data = carry + data
+            # only hand whole records over, so that the index sees every frame
+            end = 0
+            for pos, _, _, length in scanRecords(data):
+                end = pos + length
+            if end == 0 and len(data) > chunkSize:
+                end = len(data) # not a valid tlog, store as is
+            out.write(data[:end])
+            carry = data[end:]
+        if len(carry) > 0:
+            out.write(carry)
+    out.close()
+    return out
+
+def decompressLog(src, dest):
+    '''Convert a chunked log back to the plain tlog it was created from'''
+    reader = ChunkedLogReader(src)
+    with open(dest, 'wb') as f:
+        for i in range(len(reader.chunks)):
+            f.write(reader.readChunk(i))
+    reader.close()
+
+def main(argv):
+    parser = argparse.ArgumentParser(description = 'Chunked telemetry log converter')
+    sub = parser.add_subparsers(dest = 'command')
+    p = sub.add_parser('compress', help = 'tlog to chunked log')
+    p.add_argument('src')
+    p.add_argument('dest', nargs = '?')
+    p.add_argument('--codec', choices = list(CODEC_NAMES.keys()))
+    p.add_argument('--chunk', type = int, default = DEFAULT_CHUNK_SIZE, help = 'uncompressed chunk size in bytes')
+    p = sub.add_parser('decompress', help = 'chunked log to tlog')
+    p.add_argument('src')
+    p.add_argument('dest', nargs = '?')
+    p = sub.add_parser('info', help = 'print the chunk index')
+    p.add_argument('src')
+    args = parser.parse_args(argv)
+    if args.command == 'compress':
+        dest = args.dest if args.dest != None else os.path.splitext(args.src)[0] + CHUNKED_LOG_EXTENSION
+        compressLog(args.src, dest, args.codec, args.chunk)
+        print('{} ({} bytes) -> {} ({} bytes)'.format(args.src, os.path.getsize(args.src), dest, os.path.getsize(dest)))
+    elif args.command == 'decompress':
+        dest = args.dest if args.dest != None else os.path.splitext(args.src)[0] + '.bin'
+        decompressLog(args.src, dest)
+        print('{} -> {} ({} bytes)'.format(args.src, dest, os.path.getsize(dest)))
+    elif args.command == 'info':
+        reader = ChunkedLogReader(args.src)
+        codecName = {v : k for k, v in CODEC_NAMES.items()}.get(reader.codec, reader.codec)
+        print('{}: codec {}, {} chunks, {} bytes uncompressed'.format(args.src, codecName, len(reader.chunks), reader.rawSize))
+        for i, c in enumerate(reader.chunks):
+            print('{:>5} {:>10} {:>9} -> {:>9} {:>7} records {:.3f} - {:.3f} {} message types'.format(
+                i, c.offset, c.rawSize, c.compressedSize, c.records, c.firstTimestamp / 1.0e6, c.lastTimestamp / 1.0e6, len(c.msgIds)))
+        reader.close()
+    else:
+        parser.print_help()
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,98 @@
+'''
+Compare MAVLink decoding throughput of the per-message receive path
+(one `bytes_needed()` sized read per `parse_char()` call, as done by
+`mavfile.recv_msg`) with the bulk path used by `MAVLinkConnection`
+(one large read, every complete frame decoded by `parse_buffer()`).
+Both paths read the raw stream through an unbuffered file descriptor,
+so the cost of one system call per read is included as on a live link.
+
+Usage: python decodebench.py MAV_<ts>.bin [--dialect ardupilotmega] [--chunk 16384] [--repeat 3]
+'''
+import argparse
+import os
+import sys
+import tempfile
+from time import perf_counter
+
+DEFAULT_CHUNK_SIZE = 16384  # same as telemetry.RX_READ_SIZE
+MAVLINK_V2_MARKER = 0xFD
+
+def loadRawStream(fileName):
+    '''Strip the 64 bit timestamps from a tlog, returning the raw link byte stream'''
+    from pymavlink import mavutil
+    log = mavutil.mavlogfile(fileName)
+    raw = bytearray()
+    cnts = 0
+    while True:
+        msg = log.recv_msg()
+        if msg == None:
+            break
+        if msg.get_type() != 'BAD_DATA':
+            raw += msg.get_msgbuf()
+            cnts += 1
+    log.close()
+    return bytes(raw), cnts
+
+def createParser(dialect, raw):
+    if len(raw) > 0 and raw[0] == MAVLINK_V2_MARKER:
+        os.environ['MAVLINK20'] = '1'
+    from pymavlink import mavutil
+    mavutil.set_dialect(dialect)
+    mav = mavutil.mavlink.MAVLink(None)
+    mav.robust_parsing = True
+    return mav
+
+def decodePerMessage(mav, fd):
+    cnts = 0
+    while True:
+        s = os.read(fd, mav.bytes_needed())
+        msg = mav.parse_char(s)
+        if msg != None:
+            cnts += 1
+        elif len(s) == 0:
+            return cnts
+
+def decodeBulk(mav, fd, chunkSize):
+    cnts = 0
+    while True:
+        s = os.read(fd, chunkSize)
+        msgs = mav.parse_buffer(s)
+        if msgs != None:
+            cnts += len(msgs)
+        elif len(s) == 0:
+            return cnts
+
+def measure(name, fn, dialect, raw, repeat):
+    best = None
+    cnts = 0
+    with tempfile.TemporaryFile() as f:
+        f.write(raw)
+        f.flush()
+        for _ in range(repeat):
+            mav = createParser(dialect, raw)
+            os.lseek(f.fileno(), 0, os.SEEK_SET)
+            t0 = perf_counter()
+            cnts = fn(mav, f.fileno())
+            dt = perf_counter() - t0
+            best = dt if best == None else min(best, dt)
+    rate = cnts / best if best > 0 else 0.0
+    print('{:<12} {:>10} msgs {:>9.3f} s {:>12.0f} msgs/s'.format(name, cnts, best, rate))
+    return rate
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='MAVLink decode benchmark')
+    parser.add_argument('log', help='tlog recorded by MiniGCS (MAV_<ts>.bin)')
+    parser.add_argument('--dialect', default='common')
+    parser.add_argument('--chunk', type=int, default=DEFAULT_CHUNK_SIZE, help='bulk read size in bytes')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+    raw, cnts = loadRawStream(args.log)
+    print('{}: {} messages, {} bytes'.format(args.log, cnts, len(raw)))
+    before = measure('per-message', decodePerMessage, args.dialect, raw, args.repeat)
+    after = measure('bulk', lambda mav, fd: decodeBulk(mav, fd, args.chunk), args.dialect, raw, args.repeat)
+    if before > 0:
+        print('speedup: {:.2f}x'.format(after / before))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
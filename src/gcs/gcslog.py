@@ -0,0 +1,180 @@
+'''
+Logging for the GCS modules, built on the standard logging package.
+All loggers are children of `gcs`, messages go to stderr and to a ring
+buffer displayed by LogConsoleWindow. Both sinks are rate limited per
+message, so a condition repeated on every received frame can not flood
+the output. Use %-style arguments, e.g. logger.debug('BAD_DATA: %s', msg),
+so nothing is formatted unless the level is enabled.
+'''
+import logging
+from collections import deque
+from threading import Lock
+from time import monotonic
+
+from PyQt5.QtCore import QTimer
+from PyQt5.QtGui import QFont
+from PyQt5.QtWidgets import (QComboBox, QGridLayout, QLabel, QPlainTextEdit,
+                             QPushButton, QWidget)
+
+from UserData import UserData
+
+GCS_LOGGER_NAME = 'gcs'
+DEFAULT_LOG_LEVEL = 'INFO'
+DEFAULT_RATE_LIMIT_BURST = 5 # messages per key ...
+DEFAULT_RATE_LIMIT_INTERVAL = 10.0 # ... per this many seconds
+DEFAULT_RING_BUFFER_SIZE = 2000 # records kept for the log console
+LOG_FORMAT = '%(asctime)s %(levelname)-7s %(name)s: %(message)s'
+LOG_LEVELS = ['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL']
+
+UD_LOGGING_KEY = 'LOGGING'
+UD_LOGGING_LEVEL_KEY = 'LEVEL'
+UD_LOGGING_RATE_LIMIT_BURST_KEY = 'RATE_LIMIT_BURST'
+UD_LOGGING_RATE_LIMIT_INTERVAL_KEY = 'RATE_LIMIT_INTERVAL'
+
+def getLogger(name):
+    return logging.getLogger('{}.{}'.format(GCS_LOGGER_NAME, name))
+
+class RateLimitFilter(logging.Filter):
+    '''
+    Pass at most `burst` records per key within `interval` seconds.
+    The key is the `rateKey` extra attribute if given, otherwise the logger
+    name and the unformatted message, so records differing only in their
+    arguments share the limit. The number of records suppressed is added
+    to the next record passed for the same key.
+    '''
+
+    def __init__(self, burst = DEFAULT_RATE_LIMIT_BURST, interval = DEFAULT_RATE_LIMIT_INTERVAL):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self.windows = {} # key -> [window start, count, suppressed]
+        self.lock = Lock()
+
+    def filter(self, record):
+        # the same filter is shared by all sinks, decide once per record
+        passed = getattr(record, 'rateLimitPassed', None)
+        if passed == None:
+            passed = record.rateLimitPassed = self.__check(record)
+        return passed
+
+    def __check(self, record):
+        key = getattr(record, 'rateKey', None)
+        if key == None:
+            key = (record.name, record.msg)
+        now = monotonic()
+        with self.lock:
+            window = self.windows.get(key)
+            if window == None or now - window[0] >= self.interval:
+                suppressed = 0 if window == None else window[2]
+                self.windows[key] = [now, 1, 0]
+                if suppressed > 0:
+                    record.msg = '{} [{} similar messages suppressed]'.format(record.msg, suppressed)
+                return True
+            if window[1] < self.burst:
+                window[1] += 1
+                return True
+            window[2] += 1
+            return False
+
+class RingBufferHandler(logging.Handler):
+    '''Keep the latest records in memory, formatted only when read'''
+
+    def __init__(self, capacity = DEFAULT_RING_BUFFER_SIZE):
+        super().__init__()
+        self.buffer = deque(maxlen = capacity)
+        self.sequence = 0
+
+    def emit(self, record):
+        self.acquire()
+        try:
+            self.sequence += 1
+            self.buffer.append((self.sequence, record))
+        finally:
+            self.release()
+
+    def records(self, sinceSequence = 0, level = logging.NOTSET):
+        '''Return (last sequence, [formatted records newer than `sinceSequence`])'''
+        self.acquire()
+        try:
+            pending = [(seq, r) for seq, r in self.buffer if seq > sinceSequence and r.levelno >= level]
+            sequence = self.sequence
+        finally:
+            self.release()
+        return sequence, [self.format(r) for _, r in pending]
+
+_ringBufferHandler = None
+
+def setupLogging():
+    '''Configure the `gcs` loggers from the user data, returns the ring buffer handler'''
+    global _ringBufferHandler
+    if _ringBufferHandler != None:
+        return _ringBufferHandler
+    param = UserData.getInstance().getUserDataEntry(UD_LOGGING_KEY, {})
+    level = UserData.getParameterValue(param, UD_LOGGING_LEVEL_KEY, DEFAULT_LOG_LEVEL)
+    rateLimit = RateLimitFilter(UserData.getParameterValue(param, UD_LOGGING_RATE_LIMIT_BURST_KEY, DEFAULT_RATE_LIMIT_BURST),
+                                UserData.getParameterValue(param, UD_LOGGING_RATE_LIMIT_INTERVAL_KEY, DEFAULT_RATE_LIMIT_INTERVAL))
+    formatter = logging.Formatter(LOG_FORMAT)
+    root = logging.getLogger(GCS_LOGGER_NAME)
+    root.setLevel(level if level in LOG_LEVELS else DEFAULT_LOG_LEVEL)
+    root.propagate = False
+    stream = logging.StreamHandler()
+    _ringBufferHandler = RingBufferHandler()
+    for handler in (stream, _ringBufferHandler):
+        handler.setFormatter(formatter)
+        handler.addFilter(rateLimit)
+        root.addHandler(handler)
+    return _ringBufferHandler
+
+class LogConsoleWindow(QWidget):
+    '''Display the records kept by the ring buffer handler'''
+
+    REFRESH_INTERVAL = 500 # msec
+
+    def __init__(self, handler, parent = None):
+        super().__init__(parent)
+        self.handler = handler
+        self.sequence = 0
+        self.setWindowTitle('Log Console')
+        l = QGridLayout()
+        l.addWidget(QLabel('Level'), 0, 0)
+        self.levelCombo = QComboBox()
+        self.levelCombo.addItems(LOG_LEVELS)
+        self.levelCombo.setCurrentText(logging.getLevelName(logging.getLogger(GCS_LOGGER_NAME).getEffectiveLevel()))
+        self.levelCombo.currentTextChanged.connect(self.__setLevel)
+        l.addWidget(self.levelCombo, 0, 1)
+        self.clearButton = QPushButton('Clear')
+        self.clearButton.clicked.connect(self.__clear)
+        l.addWidget(self.clearButton, 0, 2)
+        l.setColumnStretch(1, 1)
+        self.console = QPlainTextEdit()
+        self.console.setReadOnly(True)
+        self.console.setMaximumBlockCount(self.handler.buffer.maxlen)
+        self.console.setFont(QFont('monospace', 9))
+        l.addWidget(self.console, 1, 0, 1, 3)
+        self.setLayout(l)
+        self.resize(720, 400)
+        self.refreshTimer = QTimer(self)
+        self.refreshTimer.setInterval(self.REFRESH_INTERVAL)
+        self.refreshTimer.timeout.connect(self.refresh)
+
+    def __setLevel(self, level):
+        logging.getLogger(GCS_LOGGER_NAME).setLevel(level)
+        param = UserData.getInstance().getUserDataEntry(UD_LOGGING_KEY, {})
+        param[UD_LOGGING_LEVEL_KEY] = level
+
+    def __clear(self):
+        self.console.clear()
+
+    def refresh(self):
+        self.sequence, lines = self.handler.records(self.sequence)
+        if len(lines) > 0:
+            self.console.appendPlainText('\n'.join(lines))
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.refresh()
+        self.refreshTimer.start()
+
+    def hideEvent(self, event):
+        self.refreshTimer.stop()
+        super().hideEvent(event)
@@ -11,6 +11,7 @@ from PyQt5.QtOpenGL import QGLWidget
 from PyQt5.QtWidgets import (QAction, QFileDialog, QLabel, QMenu, QSizePolicy,
                              QWidget, QVBoxLayout)
 from utils import unused
+from vehiclestate import STATE_ATTITUDE, STATE_BATTERY, STATE_NAVIGATION, STATE_POSITION
 
 class HUDWindow(QWidget):
 
@@ -115,6 +116,13 @@ class HUD(QLabel):
 
         self.attitudes = {}
         self.uas = None
+        self.telemetryRevision = 0
+        self.telemetryHandlers = {
+            STATE_ATTITUDE : self.updateAttitude,
+            STATE_BATTERY : self.updateBattery,
+            STATE_POSITION : self.updateGlobalPosition,
+            STATE_NAVIGATION : self.updateNavigationControllerOutput
+        }
         self.refreshTimer = QTimer(self)
         # Set auto fill to False
         self.setAutoFillBackground(False)
@@ -132,7 +140,7 @@ class HUD(QLabel):
 
         # Refresh timer
         self.refreshTimer.setInterval(self.updateInterval)
-        self.refreshTimer.timeout.connect(self.repaint)
+        self.refreshTimer.timeout.connect(self.refreshTelemetry)
 
         # Resize to correct size and fill with image
         QWidget.resize(self, self.width(), self.height())
@@ -220,21 +228,22 @@ class HUD(QLabel):
         self.selectOfflineDirectoryAction.triggered.connect(self.selectOfflineDirectory)
 
     def setActiveUAS(self, uas):
-        uas.updateAttitudeSignal.connect(self.updateAttitude)
-        uas.updateBatterySignal.connect(self.updateBattery)
-        uas.updateGlobalPositionSignal.connect(self.updateGlobalPosition)
-        uas.updateAirSpeedSignal.connect(self.updateSpeed)
-        uas.updateGroundSpeedSignal.connect(self.updateGroundSpeed)
-        uas.updateVelocitySignal.connect(self.updateVelocity)
-        uas.updateNavigationControllerOutputSignal.connect(self.updateNavigationControllerOutput)
         self.uas = uas
+        self.telemetryRevision = 0
+
+    def refreshTelemetry(self):
+        '''Apply the latest telemetry values once per frame, then repaint'''
+        if self.uas != None:
+            self.telemetryRevision = self.uas.applyState(self.telemetryRevision, self.telemetryHandlers)
+        self.repaint()
 
     def setVideoSource(self, videoSrc):
         videoSrc.newFrameAvailable.connect(self.setImageExternal)
         self.videoSrc = videoSrc
 
-    def updateAttitude(self, uas, timestamp, roll, pitch, yaw):
-        unused(uas, timestamp)
+    def updateAttitude(self, uas, attitude):
+        unused(uas)
+        roll, pitch, yaw = attitude.roll, attitude.pitch, attitude.yaw
         if isnan(roll) == False and isinf(roll) == False \
         and isnan(pitch) == False and isinf(pitch)== False \
         and isnan(yaw) == False and isinf(yaw) == False:
@@ -250,9 +259,10 @@ class HUD(QLabel):
         and isnan(yaw) == False and isinf(yaw) == False:
             self.attitudes[component] = QVector3D(roll, pitch*3.35, yaw) # Constant here is the 'focal length' of the projection onto the plane
 
-    def updateBattery(self, uas, timestamp, voltage, current, percent):
-        unused(uas, timestamp, current)
-        self.fuelStatus = 'BAT [{}% | {:.1f}V]'.format(percent, voltage)
+    def updateBattery(self, uas, battery):
+        unused(uas)
+        percent = battery.percent
+        self.fuelStatus = 'BAT [{}% | {:.1f}V]'.format(percent, battery.voltage)
         if percent < 20.0:
             self.fuelColor = self.warningColor
         elif percent < 10.0:
@@ -273,11 +283,12 @@ class HUD(QLabel):
         self.yPos = y
         self.zPos = z
 
-    def updateGlobalPosition(self, uas, timestamp, lat,  lon, altitude):
-        unused(uas, timestamp)
-        self.lat = lat
-        self.lon = lon
-        self.alt = altitude
+    def updateGlobalPosition(self, uas, position):
+        self.lat = position.lat
+        self.lon = position.lng
+        self.alt = position.altitude
+        if isnan(position.groundSpeed) == False:
+            self.updateGroundSpeed(uas, position.timestamp, position.groundSpeed)
 
     def updateVelocity(self, uas, timestamp, x, y, z):
         unused(uas)
@@ -328,13 +339,13 @@ class HUD(QLabel):
         self.load = load
         # updateValue(uas, "load", load, MG.TIME.getGroundTimeNow())
 
-    def updateNavigationControllerOutput(self, uas, desiredRoll, desiredPitch, desiredHeading, targetBearing, wpDist):
+    def updateNavigationControllerOutput(self, uas, navigation):
         unused(uas)
-        self.desiredRoll = desiredRoll
-        self.desiredPitch = desiredPitch
-        self.desiredHeading = desiredHeading
-        self.targetBearing = targetBearing
-        self.wpDist = wpDist
+        self.desiredRoll = navigation.desiredRoll
+        self.desiredPitch = navigation.desiredPitch
+        self.desiredHeading = navigation.desiredHeading
+        self.targetBearing = navigation.targetBearing
+        self.wpDist = navigation.wpDist
 
     def refToScreenX(self, x):
         return self.scalingFactor * x
@@ -1,4 +1,4 @@
-from PyQt5.QtCore import Qt, pyqtSignal
+from PyQt5.QtCore import Qt, QTimer, pyqtSignal
 from PyQt5.QtGui import QColor, QFont, QTextOption, QTransform
 from PyQt5.QtSvg import QGraphicsSvgItem, QSvgRenderer
 from PyQt5.QtWidgets import (QGraphicsItem, QGraphicsScene, QGraphicsTextItem,
@@ -6,11 +6,16 @@ from PyQt5.QtWidgets import (QGraphicsItem, QGraphicsScene, QGraphicsTextItem,
                              QVBoxLayout, QWidget)
 
 from utils import unused
+from vehiclestate import STATE_AIR
 
 class Barometer(QWidget):
     def __init__(self, parent):
         super().__init__(parent)
         self.uas = None
+        self.telemetryRevision = 0
+        self.refreshTimer = QTimer(self)
+        self.refreshTimer.setInterval(100)
+        self.refreshTimer.timeout.connect(self.refreshTelemetry)
         svgRenderer = QSvgRenderer('res/barometer.svg')
 
         bkgnd = QGraphicsSvgItem()
@@ -59,13 +64,17 @@ class Barometer(QWidget):
         self.digitalBaro.adjustSize()
         self.digitalBaro.setX(0 - self.digitalBaro.textWidth() / 2)
 
-    def updateAirPressure(self, sourceUAS, timestamp, absPressure, diffPressure, temperature):
-        unused(sourceUAS, timestamp, diffPressure, temperature)
-        self.setBarometer(absPressure)
+    def updateAirPressure(self, sourceUAS, air):
+        unused(sourceUAS)
+        self.setBarometer(air.absPressure)
 
     def setActiveUAS(self, uas):
-        uas.updateAirPressureSignal.connect(self.updateAirPressure)
         self.uas = uas
+        self.telemetryRevision = 0
+        self.refreshTimer.start()
+
+    def refreshTelemetry(self):
+        self.telemetryRevision = self.uas.applyState(self.telemetryRevision, {STATE_AIR : self.updateAirPressure})
 
 class BarometerConfigWindow(QWidget):
 
@@ -1,15 +1,20 @@
 import math
 
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtSvg import QGraphicsSvgItem, QSvgRenderer
 from PyQt5.QtWidgets import (QGraphicsItem, QGraphicsScene, QGraphicsView,
                              QVBoxLayout, QWidget)
 from utils import unused
+from vehiclestate import STATE_ATTITUDE
 
 class Compass(QWidget):
     def __init__(self, parent):
         super().__init__(parent)
         self.uas = None
+        self.telemetryRevision = 0
+        self.refreshTimer = QTimer(self)
+        self.refreshTimer.setInterval(100)
+        self.refreshTimer.timeout.connect(self.refreshTelemetry)
         svgRenderer = QSvgRenderer('res/compass.svg')
         self.compass = QGraphicsSvgItem()
         self.compass.setSharedRenderer(svgRenderer)
@@ -53,10 +58,14 @@ class Compass(QWidget):
             hdr *= 180.0 / math.pi
             self.compass.setRotation(360.0 - hdr)
 
-    def updateAttitude(self, sourceUAS, timestamp, roll, pitch, yaw):
-        unused(sourceUAS, timestamp, roll, pitch)
-        self.setHeading(yaw)
+    def updateAttitude(self, sourceUAS, attitude):
+        unused(sourceUAS)
+        self.setHeading(attitude.yaw)
 
     def setActiveUAS(self, uas):
-        uas.updateAttitudeSignal.connect(self.updateAttitude)
         self.uas = uas
+        self.telemetryRevision = 0
+        self.refreshTimer.start()
+
+    def refreshTelemetry(self):
+        self.telemetryRevision = self.uas.applyState(self.telemetryRevision, {STATE_ATTITUDE : self.updateAttitude})
@@ -12,13 +12,14 @@ from PyQt5.QtGui import QCursor
 from PyQt5.QtPositioning import QGeoCoordinate
 from PyQt5.QtQml import qmlRegisterType
 from PyQt5.QtQuick import QQuickItem, QQuickView
-from PyQt5.QtWidgets import (QHBoxLayout, QLabel, QMessageBox,
+from PyQt5.QtWidgets import (QHBoxLayout, QLabel, QMessageBox, QProgressBar,
                              QPushButton, QSplitter, QVBoxLayout, QWidget)
 
 from adsb import ADSBSource, AircraftsModel
 from telemetry import UD_TELEMETRY_KEY, UD_TELEMETRY_LOG_FOLDER_KEY
 from UserData import UserData
 from utils import unused
+from vehiclestate import STATE_GPS, STATE_POSITION
 from waypoint import (MAVWaypointParameter, Waypoint,
                       WaypointEditWindowFactory, WaypointList)
 
@@ -348,13 +349,13 @@ class MapView(QQuickView):
         # print('New home location: {0}, {1}'.format(lat, lng))
         self.moveHomeEvent.emit(QGeoCoordinate(lat, lng))
 
-    def updateDroneLocation(self, sourceUAS, timestamp, latitude, longitude, altitude):
-        unused(sourceUAS, timestamp, altitude)
-        self.map.updateDroneLocation.emit(latitude, longitude)
-
-    def updateDroneLocationUncertainty(self, sourceUAS, timestamp, fixtype, hdop, vdop, nosv, hacc, vacc, velacc, hdgacc):
-        unused(sourceUAS, timestamp, fixtype, hdop, vdop, nosv, velacc, hdgacc)
-        self.map.updateDroneLocationUncertainty.emit(hacc, vacc)
+    def updateDroneState(self, sourceUAS, changed):
+        if changed & STATE_POSITION:
+            position = sourceUAS.state.position
+            self.map.updateDroneLocation.emit(position.lat, position.lng)
+        if changed & STATE_GPS:
+            gps = sourceUAS.state.gps
+            self.map.updateDroneLocationUncertainty.emit(gps.hacc, gps.vacc)
 
     def minimumSize(self):
         return QSize(600, 480)
@@ -394,6 +395,9 @@ class MapWidget(QSplitter):
         self.loadWaypoints = QPushButton('Load from UAV')
         self.uploadWaypoints = QPushButton('Upload to UAV')
         self.messageLabel = QLabel('Disconnected')
+        self.transferProgress = QProgressBar()  # mission transfer with the UAV
+        self.transferProgress.setFormat('%v/%m')
+        self.transferProgress.hide()
         self.__setupTextMessageLogging()
         self.loadWaypoints.clicked.connect(self.loadWaypointsFromUAV)
         self.uploadWaypoints.clicked.connect(self.uploadWaypointsToUAV)
@@ -401,6 +405,7 @@ class MapWidget(QSplitter):
         panelLayput.setSpacing(0)
         panelLayput.addWidget(self.messageLabel, 0, Qt.AlignLeft)
         panelLayput.addStretch(1)
+        panelLayput.addWidget(self.transferProgress, 0, Qt.AlignRight)
         panelLayput.addWidget(self.loadWaypoints, 0, Qt.AlignRight)
         panelLayput.addWidget(self.uploadWaypoints, 0, Qt.AlignRight)
         self.actionPanel.setLayout(panelLayput)
@@ -417,9 +422,12 @@ class MapWidget(QSplitter):
         self.addWidget(self.lowerPanel)
 
     def setActiveUAS(self, uas):
-        uas.updateGlobalPositionSignal.connect(self.mapView.updateDroneLocation)
-        uas.updateGPSStatusSignal.connect(self.mapView.updateDroneLocationUncertainty)
+        if self.uas != None:
+            self.uas.stateChangedSignal.disconnect(self.mapView.updateDroneState)
+        uas.stateChangedSignal.connect(self.mapView.updateDroneState)
         self.uas = uas
+        # move the marker to the last known position of the new vehicle
+        self.mapView.updateDroneState(uas, uas.state.changedSince(0) & STATE_POSITION)
 
     def __setupTextMessageLogging(self):
         tconf = UserData.getInstance().getUserDataEntry(UD_TELEMETRY_KEY)
@@ -432,6 +440,21 @@ class MapWidget(QSplitter):
             self.textMessageLogFile.write('[{}] {}\n'.format(time.strftime('%d %b %Y %H:%M:%S', time.localtime()), msg))
         self.messageLabel.setText(msg)
 
+    def updateMissionTransferProgress(self, done, total):
+        self.transferProgress.setRange(0, total)
+        self.transferProgress.setValue(done)
+        if self.transferProgress.isVisible() == False:
+            self.transferProgress.show()
+            self.loadWaypoints.setEnabled(False)
+            self.uploadWaypoints.setEnabled(False)
+
+    def finishMissionTransfer(self, success, msg):
+        unused(success)
+        self.transferProgress.hide()
+        self.loadWaypoints.setEnabled(True)
+        self.uploadWaypoints.setEnabled(True)
+        self.displayTextMessage(msg)
+
     def uploadWaypointsToUAV(self):
         cfm = QMessageBox.question(self.window(),
                                    'Confirm upload',
@@ -11,6 +11,7 @@ from PyQt5.QtGui import (QBrush, QColor, QFont, QFontMetrics, QLinearGradient,
 from PyQt5.QtWidgets import QSizePolicy, QWidget
 from UserData import UserData
 from utils import unused
+from vehiclestate import STATE_ATTITUDE, STATE_BATTERY, STATE_GPS, STATE_POSITION, STATE_RADIO
 
 UD_PFD_KEY = 'PFD'
 UD_PFD_PRIMARY_SPEED_SOURCE_KEY = 'PRIMARY_SPEED_SOURCE'
@@ -106,31 +107,39 @@ class PrimaryFlightDisplay(QWidget):
         self.largeTextSize = self.LARGE_TEXT_SIZE
         self.uiTimer = QTimer(self)
         self.uiTimer.setInterval(40)
-        self.uiTimer.timeout.connect(self.update)
+        self.uiTimer.timeout.connect(self.refreshTelemetry)
         self.uas = None
+        self.telemetryRevision = 0
+        self.telemetryHandlers = {
+            STATE_ATTITUDE : self.updateAttitude,
+            STATE_BATTERY : self.updateBatteryStatus,
+            STATE_POSITION : self.updateGlobalPosition,
+            STATE_GPS : self.updateGPSReception,
+            STATE_RADIO : self.updateRCStatus
+        }
 
     def setActiveUAS(self, uas):
-        uas.updateAttitudeSignal.connect(self.updateAttitude)
-        uas.updateBatterySignal.connect(self.updateBatteryStatus)
-        uas.updateGlobalPositionSignal.connect(self.updateGlobalPosition)
-        uas.updateAirSpeedSignal.connect(self.updatePrimarySpeed)
-        uas.updateGroundSpeedSignal.connect(self.updateGPSSpeed)
-        uas.updateGPSStatusSignal.connect(self.updateGPSReception)
-        uas.updateRCStatusSignal.connect(self.updateRCStatus)
         self.uas = uas
+        self.telemetryRevision = 0
 
-    def updateRCStatus(self, sourceUAS, rcType, rssi, noise, errors):
-        unused(sourceUAS, rcType)
-        self.additionalParameters['rc_rssi'] = rssi
-        self.additionalParameters['rc_noise'] = noise
-        self.additionalParameters['rc_errors'] = errors
+    def refreshTelemetry(self):
+        '''Apply the latest telemetry values once per frame, then repaint'''
+        if self.uas != None:
+            self.telemetryRevision = self.uas.applyState(self.telemetryRevision, self.telemetryHandlers)
+        self.update()
 
-    def updateAttitude(self, sourceUAS, timestamp, roll, pitch, yaw):
+    def updateRCStatus(self, sourceUAS, radio):
+        unused(sourceUAS)
+        self.additionalParameters['rc_rssi'] = radio.rssi
+        self.additionalParameters['rc_noise'] = radio.noise
+        self.additionalParameters['rc_errors'] = radio.errors
+
+    def updateAttitude(self, sourceUAS, attitude):
         scale = 180 / math.pi
-        self.pitch = self.pitch if math.isnan(pitch) else pitch * scale
-        self.roll = self.roll if math.isnan(roll) else roll * scale
-        self.yaw = self.yaw if math.isnan(yaw) else yaw * scale
-        unused(sourceUAS, timestamp)
+        self.pitch = self.pitch if math.isnan(attitude.pitch) else attitude.pitch * scale
+        self.roll = self.roll if math.isnan(attitude.roll) else attitude.roll * scale
+        self.yaw = self.yaw if math.isnan(attitude.yaw) else attitude.yaw * scale
+        unused(sourceUAS)
 
     def updateAttitudeSpeed(self, sourceUAS, timestamp, rollspeed, pitchspeed, yawspeed):
         scale = 180 / math.pi
@@ -139,11 +148,11 @@ class PrimaryFlightDisplay(QWidget):
         self.yawspeed = self.yawspeed if math.isnan(yawspeed) else yawspeed * scale
         unused(sourceUAS, timestamp)
 
-    def updateGlobalPosition(self, sourceUAS, timestamp, latitude, longitude, altitude):
-        self.latitude = self.latitude if math.isnan(latitude) else latitude
-        self.longitude = self.longitude if math.isnan(longitude) else longitude
-        self.GPSAltitude = self.GPSAltitude if math.isnan(altitude) else altitude
-        unused(sourceUAS, timestamp)
+    def updateGlobalPosition(self, sourceUAS, position):
+        self.latitude = self.latitude if math.isnan(position.lat) else position.lat
+        self.longitude = self.longitude if math.isnan(position.lng) else position.lng
+        self.GPSAltitude = self.GPSAltitude if math.isnan(position.altitude) else position.altitude
+        self.updateGPSSpeed(sourceUAS, position.timestamp, position.groundSpeed)
 
     def updatePrimaryAltitude(self, sourceUAS, timestamp, altitude):
         self.primaryAltitude = self.primaryAltitude if math.isnan(altitude) else altitude
@@ -157,16 +166,16 @@ class PrimaryFlightDisplay(QWidget):
         self.primarySpeed = self.primarySpeed if math.isnan(speed) else speed
         unused(sourceUAS, timestamp)
 
-    def updateBatteryStatus(self, sourceUAS, timestamp, voltage, current, remaining):
-        self.additionalParameters['voltage'] = voltage
-        self.additionalParameters['current'] = current
-        self.additionalParameters['remaining'] = remaining
-        unused(sourceUAS, timestamp)
+    def updateBatteryStatus(self, sourceUAS, battery):
+        self.additionalParameters['voltage'] = battery.voltage
+        self.additionalParameters['current'] = battery.current
+        self.additionalParameters['remaining'] = battery.percent
+        unused(sourceUAS)
 
-    def updateGPSReception(self, sourceUAS, timestamp, fixType, hdop, vdop, satelliteCount, hacc, vacc, velacc, hdgacc):
-        self.additionalParameters['gps_fix'] = fixType
-        self.additionalParameters['gps_satellite'] = satelliteCount
-        unused(sourceUAS, timestamp, hdop, vdop, hacc, vacc, velacc, hdgacc)
+    def updateGPSReception(self, sourceUAS, gps):
+        self.additionalParameters['gps_fix'] = gps.fixType
+        self.additionalParameters['gps_satellite'] = gps.satellites
+        unused(sourceUAS)
 
     def updateGPSSpeed(self, sourceUAS, timestamp, speed):
         self.groundspeed = self.groundspeed if math.isnan(speed) else speed
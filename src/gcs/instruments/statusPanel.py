@@ -1,8 +1,8 @@
 import sys
 
 from pymavlink.mavutil import mavlink
-from PyQt5.QtCore import Qt, pyqtSignal
-from PyQt5.QtWidgets import (QApplication, QGridLayout, QLabel, QProgressBar,
+from PyQt5.QtCore import Qt, QTimer, pyqtSignal
+from PyQt5.QtWidgets import (QApplication, QComboBox, QGridLayout, QLabel, QProgressBar,
                              QPushButton, QWidget, QTabWidget, QVBoxLayout)
 from instruments.compass import Compass
 from instruments.barometer import Barometer
@@ -11,6 +11,7 @@ from plugins.paparazzi import PaparazziControlPanel
 from plugins.common import GenericControlPanel
 from telemetry import MAVLinkConnection, RadioControlTelemetryWindow
 from utils import unused
+from vehiclestate import STATE_BATTERY, STATE_GPS
 
 GPS_FIX_LABELS = {
     mavlink.GPS_FIX_TYPE_NO_GPS : 'No GPS',
@@ -58,6 +59,14 @@ class SystemStatusPanel(QWidget):
         for ap in self.apControlPanels:
             self.__linkTelemetryForControlPanel(self.apControlPanels[ap], mav)
 
+    def setActiveUAS(self, uas):
+        self.statusPanel.setActiveUAS(uas)
+        self.compassPanel.setActiveUAS(uas)
+        self.barometerPanel.setActiveUAS(uas)
+        self.genericControlPanel.uas = uas
+        for ap in self.apControlPanels:
+            self.apControlPanels[ap].uas = uas
+
     def __updateRCChannelValues(self, msg):
         if msg.get_type() == 'RC_CHANNELS_RAW':
             self.statusPanel.rcTelemetryWindow.updateRCChannelValues(msg)
@@ -75,11 +84,51 @@ class SystemStatusPanel(QWidget):
         panel.uas = mav.uas
         panel.isConnected = True
 
+class VehicleSelector(QComboBox):
+    '''Choose the active vehicle among the vehicles seen on the link'''
+
+    activeUASSelectedSignal = pyqtSignal(object) # uas
+
+    def __init__(self, parent = None):
+        super().__init__(parent)
+        self.setSizeAdjustPolicy(QComboBox.AdjustToContents)
+        self.setEnabled(False)
+        self.activated.connect(self.__selectUAS)
+
+    def addUAS(self, uas):
+        # keep the entries sorted by system and component id
+        i = 0
+        while i < self.count() and (self.itemData(i).systemId, self.itemData(i).componentId) < (uas.systemId, uas.componentId):
+            i += 1
+        self.insertItem(i, uas.vehicleName(), uas)
+        self.setEnabled(self.count() > 1)
+
+    def setActiveUAS(self, uas):
+        for i in range(self.count()):
+            if self.itemData(i) is uas:
+                self.setCurrentIndex(i)
+                return
+
+    def clearUAS(self):
+        self.clear()
+        self.setEnabled(False)
+
+    def __selectUAS(self, i):
+        self.activeUASSelectedSignal.emit(self.itemData(i))
+
 class StatusSummaryPanel(QWidget):
 
     def __init__(self, parent):
         super().__init__(parent)
         self.uas = None
+        self.telemetryRevision = 0
+        self.telemetryHandlers = {
+            STATE_BATTERY : self.updateBatteryStatus,
+            STATE_GPS : self.updateGPSFixStatus
+        }
+        self.refreshTimer = QTimer(self)
+        self.refreshTimer.setInterval(200)
+        self.refreshTimer.timeout.connect(self.refreshTelemetry)
         self.connectToMAVLink = parent.connectToMAVLink
         self.disconnectFromMAVLink = parent.disconnectFromMAVLink
         self.connectToLocalGPS = parent.connectToLocalGPS
@@ -87,7 +136,9 @@ class StatusSummaryPanel(QWidget):
         l = QGridLayout()
         row = 0
         self.sysNameLbl = QLabel('System Status')
-        l.addWidget(self.sysNameLbl, row, 0, 1, 3, Qt.AlignLeft)
+        l.addWidget(self.sysNameLbl, row, 0, 1, 2, Qt.AlignLeft)
+        self.vehicleSelector = VehicleSelector(self)
+        l.addWidget(self.vehicleSelector, row, 2, 1, 2, Qt.AlignRight)
         row += 1
 
         self.armedLbl = QLabel('Disarmed')
@@ -140,13 +191,17 @@ class StatusSummaryPanel(QWidget):
         self.setLayout(l)
 
     def setActiveUAS(self, uas):
-        uas.updateBatterySignal.connect(self.updateBatteryStatus)
-        uas.updateGPSStatusSignal.connect(self.updateGPSFixStatus)
         self.uas = uas
+        self.telemetryRevision = 0
+        self.refreshTimer.start()
+
+    def refreshTelemetry(self):
+        self.telemetryRevision = self.uas.applyState(self.telemetryRevision, self.telemetryHandlers)
 
-    def updateBatteryStatus(self, sourceUAS, timestamp, voltage, current, remaining):
-        unused(sourceUAS, timestamp)
-        self.battVoltLabel.setText('{:.1f}V/{:.1f}A'.format(voltage, abs(current)))
+    def updateBatteryStatus(self, sourceUAS, battery):
+        unused(sourceUAS)
+        remaining = battery.percent
+        self.battVoltLabel.setText('{:.1f}V/{:.1f}A'.format(battery.voltage, abs(battery.current)))
         self.battBar.setValue(remaining)
         if remaining >= 60:
             self.battBar.setStyleSheet(BATTERY_BAR_STYLE_TEMPLATE.format('green'))
@@ -155,10 +210,10 @@ class StatusSummaryPanel(QWidget):
         else:
             self.battBar.setStyleSheet(BATTERY_BAR_STYLE_TEMPLATE.format('red'))
 
-    def updateGPSFixStatus(self, sourceUAS, timestamp, fix, hdop, vdop, nosv, hacc, vacc, velacc, hdgacc):
-        unused(sourceUAS, timestamp, hdop, vdop, nosv, hacc, vacc, velacc, hdgacc)
-        if fix in GPS_FIX_LABELS:
-            self.gpsLbl.setText(GPS_FIX_LABELS[fix])
+    def updateGPSFixStatus(self, sourceUAS, gps):
+        unused(sourceUAS)
+        if gps.fixType in GPS_FIX_LABELS:
+            self.gpsLbl.setText(GPS_FIX_LABELS[gps.fixType])
         else:
             self.gpsLbl.setText(GPS_FIX_LABELS[mavlink.GPS_FIX_TYPE_NO_FIX])
 
@@ -0,0 +1,268 @@
+'''
+Receive statistics of a MAVLink connection, measured while the link is
+running:
+
+bytes        received byte count and its rate
+messages     decoded message count, BAD_DATA frames and their ratio
+types        rate, count and handler time (average, max) per message type
+systems      messages received and lost per system/component, from the
+             gaps in the MAVLink sequence numbers
+
+MAVLinkConnection feeds a LinkStatistics from its link thread (bytes,
+messages, internal handler time) and from the GUI thread (UASInterface
+handler time), so the counters are guarded by a lock. Readers take a
+snapshot(), a dictionary of plain values: LinkStatisticsWindow shows it
+in the Tools menu once per second, next to the per link counters of the
+router, and it can be dumped as JSON as is.
+'''
+from threading import Lock
+from time import monotonic
+
+from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtWidgets import (QCheckBox, QGridLayout, QHeaderView, QLabel,
+                             QTableWidget, QTableWidgetItem, QWidget)
+
+LINK_STATS_RATE_INTERVAL = 1.0 # seconds between rate samples
+LINK_STATS_EWMA_ALPHA = 0.3 # weight of the newest rate sample
+MAVLINK_SEQ_MODULO = 256
+MAVLINK_SEQ_REORDER_WINDOW = 128 # larger backward jumps are duplicates or reordering, not loss
+
+class MessageTypeStatistics:
+
+    __slots__ = ('count', 'windowCount', 'rate', 'handlerCount', 'handlerTime', 'handlerMax')
+
+    def __init__(self):
+        self.count = 0
+        self.windowCount = 0
+        self.rate = None
+        self.handlerCount = 0
+        self.handlerTime = 0.0
+        self.handlerMax = 0.0
+
+class SystemStatistics:
+
+    __slots__ = ('lastSeq', 'received', 'lost')
+
+    def __init__(self):
+        self.lastSeq = None
+        self.received = 0
+        self.lost = 0
+
+class LinkStatistics:
+    '''
+    Receive statistics of a MAVLink connection: per message type rate and
+    handler time, sequence number loss per system/component, byte rate
+    and parse errors. Nothing is collected while `enabled` is False,
+    callers check the flag once per batch before recording anything.
+    '''
+
+    def __init__(self, enabled = False):
+        self.enabled = enabled
+        self.lock = Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.startTime = monotonic()
+            self.windowStart = self.startTime
+            self.bytes = 0
+            self.windowBytes = 0
+            self.byteRate = None
+            self.messages = 0
+            self.badData = 0
+            self.types = {} # type -> MessageTypeStatistics
+            self.systems = {} # (sysid, compid) -> SystemStatistics
+
+    def setEnabled(self, enabled):
+        if enabled and self.enabled == False:
+            self.reset()
+        self.enabled = enabled
+
+    def recordBytes(self, n):
+        with self.lock:
+            self.bytes += n
+            self.windowBytes += n
+
+    def recordMessages(self, msgs):
+        '''Count a batch of decoded messages, BAD_DATA included'''
+        with self.lock:
+            for msg in msgs:
+                tp = msg.get_type()
+                if tp == 'BAD_DATA':
+                    self.badData += 1
+                    continue
+                self.messages += 1
+                st = self.types.get(tp)
+                if st == None:
+                    st = self.types[tp] = MessageTypeStatistics()
+                st.count += 1
+                st.windowCount += 1
+                key = (msg.get_srcSystem(), msg.get_srcComponent())
+                sy = self.systems.get(key)
+                if sy == None:
+                    sy = self.systems[key] = SystemStatistics()
+                seq = msg.get_seq()
+                if sy.lastSeq != None:
+                    gap = (seq - sy.lastSeq - 1) % MAVLINK_SEQ_MODULO
+                    if gap < MAVLINK_SEQ_REORDER_WINDOW:
+                        sy.lost += gap
+                sy.lastSeq = seq
+                sy.received += 1
+            self.__updateRates(monotonic())
+
+    def recordHandlerTime(self, tp, seconds):
+        with self.lock:
+            st = self.types.get(tp)
+            if st == None:
+                st = self.types[tp] = MessageTypeStatistics()
+            st.handlerCount += 1
+            st.handlerTime += seconds
+            if seconds > st.handlerMax:
+                st.handlerMax = seconds
+
+    def __updateRates(self, now):
+        '''Fold the counts of the last interval into the rate averages, lock must be held'''
+        dt = now - self.windowStart
+        if dt < LINK_STATS_RATE_INTERVAL:
+            return
+        for st in self.types.values():
+            st.rate = self.__ewma(st.rate, st.windowCount / dt)
+            st.windowCount = 0
+        self.byteRate = self.__ewma(self.byteRate, self.windowBytes / dt)
+        self.windowBytes = 0
+        self.windowStart = now
+
+    @staticmethod
+    def __ewma(average, sample):
+        return sample if average == None else LINK_STATS_EWMA_ALPHA * sample + (1 - LINK_STATS_EWMA_ALPHA) * average
+
+    def snapshot(self):
+        '''Return the statistics as a dictionary of plain values, e.g. to be dumped as JSON'''
+        with self.lock:
+            now = monotonic()
+            self.__updateRates(now)
+            total = self.messages + self.badData
+            types = {}
+            for tp, st in self.types.items():
+                types[tp] = {
+                    'count' : st.count,
+                    'rate' : 0.0 if st.rate == None else st.rate,
+                    'handler_calls' : st.handlerCount,
+                    'handler_avg' : st.handlerTime / st.handlerCount if st.handlerCount > 0 else 0.0,
+                    'handler_max' : st.handlerMax
+                }
+            systems = {}
+            for (sysid, compid), sy in self.systems.items():
+                systems['{}:{}'.format(sysid, compid)] = {
+                    'received' : sy.received,
+                    'lost' : sy.lost,
+                    'loss' : sy.lost / (sy.lost + sy.received) if sy.received > 0 else 0.0
+                }
+            return {
+                'enabled' : self.enabled,
+                'elapsed' : now - self.startTime,
+                'bytes' : self.bytes,
+                'byte_rate' : 0.0 if self.byteRate == None else self.byteRate,
+                'messages' : self.messages,
+                'bad_data' : self.badData,
+                'bad_data_ratio' : self.badData / total if total > 0 else 0.0,
+                'types' : types,
+                'systems' : systems
+            }
+
+class LinkStatisticsWindow(QWidget):
+    '''Tools window showing the LinkStatistics of the active connection'''
+
+    REFRESH_INTERVAL = 1000 # msec
+    TYPE_COLUMNS = ['Message', 'Rate (Hz)', 'Count', 'Handler avg (us)', 'Handler max (us)']
+    SYSTEM_COLUMNS = ['System:Component', 'Received', 'Lost', 'Loss (%)']
+    LINK_COLUMNS = ['Link', 'State', 'Received', 'Duplicates', 'Sent', 'Loss (%)', 'RTT (ms)']
+
+    def __init__(self, parent = None):
+        super().__init__(parent)
+        self.stats = None
+        self.router = None
+        self.setWindowTitle('Link Statistics')
+        l = QGridLayout()
+        self.enableCheckBox = QCheckBox('Collect statistics')
+        self.enableCheckBox.toggled.connect(self.__enableStatistics)
+        l.addWidget(self.enableCheckBox, 0, 0, 1, 2)
+        self.summaryLabel = QLabel('No connection')
+        l.addWidget(self.summaryLabel, 1, 0, 1, 2)
+        self.typeTable = self.__createTable(self.TYPE_COLUMNS)
+        l.addWidget(self.typeTable, 2, 0, 1, 2)
+        self.systemTable = self.__createTable(self.SYSTEM_COLUMNS)
+        l.addWidget(self.systemTable, 3, 0, 1, 2)
+        self.linkTable = self.__createTable(self.LINK_COLUMNS)
+        l.addWidget(self.linkTable, 4, 0, 1, 2)
+        l.setRowStretch(2, 3)
+        l.setRowStretch(3, 1)
+        l.setRowStretch(4, 1)
+        self.setLayout(l)
+        self.resize(560, 480)
+        self.refreshTimer = QTimer(self)
+        self.refreshTimer.setInterval(self.REFRESH_INTERVAL)
+        self.refreshTimer.timeout.connect(self.refresh)
+
+    def __createTable(self, columns):
+        table = QTableWidget(0, len(columns))
+        table.setHorizontalHeaderLabels(columns)
+        table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        table.verticalHeader().setVisible(False)
+        table.setEditTriggers(QTableWidget.NoEditTriggers)
+        return table
+
+    def setLinkStatistics(self, stats, router = None):
+        self.stats = stats
+        self.router = router
+        self.enableCheckBox.setChecked(stats.enabled)
+        self.refresh()
+
+    def __enableStatistics(self, enabled):
+        if self.stats != None:
+            self.stats.setEnabled(enabled)
+            self.refresh()
+
+    def refresh(self):
+        if self.stats == None:
+            return
+        snapshot = self.stats.snapshot()
+        if snapshot['enabled'] == False:
+            self.summaryLabel.setText('Statistics collection is disabled')
+        else:
+            self.summaryLabel.setText('{:.0f} bytes/s, {} messages, {} bad data ({:.2%})'.format(
+                snapshot['byte_rate'], snapshot['messages'], snapshot['bad_data'], snapshot['bad_data_ratio']))
+        types = sorted(snapshot['types'].items())
+        self.typeTable.setRowCount(len(types))
+        for row, (tp, st) in enumerate(types):
+            self.__setRow(self.typeTable, row, [tp, '{:.1f}'.format(st['rate']), str(st['count']),
+                                               '{:.1f}'.format(st['handler_avg'] * 1.0e6),
+                                               '{:.1f}'.format(st['handler_max'] * 1.0e6)])
+        systems = sorted(snapshot['systems'].items())
+        self.systemTable.setRowCount(len(systems))
+        for row, (key, sy) in enumerate(systems):
+            self.__setRow(self.systemTable, row, [key, str(sy['received']), str(sy['lost']), '{:.2f}'.format(sy['loss'] * 100)])
+        # the links are measured by the router whether collection is enabled or not
+        links = [] if self.router == None else self.router.snapshot()
+        self.linkTable.setRowCount(len(links))
+        for row, lk in enumerate(links):
+            state = ('Up' if lk['up'] else 'Down') + (', TX' if lk['tx'] else '')
+            self.__setRow(self.linkTable, row, [lk['name'], state, str(lk['rx_messages']), str(lk['duplicates']),
+                                               str(lk['tx_messages']), '{:.2f}'.format(lk['loss'] * 100),
+                                               '-' if lk['rtt'] == None else '{:.0f}'.format(lk['rtt'] * 1000)])
+
+    def __setRow(self, table, row, values):
+        for col, value in enumerate(values):
+            item = QTableWidgetItem(value)
+            if col > 0:
+                item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+            table.setItem(row, col, item)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.refresh()
+        self.refreshTimer.start()
+
+    def hideEvent(self, event):
+        self.refreshTimer.stop()
+        super().hideEvent(event)
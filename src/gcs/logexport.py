@@ -0,0 +1,237 @@
+'''
+Export a telemetry log to per message type column arrays.
+
+Every field of every message type becomes one contiguous array, together
+with `timestamp` (float64 seconds, log time), `sysid` and `compid` columns,
+e.g. ATTITUDE.timestamp, ATTITUDE.roll, ATTITUDE.pitch and ATTITUDE.yaw.
+Payloads are not decoded one message object at a time: the record stream
+is split per message type and each block of payloads is converted in one
+go through a numpy structured dtype built from the dialect definitions.
+Records are logged after the CRC check on the link, so they are not
+checked again. Memory use is bounded: decoded blocks are spilled to disk
+as they fill up.
+
+Output formats:
+    .npz      one array per column, named <TYPE>.<field>, load with numpy.load()
+    folder    one Parquet file per message type, <TYPE>.parquet (requires pyarrow)
+
+Usage: python logexport.py MAV_<ts>.bin [MAV_<ts>.npz | OUTPUT_DIR --parquet] [--dialect ardupilotmega]
+'''
+import argparse
+import logging
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import zipfile
+
+import numpy as np
+
+from chunkedlog import ChunkedLogStream, isChunkedLog, scanRecords, MAVLINK_V1_MARKER, TIMESTAMP
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# plain logging here as in chunkedlog, the exporter runs without Qt
+logger = logging.getLogger('gcs.logexport')
+
+DEFAULT_DIALECT = 'ardupilotmega'
+EXPORT_READ_SIZE = 1024 * 1024
+EXPORT_BLOCK_SIZE = 16 * 1024 * 1024 # pending payload bytes before spilling decoded blocks
+ROW_HEADER = struct.Struct('<dBB') # timestamp, sysid, compid
+ROW_HEADER_DTYPE = [('timestamp', '<f8'), ('sysid', 'u1'), ('compid', 'u1')]
+STRUCT_TO_DTYPE = {
+    'c' : 'S1', 'b' : 'i1', 'B' : 'u1', 'h' : '<i2', 'H' : '<u2', 'i' : '<i4', 'I' : '<u4',
+    'l' : '<i4', 'L' : '<u4', 'q' : '<i8', 'Q' : '<u8', 'f' : '<f4', 'd' : '<f8'
+}
+
+def messageName(cls):
+    return getattr(cls, 'msgname', None) or getattr(cls, 'name')
+
+def payloadDtype(cls):
+    '''numpy dtype of the wire payload of a pymavlink message class'''
+    fmt = cls.unpacker.format
+    if isinstance(fmt, bytes):
+        fmt = fmt.decode('ascii')
+    fields = []
+    count = ''
+    names = iter(cls.ordered_fieldnames)
+    for c in fmt.lstrip('<>=!@'):
+        if c.isdigit():
+            count += c
+            continue
+        n = int(count) if count != '' else 1
+        count = ''
+        if c == 's':
+            fields.append((next(names), 'S{}'.format(n)))
+        elif n > 1:
+            fields.append((next(names), STRUCT_TO_DTYPE[c], (n,)))
+        else:
+            fields.append((next(names), STRUCT_TO_DTYPE[c]))
+    return np.dtype(ROW_HEADER_DTYPE + fields)
+
+class MessageColumns:
+    '''Rows of one message type waiting to be decoded, and the spill files of its columns'''
+
+    def __init__(self, cls, spillDir):
+        self.name = messageName(cls)
+        self.dtype = payloadDtype(cls)
+        self.payloadSize = cls.unpacker.size
+        self.rows = bytearray()
+        self.count = 0
+        self.spillFiles = {}
+        self.spillDir = spillDir
+
+    def append(self, timestamp, sysid, compid, payload):
+        self.rows += ROW_HEADER.pack(timestamp, sysid, compid)
+        if len(payload) >= self.payloadSize:
+            self.rows += payload[:self.payloadSize]
+        else:
+            # MAVLink 2 truncates trailing zero bytes, extensions may be missing
+            self.rows += payload
+            self.rows += bytes(self.payloadSize - len(payload))
+        self.count += 1
+
+    def decode(self):
+        '''Return the pending rows as a structured array and clear them'''
+        block = np.frombuffer(bytes(self.rows), dtype = self.dtype)
+        self.rows = bytearray()
+        return block
+
+    def spill(self, block):
+        for name in self.dtype.names:
+            if name not in self.spillFiles:
+                self.spillFiles[name] = open(os.path.join(self.spillDir, '{}.{}'.format(self.name, name)), 'w+b')
+            self.spillFiles[name].write(np.ascontiguousarray(block[name]).tobytes())
+
+    def writeNpz(self, npz):
+        for name, f in self.spillFiles.items():
+            field = self.dtype.fields[name][0]
+            shape = (self.count,) + field.shape
+            header = {'descr' : np.lib.format.dtype_to_descr(field.base), 'fortran_order' : False, 'shape' : shape}
+            with npz.open('{}.{}.npy'.format(self.name, name), 'w', force_zip64 = True) as out:
+                np.lib.format.write_array_header_1_0(out, header)
+                f.seek(0)
+                shutil.copyfileobj(f, out)
+            f.close()
+
+class ParquetColumns(MessageColumns):
+    '''Same as MessageColumns, decoded blocks are written as Parquet row groups'''
+
+    def __init__(self, cls, outputDir):
+        super().__init__(cls, outputDir)
+        self.writer = None
+
+    def spill(self, block):
+        columns = {}
+        for name in self.dtype.names:
+            data = block[name]
+            if data.ndim > 1:
+                for i in range(data.shape[1]):
+                    columns['{}_{}'.format(name, i)] = pyarrow.array(np.ascontiguousarray(data[:, i]))
+            else:
+                columns[name] = pyarrow.array(np.ascontiguousarray(data))
+        table = pyarrow.table(columns)
+        if self.writer == None:
+            self.writer = pyarrow.parquet.ParquetWriter(os.path.join(self.spillDir, self.name + '.parquet'), table.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer != None:
+            self.writer.close()
+
+def exportLog(fileName, output, parquet = False, dialect = DEFAULT_DIALECT, blockSize = EXPORT_BLOCK_SIZE):
+    '''Export `fileName` to `output`, return {message type: number of rows}'''
+    from pymavlink import mavutil
+    mavutil.set_dialect(dialect)
+    mavlinkMap = mavutil.mavlink.mavlink_map
+    if parquet:
+        if pyarrow == None:
+            raise RuntimeError('pyarrow is required for Parquet export')
+        os.makedirs(output, exist_ok = True)
+    spillDir = None if parquet else tempfile.mkdtemp(prefix = 'logexport')
+    messages = {} # msgId -> MessageColumns
+    unknown = 0
+    pending = 0
+    f = ChunkedLogStream(fileName) if isChunkedLog(fileName) else open(fileName, 'rb')
+    try:
+        carry = b''
+        while True:
+            data = f.read(EXPORT_READ_SIZE)
+            if len(data) == 0:
+                break
+            data = carry + data
+            end = 0
+            for pos, ts, msgId, length in scanRecords(data):
+                end = pos + length
+                cols = messages.get(msgId)
+                if cols == None:
+                    if msgId not in mavlinkMap:
+                        unknown += 1
+                        continue
+                    cls = mavlinkMap[msgId]
+                    cols = ParquetColumns(cls, output) if parquet else MessageColumns(cls, spillDir)
+                    messages[msgId] = cols
+                frame = pos + TIMESTAMP.size
+                if data[frame] == MAVLINK_V1_MARKER:
+                    sysid, compid, start = data[frame + 3], data[frame + 4], frame + 6
+                else:
+                    sysid, compid, start = data[frame + 5], data[frame + 6], frame + 10
+                cols.append(ts / 1.0e6, sysid, compid, data[start : start + data[frame + 1]])
+                pending += data[frame + 1]
+                if pending >= blockSize:
+                    for c in messages.values():
+                        if len(c.rows) > 0:
+                            c.spill(c.decode())
+                    pending = 0
+            if end == 0 and len(data) > EXPORT_READ_SIZE:
+                logger.warning('%s: not a valid log at offset %d, export stopped', fileName, f.tell() - len(data))
+                break
+            carry = data[end:]
+        for c in messages.values():
+            if len(c.rows) > 0:
+                c.spill(c.decode())
+        if parquet:
+            for c in messages.values():
+                c.close()
+        else:
+            with zipfile.ZipFile(output, 'w', zipfile.ZIP_STORED, allowZip64 = True) as npz:
+                for c in messages.values():
+                    c.writeNpz(npz)
+    finally:
+        f.close()
+        if spillDir != None:
+            shutil.rmtree(spillDir, ignore_errors = True)
+    if unknown > 0:
+        logger.warning('%d messages not in dialect %s skipped', unknown, dialect)
+    return {c.name : c.count for c in messages.values()}
+
+def loadColumns(fileName, messageType):
+    '''Return {field: array} of one message type from an .npz export'''
+    prefix = messageType + '.'
+    with np.load(fileName) as npz:
+        return {key[len(prefix):] : npz[key] for key in npz.files if key.startswith(prefix)}
+
+def main(argv):
+    parser = argparse.ArgumentParser(description = 'Export a telemetry log to column arrays')
+    parser.add_argument('log', help = 'tlog or chunked log')
+    parser.add_argument('output', nargs = '?', help = '.npz file, or folder with --parquet')
+    parser.add_argument('--parquet', action = 'store_true', help = 'write one Parquet file per message type')
+    parser.add_argument('--dialect', default = DEFAULT_DIALECT)
+    args = parser.parse_args(argv)
+    logging.basicConfig(format = '%(message)s')
+    output = args.output
+    if output == None:
+        output = os.path.splitext(args.log)[0] + ('' if args.parquet else '.npz')
+    counts = exportLog(args.log, output, args.parquet, args.dialect)
+    for name in sorted(counts):
+        print('{:<32} {:>10}'.format(name, counts[name]))
+    print('exported to', output)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,181 @@
+import os
+import struct
+from array import array
+from bisect import bisect_right
+from PyQt5.QtCore import Qt, QThread, pyqtSignal
+from PyQt5.QtWidgets import (QComboBox, QHBoxLayout, QLabel, QPushButton,
+                             QSlider, QVBoxLayout, QWidget)
+
+from chunkedlog import ChunkedLogStream, isChunkedLog, scanRecords
+from gcslog import getLogger
+
+REPLAY_INDEX_INTERVAL = 1000000 # microseconds of log time between index entries
+REPLAY_INDEX_EXTENSION = '.idx'
+REPLAY_INDEX_MAGIC = b'MGCSRIX1'
+REPLAY_INDEX_HEADER = struct.Struct('<8sQQQ') # magic, log size, log mtime (ns), entries
+REPLAY_SCAN_BLOCK_SIZE = 1024 * 1024
+REPLAY_SPEEDS = [0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 25.0, 50.0, 100.0, 0] # 0 means as fast as possible
+
+logger = getLogger('logreplay')
+
+class ReplayIndex:
+    '''
+    Sparse timestamp to file offset index of a tlog or chunked log,
+    one entry per REPLAY_INDEX_INTERVAL of log time. Offsets are in the
+    uncompressed record stream and always point to the start of a record.
+    '''
+
+    def __init__(self, timestamps = None, offsets = None):
+        self.timestamps = array('Q') if timestamps == None else timestamps # microseconds
+        self.offsets = array('Q') if offsets == None else offsets
+        self.endTimestamp = 0
+
+    def startTime(self):
+        return self.timestamps[0] / 1.0e6 if len(self.timestamps) > 0 else 0.0
+
+    def endTime(self):
+        return self.endTimestamp / 1.0e6
+
+    def offsetFor(self, timestamp):
+        '''Offset of a record at or before `timestamp` (seconds)'''
+        i = bisect_right(self.timestamps, int(timestamp * 1.0e6)) - 1
+        return self.offsets[max(0, i)] if len(self.offsets) > 0 else 0
+
+    @staticmethod
+    def indexFileName(logFileName):
+        return logFileName + REPLAY_INDEX_EXTENSION
+
+    @staticmethod
+    def build(logFileName):
+        idx = ReplayIndex()
+        f = ChunkedLogStream(logFileName) if isChunkedLog(logFileName) else open(logFileName, 'rb')
+        base = 0
+        carry = b''
+        nextTs = 0
+        while True:
+            data = f.read(REPLAY_SCAN_BLOCK_SIZE)
+            if len(data) == 0:
+                break
+            data = carry + data
+            end = 0
+            for pos, ts, _, length in scanRecords(data):
+                if ts >= nextTs:
+                    idx.timestamps.append(ts)
+                    idx.offsets.append(base + pos)
+                    nextTs = ts + REPLAY_INDEX_INTERVAL
+                idx.endTimestamp = max(idx.endTimestamp, ts)
+                end = pos + length
+            if end == 0 and len(data) > REPLAY_SCAN_BLOCK_SIZE:
+                break # not a tlog, or corrupted beyond this point
+            base += end
+            carry = data[end:]
+        f.close()
+        return idx
+
+    @staticmethod
+    def load(logFileName):
+        '''Return the cached index of `logFileName`, None if missing or out of date'''
+        st = os.stat(logFileName)
+        try:
+            with open(ReplayIndex.indexFileName(logFileName), 'rb') as f:
+                magic, size, mtime, n = REPLAY_INDEX_HEADER.unpack(f.read(REPLAY_INDEX_HEADER.size))
+                if magic != REPLAY_INDEX_MAGIC or size != st.st_size or mtime != st.st_mtime_ns:
+                    return None
+                idx = ReplayIndex()
+                idx.endTimestamp = struct.unpack('<Q', f.read(8))[0]
+                idx.timestamps.fromfile(f, n)
+                idx.offsets.fromfile(f, n)
+                return idx
+        except (OSError, struct.error, EOFError):
+            return None
+
+    def save(self, logFileName):
+        st = os.stat(logFileName)
+        try:
+            with open(ReplayIndex.indexFileName(logFileName), 'wb') as f:
+                f.write(REPLAY_INDEX_HEADER.pack(REPLAY_INDEX_MAGIC, st.st_size, st.st_mtime_ns, len(self.timestamps)))
+                f.write(struct.pack('<Q', self.endTimestamp))
+                self.timestamps.tofile(f)
+                self.offsets.tofile(f)
+        except OSError as e:
+            logger.warning('Unable to save replay index: %s', e)
+
+class ReplayIndexBuilder(QThread):
+    '''Load the cached index of a log file, or build and cache it in the background'''
+
+    indexReadySignal = pyqtSignal(object) # ReplayIndex
+
+    def __init__(self, logFileName, parent = None):
+        super().__init__(parent)
+        self.logFileName = logFileName
+
+    def run(self):
+        idx = ReplayIndex.load(self.logFileName)
+        if idx == None:
+            idx = ReplayIndex.build(self.logFileName)
+            idx.save(self.logFileName)
+        self.indexReadySignal.emit(idx)
+
+def formatReplayTime(seconds):
+    seconds = int(max(0, seconds))
+    return '{:d}:{:02d}:{:02d}'.format(seconds // 3600, seconds // 60 % 60, seconds % 60)
+
+class ReplayControlWindow(QWidget):
+    '''Play/pause, speed and position control of a log file replay'''
+
+    SLIDER_RESOLUTION = 10 # steps per second
+
+    def __init__(self, replay, parent = None):
+        super().__init__(parent)
+        self.replay = replay
+        self.index = None
+        self.setWindowTitle('Log Replay')
+        l = QVBoxLayout()
+        self.positionSlider = QSlider(Qt.Horizontal)
+        self.positionSlider.setEnabled(False)
+        self.positionSlider.sliderReleased.connect(self.__seek)
+        l.addWidget(self.positionSlider)
+        row = QHBoxLayout()
+        self.playButton = QPushButton('Pause')
+        self.playButton.clicked.connect(self.__togglePause)
+        row.addWidget(self.playButton)
+        self.speedCombo = QComboBox()
+        for speed in REPLAY_SPEEDS:
+            self.speedCombo.addItem('Max' if speed == 0 else '{}x'.format(speed), speed)
+        self.speedCombo.setCurrentIndex(REPLAY_SPEEDS.index(1.0))
+        self.speedCombo.currentIndexChanged.connect(self.__changeSpeed)
+        row.addWidget(self.speedCombo)
+        self.positionLabel = QLabel('Indexing...')
+        row.addWidget(self.positionLabel, 1, Qt.AlignRight)
+        l.addLayout(row)
+        self.setLayout(l)
+        replay.replayPositionSignal.connect(self.updatePosition)
+        replay.replayIndexReadySignal.connect(self.setIndex)
+        if replay.replayIndex != None:
+            self.setIndex(replay.replayIndex)
+
+    def setIndex(self, index):
+        self.index = index
+        self.positionSlider.setRange(0, int((index.endTime() - index.startTime()) * self.SLIDER_RESOLUTION))
+        self.positionSlider.setEnabled(True)
+        self.updatePosition(index.startTime())
+
+    def updatePosition(self, timestamp):
+        if self.index == None:
+            return
+        elapsed = timestamp - self.index.startTime()
+        if self.positionSlider.isSliderDown() == False:
+            self.positionSlider.setValue(int(elapsed * self.SLIDER_RESOLUTION))
+        self.positionLabel.setText('{} / {}'.format(formatReplayTime(elapsed),
+                                                    formatReplayTime(self.index.endTime() - self.index.startTime())))
+
+    def __seek(self):
+        self.replay.seekToTime(self.index.startTime() + self.positionSlider.value() / self.SLIDER_RESOLUTION)
+
+    def __togglePause(self):
+        paused = self.replay.replayPaused == False
+        self.replay.setReplayPaused(paused)
+        self.playButton.setText('Play' if paused else 'Pause')
+
+    def __changeSpeed(self, i):
+        self.replay.setReplaySpeed(self.speedCombo.itemData(i))
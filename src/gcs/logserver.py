@@ -0,0 +1,120 @@
+'''
+Serve a telemetry log over the network in real time, a stand-in for a
+vehicle or SITL when testing the network links of the GCS. Frames are
+sent as recorded, paced by their log timestamps.
+
+Usage: python logserver.py MAV_<ts>.bin --udp 127.0.0.1:14550 [--speed 1.0] [--loop]
+       python logserver.py MAV_<ts>.tlz --tcp 5760
+'''
+import argparse
+import socket
+import sys
+from time import monotonic, sleep
+
+from chunkedlog import ChunkedLogStream, isChunkedLog, scanRecords, TIMESTAMP
+
+READ_SIZE = 64 * 1024
+
+class UDPSender:
+
+    def __init__(self, address):
+        host, port = address.rsplit(':', 1)
+        self.destination = (host, int(port))
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def send(self, frame):
+        try:
+            self.sock.sendto(frame, self.destination)
+        except OSError:
+            pass # nobody listening yet
+
+    def close(self):
+        self.sock.close()
+
+class TCPServer:
+    '''Accept any number of clients and send every frame to all of them'''
+
+    def __init__(self, port):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(('0.0.0.0', port))
+        self.sock.listen(5)
+        self.sock.setblocking(False)
+        self.clients = []
+
+    def send(self, frame):
+        try:
+            while True:
+                client, address = self.sock.accept()
+                client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                self.clients.append(client)
+                print('client connected:', address)
+        except BlockingIOError:
+            pass
+        for client in list(self.clients):
+            try:
+                client.sendall(frame)
+            except OSError:
+                client.close()
+                self.clients.remove(client)
+                print('client disconnected')
+
+    def close(self):
+        for client in self.clients:
+            client.close()
+        self.sock.close()
+
+def serveLog(fileName, sender, speed = 1.0):
+    '''Send every frame of `fileName` at `speed` times the recorded rate, return the number of frames'''
+    f = ChunkedLogStream(fileName) if isChunkedLog(fileName) else open(fileName, 'rb')
+    frames = 0
+    anchor = None # (log time, wall time)
+    carry = b''
+    try:
+        while True:
+            data = f.read(READ_SIZE)
+            if len(data) == 0:
+                break
+            data = carry + data
+            end = 0
+            for pos, ts, _, length in scanRecords(data):
+                end = pos + length
+                if anchor == None:
+                    anchor = (ts, monotonic())
+                delay = anchor[1] + (ts - anchor[0]) / 1.0e6 / speed - monotonic()
+                if delay > 0:
+                    sleep(delay)
+                sender.send(data[pos + TIMESTAMP.size : end])
+                frames += 1
+            if end == 0 and len(data) > READ_SIZE:
+                print('{}: not a valid log, stopped'.format(fileName))
+                break
+            carry = data[end:]
+    finally:
+        f.close()
+    return frames
+
+def main(argv):
+    parser = argparse.ArgumentParser(description = 'Serve a telemetry log over UDP or TCP')
+    parser.add_argument('log', help = 'tlog or chunked log')
+    target = parser.add_mutually_exclusive_group(required = True)
+    target.add_argument('--udp', metavar = 'HOST:PORT', help = 'send to a GCS listening on UDP')
+    target.add_argument('--tcp', metavar = 'PORT', type = int, help = 'accept TCP clients on this port')
+    parser.add_argument('--speed', type = float, default = 1.0, help = 'replay speed factor')
+    parser.add_argument('--loop', action = 'store_true', help = 'start over at the end of the log')
+    args = parser.parse_args(argv)
+    sender = UDPSender(args.udp) if args.udp != None else TCPServer(args.tcp)
+    try:
+        while True:
+            frames = serveLog(args.log, sender, args.speed)
+            print('{} frames sent'.format(frames))
+            if args.loop == False or frames == 0:
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sender.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
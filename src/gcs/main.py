@@ -17,6 +17,9 @@ from instruments.barometer import BarometerConfigWindow
 from uas import DEFAULT_ALTITUDE_REFERENCE, DEFAULT_PRESSURE_REFERENCE
 from instruments.plotter import PlotterWindow
 from instruments.ControlCheck import ServoOutputCheckWindow
+from logreplay import ReplayControlWindow
+from linkstats import LinkStatisticsWindow
+from gcslog import LogConsoleWindow, setupLogging
 
 UD_MAIN_WINDOW_KEY = 'MAIN'
 UD_MAIN_WINDOW_HEIGHT_KEY = 'WINDOW_HEIGHT'
@@ -27,6 +30,8 @@ class MiniGCS(QMainWindow):
     def __init__(self, parent = None):
         super().__init__(parent)
         self.mav = None
+        self.mavSignalConnections = [] # (signal, slot) wired for the current MAVLinkConnection
+        self.replayControlWindow = None
         self.param = UserData.getInstance().getUserDataEntry(UD_MAIN_WINDOW_KEY, {})
         current_path = os.path.abspath(os.path.dirname(__file__))
         qmlFile = os.path.join(current_path, './instruments/map.qml')
@@ -44,6 +49,7 @@ class MiniGCS(QMainWindow):
         self.hud = self.hudWindow.hud
         self.sts.connectToMAVLink.connect(self.teleWindow.show)
         self.sts.disconnectFromMAVLink.connect(self.disconnect)
+        self.vehicleSelector = self.sts.statusPanel.vehicleSelector
         spPfd = QSizePolicy(QSizePolicy.Preferred, QSizePolicy.Preferred)
         spPfd.setVerticalStretch(3)
         self.pfd.setSizePolicy(spPfd)
@@ -94,52 +100,109 @@ class MiniGCS(QMainWindow):
         self.servoOutputWindow = ServoOutputCheckWindow(8)
         self.servoOutputAction = QAction('Servo Output', self)
         self.servoOutputAction.triggered.connect(self.servoOutputWindow.show)
+        self.linkStatsWindow = LinkStatisticsWindow()
+        self.linkStatsAction = QAction('Link Statistics', self)
+        self.linkStatsAction.triggered.connect(self.linkStatsWindow.show)
+        self.logConsoleWindow = LogConsoleWindow(setupLogging())
+        self.logConsoleAction = QAction('Log Console', self)
+        self.logConsoleAction.triggered.connect(self.logConsoleWindow.show)
+        self.addLinkAction = QAction('Add Link', self)
+        self.addLinkAction.triggered.connect(self.__showAddLinkWindow)
         toolsMenu = menubar.addMenu('&Tools')
+        toolsMenu.addAction(self.addLinkAction)
         toolsMenu.addAction(self.localGPSAction)
         toolsMenu.addAction(self.showHUDAction)
         toolsMenu.addAction(self.showMsgSignAction)
         toolsMenu.addAction(self.baroRefCfgAction)
         toolsMenu.addAction(self.plotterAction)
         toolsMenu.addAction(self.servoOutputAction)
+        toolsMenu.addAction(self.linkStatsAction)
+        toolsMenu.addAction(self.logConsoleAction)
 
     def createConnection(self, conn):
+        if self.mav != None and self.mav.isRunning():
+            self.__addLink(conn)
+            return
+        self.__releaseConnection()
         self.mav = MAVLinkConnection(conn, isinstance(conn, pymavlink.mavutil.mavlogfile))
-        self.mav.heartbeatTimeoutSignal.connect(self.sts.statusPanel.resetConnectionButton)
+        self.__connectSignal(self.mav.heartbeatTimeoutSignal, self.sts.statusPanel.resetConnectionButton)
         self.mav.establishConnection()
         if self.mav.running == False:
             QMessageBox.critical(self, 'Error', 'MAVLink connection timeout', QMessageBox.Ok)
             return
-        self.map.waypointList.requestReturnToHome.connect(self.mav.initializeReturnToHome)
-        self.map.uploadWaypointsToUAVEvent.connect(self.mav.uploadWaypoints)
-        self.map.downloadWaypointsFromUAVSignal.connect(self.mav.downloadWaypoints)
+        self.__connectSignal(self.map.waypointList.requestReturnToHome, self.mav.initializeReturnToHome)
+        self.__connectSignal(self.map.uploadWaypointsToUAVEvent, self.mav.uploadWaypoints)
+        self.__connectSignal(self.map.downloadWaypointsFromUAVSignal, self.mav.downloadWaypoints)
 
-        self.mav.connectionEstablishedSignal.connect(lambda: \
-            self.sts.statusPanel.toggleButtonLabel(True))
+        self.__connectSignal(self.mav.connectionEstablishedSignal, lambda: \
+                             self.sts.statusPanel.toggleButtonLabel(True))
         self.sts.addAPControlPanel(self.mav.uas.autopilotClass)
-        self.mav.newTextMessageSignal.connect(self.map.displayTextMessage)
-        self.mav.onboardWaypointsReceivedSignal.connect(self.map.setAllWaypoints)
-
-        self.pfd.setActiveUAS(self.mav.uas)
-        self.hud.setActiveUAS(self.mav.uas)
+        self.vehicleSelector.clearUAS()
+        for uas in self.mav.vehicles.allUAS():
+            self.vehicleSelector.addUAS(uas)
+        self.__connectSignal(self.mav.vehicles.uasAddedSignal, self.vehicleSelector.addUAS)
+        self.__connectSignal(self.vehicleSelector.activeUASSelectedSignal, self.mav.setActiveUAS)
+        self.__connectSignal(self.mav.activeUASChangedSignal, self.setActiveUAS)
+        self.__connectSignal(self.mav.newTextMessageSignal, self.map.displayTextMessage)
+        self.__connectSignal(self.mav.onboardWaypointsReceivedSignal, self.map.setAllWaypoints)
+        self.__connectSignal(self.mav.missionManager.progressSignal, self.map.updateMissionTransferProgress)
+        self.__connectSignal(self.mav.missionManager.finishedSignal, self.map.finishMissionTransfer)
+
+        self.setActiveUAS(self.mav.uas)
         # self.hud.enableVideo(True)
         # fpv = FileVideoSource('test.mp4')  # test only
         # self.hud.setVideoSource(fpv)
-        self.mav.externalMessageHandler.connect(self.plotterWindow.handleMavlinkMessage)
-        self.map.setActiveUAS(self.mav.uas)
-        self.sts.statusPanel.setActiveUAS(self.mav.uas)
-        self.sts.compassPanel.setActiveUAS(self.mav.uas)
-        self.sts.barometerPanel.setActiveUAS(self.mav.uas)
-        self.baroRefCfgWindow.updatePressureAltitudeReferenceSignal.connect(self.mav.uas.setPressureAltitudeReference)
-        self.msgSignWindow.setMessageSigningKeySignal.connect(self.mav.setupMessageSigningKey)
-        self.msgSignWindow.setMessageSigningKeySignal.connect(self.mav.uas.acceptMessageSigningKey)
-
-        self.sts.statusPanel.editParameterButton.clicked.connect(self.mav.showParameterEditWindow)
+        self.__connectSignal(self.mav.externalMessageHandler, self.plotterWindow.handleMavlinkMessage)
+        self.__connectSignal(self.baroRefCfgWindow.updatePressureAltitudeReferenceSignal, self.mav.vehicles.setPressureAltitudeReference)
+        self.__connectSignal(self.msgSignWindow.setMessageSigningKeySignal, self.mav.setupMessageSigningKey)
+        self.__connectSignal(self.msgSignWindow.setMessageSigningKeySignal, lambda key, ts: self.mav.uas.acceptMessageSigningKey(key, ts))
+
+        self.__connectSignal(self.sts.statusPanel.editParameterButton.clicked, self.mav.showParameterEditWindow)
         self.sts.initializaMavlinkForControlPanels(self.mav)
-        self.servoOutputWindow.mavlinkMotorTestSignal.connect(self.mav.sendMavlinkMessage)
+        self.__connectSignal(self.servoOutputWindow.mavlinkMotorTestSignal, self.mav.sendMavlinkMessage)
+        self.linkStatsWindow.setLinkStatistics(self.mav.linkStats, self.mav.router)
 
         self.msgSignWindow.setMAVLinkVersion(self.mav.connection.WIRE_PROTOCOL_VERSION)
+        if self.mav.replayMode:
+            self.replayControlWindow = ReplayControlWindow(conn)
+            self.__connectSignal(self.mav.finished, self.replayControlWindow.close)
+            self.replayControlWindow.show()
         self.mav.start()
 
+    def __connectSignal(self, signal, slot):
+        '''Connect `signal` to `slot` for the current MAVLinkConnection only'''
+        signal.connect(slot)
+        self.mavSignalConnections.append((signal, slot))
+
+    def __releaseConnection(self):
+        '''Undo the wiring of the previous MAVLinkConnection, the GUI outlives it'''
+        for signal, slot in self.mavSignalConnections:
+            try:
+                signal.disconnect(slot)
+            except (TypeError, RuntimeError):
+                pass # already disconnected, or the sender is deleted
+        self.mavSignalConnections = []
+
+    def __addLink(self, conn):
+        if self.mav.replayMode or isinstance(conn, pymavlink.mavutil.mavlogfile):
+            conn.close()
+            QMessageBox.critical(self, 'Error', 'Log file replay can not be combined with other links', QMessageBox.Ok)
+            return
+        self.mav.addLink(conn)
+
+    def __showAddLinkWindow(self):
+        if self.mav == None or self.mav.isRunning() == False:
+            QMessageBox.information(self, 'Add Link', 'Connect to a vehicle first', QMessageBox.Ok)
+            return
+        self.teleWindow.show()
+
+    def setActiveUAS(self, uas):
+        self.pfd.setActiveUAS(uas)
+        self.hud.setActiveUAS(uas)
+        self.map.setActiveUAS(uas)
+        self.sts.setActiveUAS(uas)
+        self.vehicleSelector.setActiveUAS(uas)
+
     def disconnect(self):
         self.mav.requestExit()
 
@@ -163,6 +226,7 @@ if __name__ == '__main__':
         UserData.getInstance().loadGCSConfiguration()
     except IOError:
         sys.exit(1)
+    setupLogging()
     frame = MiniGCS()
     frame.show()
     sys.exit(app.exec_())
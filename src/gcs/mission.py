@@ -0,0 +1,646 @@
+'''
+Mission transfer with the vehicle, run by the link thread of
+MAVLinkConnection without blocking it or the GUI thread.
+
+MissionUploader sends MISSION_COUNT, answers every MISSION_REQUEST and
+MISSION_REQUEST_INT from a table of items prepared before the transfer
+starts, and completes on MISSION_ACK. When the vehicle goes quiet the last
+message is sent again, so a lost request, item or ack only costs one
+timeout instead of hanging the transfer.
+
+MissionDownloader keeps a window of MISSION_REQUEST_INT outstanding, so a
+download takes about count / window round trips instead of one round
+trip per item. Items are stored by sequence number, duplicates are
+ignored and the requests left unanswered are sent again. The download
+fails only after several timeouts in a row without any item received.
+
+MissionManager runs both, keeps the mission last known onboard each
+vehicle and only uploads the items which changed, then reads them back.
+
+Both transfers use MISSION_ITEM_INT, with MISSION_ITEM only for vehicles
+sending the deprecated MISSION_REQUEST, and keep the items in a
+MissionTable. Progress and the result are reported by signals, queued to
+the GUI thread.
+'''
+from array import array
+from math import isnan
+from threading import Lock
+from time import monotonic
+
+from pymavlink.mavutil import mavlink
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from gcslog import getLogger
+from waypoint import MAVWaypointParameter, Waypoint
+
+DEFAULT_MISSION_TIMEOUT = 1.0 # seconds without a request or an ack before sending again
+DEFAULT_MISSION_RETRIES = 5 # retransmissions of the same message before giving up
+DEFAULT_MISSION_DOWNLOAD_WINDOW = 8 # MISSION_REQUEST_INT outstanding at once, 1 to request one item per round trip
+MISSION_VERIFY_TOLERANCE = 0.01 # parameters and altitudes read back may be rounded by the vehicle, e.g. to cm
+
+MISSION_FRAME_SCALE = 1 # x and y of MAV_FRAME_MISSION items are sent as they are
+LOCAL_FRAME_SCALE = 1.0e4 # metres to MISSION_ITEM_INT x and y
+GLOBAL_FRAME_SCALE = 1.0e7 # degrees to MISSION_ITEM_INT x and y
+LOCAL_FRAMES = (mavlink.MAV_FRAME_LOCAL_NED, mavlink.MAV_FRAME_LOCAL_ENU, mavlink.MAV_FRAME_LOCAL_OFFSET_NED,
+                mavlink.MAV_FRAME_BODY_NED, mavlink.MAV_FRAME_BODY_OFFSET_NED)
+WAYPOINT_PARAMETERS = (MAVWaypointParameter.PARAM1, MAVWaypointParameter.PARAM2,
+                       MAVWaypointParameter.PARAM3, MAVWaypointParameter.PARAM4)
+
+logger = getLogger('mission')
+
+def positionScale(frame):
+    '''Factor from the x and y of MISSION_ITEM to those of MISSION_ITEM_INT in `frame`'''
+    if frame == mavlink.MAV_FRAME_MISSION:
+        return MISSION_FRAME_SCALE
+    return LOCAL_FRAME_SCALE if frame in LOCAL_FRAMES else GLOBAL_FRAME_SCALE
+
+def _zeros(typecode, size):
+    a = array(typecode)
+    a.frombytes(bytes(a.itemsize * size))
+    return a
+
+def _firstDifference(a, b):
+    '''Index of the first item differing in the arrays `a` and `b`, of the same type and length'''
+    lo, hi = 0, len(a) # a[:lo] == b[:lo] and a[:hi] != b[:hi]
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if a[lo:mid].tobytes() == b[lo:mid].tobytes():
+            lo = mid
+        else:
+            hi = mid
+    return lo
+
+def missionResultName(result):
+    '''The MAV_MISSION_RESULT name of `result`, e.g. MAV_MISSION_DENIED'''
+    entry = mavlink.enums['MAV_MISSION_RESULT'].get(result)
+    return str(result) if entry == None else entry.name
+
+def isMissionMessage(msg):
+    '''True for the mission protocol messages of the flight plan, not the fence or rally points'''
+    return getattr(msg, 'mission_type', mavlink.MAV_MISSION_TYPE_MISSION) == mavlink.MAV_MISSION_TYPE_MISSION
+
+class MissionTable:
+    '''
+    Mission items stored column by column in typed arrays instead of one
+    object per item. The columns hold the fields of MISSION_ITEM_INT: x and
+    y are integers, latitude and longitude in degrees * 1e7 in the global
+    frames, and the parameters are 32 bit floats as on the wire.
+    '''
+
+    COLUMNS = (('command', 'H'), ('frame', 'B'), ('autocontinue', 'B'),
+               ('param1', 'f'), ('param2', 'f'), ('param3', 'f'), ('param4', 'f'),
+               ('x', 'i'), ('y', 'i'), ('z', 'f'))
+
+    def __init__(self, size = 0):
+        for name, typecode in MissionTable.COLUMNS:
+            setattr(self, name, _zeros(typecode, size))
+
+    def __len__(self):
+        return len(self.command)
+
+    def append(self, command, frame, params, x, y, z, autocontinue = 1):
+        '''Add an item, `params` are param1 to param4, x and y are already scaled to integers'''
+        self.command.append(command)
+        self.frame.append(frame)
+        self.autocontinue.append(autocontinue)
+        self.param1.append(params[0])
+        self.param2.append(params[1])
+        self.param3.append(params[2])
+        self.param4.append(params[3])
+        self.x.append(x)
+        self.y.append(y)
+        self.z.append(z)
+
+    def setItem(self, msg):
+        '''Store MISSION_ITEM_INT or MISSION_ITEM at its sequence number'''
+        seq = msg.seq
+        self.command[seq] = msg.command
+        self.frame[seq] = msg.frame
+        self.autocontinue[seq] = msg.autocontinue
+        self.param1[seq] = msg.param1
+        self.param2[seq] = msg.param2
+        self.param3[seq] = msg.param3
+        self.param4[seq] = msg.param4
+        if msg.get_type() == 'MISSION_ITEM_INT':
+            self.x[seq] = msg.x
+            self.y[seq] = msg.y
+        else:
+            scale = positionScale(msg.frame)
+            self.x[seq] = int(round(msg.x * scale))
+            self.y[seq] = int(round(msg.y * scale))
+        self.z[seq] = msg.z
+
+    def itemIntMessage(self, seq, targetSystem, targetComponent):
+        return mavlink.MAVLink_mission_item_int_message(targetSystem, targetComponent, seq,
+                                                        self.frame[seq], self.command[seq], 0, self.autocontinue[seq],
+                                                        self.param1[seq], self.param2[seq], self.param3[seq], self.param4[seq],
+                                                        self.x[seq], self.y[seq], self.z[seq])
+
+    def itemMessage(self, seq, targetSystem, targetComponent):
+        '''The deprecated float MISSION_ITEM, for vehicles sending MISSION_REQUEST'''
+        scale = positionScale(self.frame[seq])
+        return mavlink.MAVLink_mission_item_message(targetSystem, targetComponent, seq,
+                                                    self.frame[seq], self.command[seq], 0, self.autocontinue[seq],
+                                                    self.param1[seq], self.param2[seq], self.param3[seq], self.param4[seq],
+                                                    self.x[seq] / scale, self.y[seq] / scale, self.z[seq])
+
+    def diffRange(self, other):
+        '''
+        The first and last items differing from `other`, None if both
+        tables are the same. The tables must have the same length.
+        '''
+        first = len(self)
+        last = -1
+        for name, _ in MissionTable.COLUMNS:
+            a = getattr(self, name)
+            b = getattr(other, name)
+            if a.tobytes() == b.tobytes():
+                continue
+            first = min(first, _firstDifference(a, b))
+            last = max(last, len(a) - 1 - _firstDifference(a[::-1], b[::-1]))
+        return None if last < 0 else (first, last)
+
+    def matches(self, other, first, last):
+        '''
+        True if the items `first` to `last` were stored by the vehicle as
+        in this table. A NaN parameter is the default of the vehicle and
+        matches any value.
+        '''
+        for seq in range(first, last + 1):
+            if (self.command[seq], self.frame[seq], self.x[seq], self.y[seq]) != \
+               (other.command[seq], other.frame[seq], other.x[seq], other.y[seq]):
+                return False
+            for name in ('param1', 'param2', 'param3', 'param4', 'z'):
+                expected = getattr(self, name)[seq]
+                if isnan(expected) == False and abs(getattr(other, name)[seq] - expected) > MISSION_VERIFY_TOLERANCE:
+                    return False
+        return True
+
+    @staticmethod
+    def fromWaypoints(wpList):
+        table = MissionTable()
+        for wp in wpList:
+            scale = positionScale(wp.frame)
+            table.append(wp.waypointType, wp.frame,
+                         [wp.parameterValue(p) for p in WAYPOINT_PARAMETERS],
+                         int(round(wp.parameterValue(MAVWaypointParameter.PARAM5) * scale)),
+                         int(round(wp.parameterValue(MAVWaypointParameter.PARAM6) * scale)),
+                         wp.parameterValue(MAVWaypointParameter.PARAM7))
+        return table
+
+    def toWaypoints(self):
+        wpList = []
+        columns = (self.param1, self.param2, self.param3, self.param4)
+        for seq in range(len(self)):
+            scale = positionScale(self.frame[seq])
+            wp = Waypoint(seq, self.x[seq] / scale, self.y[seq] / scale, self.z[seq], self.command[seq])
+            wp.frame = self.frame[seq]
+            for param, column in zip(WAYPOINT_PARAMETERS, columns):
+                if isnan(column[seq]) == False:
+                    wp.mavlinkParameters[param] = column[seq]
+            wpList.append(wp)
+        return wpList
+
+class MissionTransfer(QObject):
+    '''
+    Common state of the mission transfers. start() may be called from any
+    thread, the accept*() methods and update() are called by the link
+    thread. `send(msg)` queues a message for transmission.
+    '''
+
+    progressSignal = pyqtSignal(int, int) # items transferred, total items
+    finishedSignal = pyqtSignal(bool, str) # success, message to display
+
+    def __init__(self, send, timeout = DEFAULT_MISSION_TIMEOUT, retries = DEFAULT_MISSION_RETRIES, parent = None):
+        super().__init__(parent)
+        self.send = send
+        self.timeout = timeout
+        self.retries = retries
+        self.lock = Lock()
+        self.items = None # None while idle
+        self.targetSystem = 0
+        self.targetComponent = 0
+
+    def isBusy(self):
+        return self.items != None
+
+    def cancel(self):
+        self._finish(False, 'Mission transfer cancelled')
+
+    def _fromTarget(self, msg):
+        return msg.get_srcSystem() == self.targetSystem and msg.get_srcComponent() == self.targetComponent
+
+    def _finish(self, success, text):
+        '''End the transfer, return False if it was not running'''
+        with self.lock:
+            if self.items == None:
+                return False
+            self.items = None
+            self._clear()
+        if success:
+            logger.info(text)
+        else:
+            logger.warning(text)
+        self.finishedSignal.emit(success, text)
+        return True
+
+    def _clear(self):
+        pass
+
+class MissionUploader(MissionTransfer):
+    '''
+    Upload a MissionTable, or only the items `first` to `last` of it with
+    MISSION_WRITE_PARTIAL_LIST when the vehicle has the other items already.
+    '''
+
+    def __init__(self, send, timeout = DEFAULT_MISSION_TIMEOUT, retries = DEFAULT_MISSION_RETRIES, parent = None):
+        super().__init__(send, timeout, retries, parent)
+        self.lastSent = None # message sent again on timeout
+        self.lastSeq = None # sequence number of lastSent, -1 for MISSION_COUNT
+        self.deadline = 0.0
+        self.retryCount = 0
+        self.first = 0
+        self.last = -1
+        self.requested = 0 # number of items requested so far
+
+    def start(self, table, targetSystem, targetComponent, first = None, last = None):
+        '''Start uploading `table`, return False if a transfer is already running'''
+        with self.lock:
+            if self.items != None:
+                return False
+            self.items = table
+            self.targetSystem = targetSystem
+            self.targetComponent = targetComponent
+            self.requested = 0
+            self.lastSeq = None
+            if first == None:
+                self.first, self.last = 0, len(table) - 1
+                msg = mavlink.MAVLink_mission_count_message(targetSystem, targetComponent, len(table))
+            else:
+                self.first, self.last = first, last
+                msg = mavlink.MAVLink_mission_write_partial_list_message(targetSystem, targetComponent, first, last)
+            self.__sendLocked(msg, -1)
+            total = self.last - self.first + 1
+        logger.info('%d mission items to be sent', total)
+        self.progressSignal.emit(0, total)
+        return True
+
+    def acceptMissionRequest(self, msg):
+        '''Answer MISSION_REQUEST or MISSION_REQUEST_INT'''
+        if self.items == None or isMissionMessage(msg) == False:
+            return
+        with self.lock:
+            if self.items == None or self._fromTarget(msg) == False:
+                return
+            if msg.seq < self.first or msg.seq > self.last:
+                logger.warning('Mission item %d requested, %d to %d sent', msg.seq, self.first, self.last)
+                return
+            total = self.last - self.first + 1
+            if msg.get_type() == 'MISSION_REQUEST_INT':
+                item = self.items.itemIntMessage(msg.seq, self.targetSystem, self.targetComponent)
+            else:
+                item = self.items.itemMessage(msg.seq, self.targetSystem, self.targetComponent)
+            self.__sendLocked(item, msg.seq)
+            requested = msg.seq - self.first + 1
+            progress = requested > self.requested
+            if progress:
+                self.requested = requested
+        if progress:
+            self.progressSignal.emit(requested, total)
+
+    def acceptMissionAck(self, msg):
+        if self.items == None or isMissionMessage(msg) == False or self._fromTarget(msg) == False:
+            return
+        total = self.last - self.first + 1
+        if msg.type != mavlink.MAV_MISSION_ACCEPTED:
+            self._finish(False, 'Mission upload rejected: {}'.format(missionResultName(msg.type)))
+        elif self.requested < total:
+            self._finish(False, 'Mission upload accepted after {} of {} items'.format(self.requested, total))
+        else:
+            self._finish(True, '{} mission items uploaded'.format(total))
+
+    def update(self, now = None):
+        '''Send the last message again if the vehicle did not answer in time'''
+        if self.items == None:
+            return
+        now = monotonic() if now == None else now
+        with self.lock:
+            if self.items == None or now < self.deadline:
+                return
+            if self.retryCount >= self.retries:
+                total = self.last - self.first + 1
+                if self.requested == total and total > 0:
+                    # the vehicle may have the mission and the ack was lost
+                    failed = 'Mission upload not acknowledged, download the mission to check it'
+                else:
+                    failed = 'Mission upload timeout after {} of {} items'.format(self.requested, total)
+            else:
+                failed = None
+                self.retryCount += 1
+                logger.info('No answer to %s, retry %d', self.lastSent.get_type(), self.retryCount)
+                self.send(self.lastSent)
+                self.deadline = now + self.timeout
+        if failed != None:
+            self._finish(False, failed)
+
+    def __sendLocked(self, msg, seq):
+        if seq != self.lastSeq:
+            self.retryCount = 0
+        self.lastSent = msg
+        self.lastSeq = seq
+        self.deadline = monotonic() + self.timeout
+        self.send(msg)
+
+    def _clear(self):
+        self.lastSent = None
+
+class MissionDownloader(MissionTransfer):
+    '''
+    Download the mission of a vehicle, or only its items `first` to `last`,
+    `missionReceivedSignal` passes the MissionTable received.
+    '''
+
+    missionReceivedSignal = pyqtSignal(object)
+
+    def __init__(self, send, timeout = DEFAULT_MISSION_TIMEOUT, retries = DEFAULT_MISSION_RETRIES,
+                 window = DEFAULT_MISSION_DOWNLOAD_WINDOW, parent = None):
+        super().__init__(send, timeout, retries, parent)
+        self.window = max(1, window)
+        self.count = None # None until MISSION_COUNT is received
+        self.first = 0
+        self.last = None # the last item of the mission if None
+        self.end = -1 # the last item to download, known with the count
+        self.receivedMap = bytearray() # 1 for each item received
+        self.received = 0
+        self.duplicates = 0
+        self.nextSeq = 0 # lowest sequence number never requested
+        self.outstanding = {} # seq -> deadline
+        self.stalls = 0 # timeouts since the last item received
+        self.listDeadline = 0.0
+
+    def start(self, targetSystem, targetComponent, first = 0, last = None):
+        '''Request the mission list, return False if a transfer is already running'''
+        with self.lock:
+            if self.items != None:
+                return False
+            self.items = MissionTable()
+            self.receivedMap = bytearray()
+            self.targetSystem = targetSystem
+            self.targetComponent = targetComponent
+            self.first = first
+            self.last = last
+            self.count = None
+            self.received = 0
+            self.duplicates = 0
+            self.nextSeq = 0
+            self.outstanding = {}
+            self.stalls = 0
+            self.__requestList()
+        return True
+
+    def acceptMissionCount(self, msg):
+        if self.items == None or isMissionMessage(msg) == False:
+            return
+        with self.lock:
+            if self.items == None or self.count != None or self._fromTarget(msg) == False:
+                return
+            self.count = msg.count
+            self.end = msg.count - 1 if self.last == None else self.last
+            total = self.end - self.first + 1
+            if self.end < msg.count:
+                self.items = MissionTable(msg.count)
+                self.receivedMap = bytearray(msg.count)
+                self.nextSeq = self.first
+                if total > 0:
+                    self.__fillWindow(monotonic())
+                else:
+                    self.__sendAck()
+        logger.info('%d mission items onboard', msg.count)
+        if self.end >= msg.count:
+            self._finish(False, 'Mission download failed, item {} requested, only {} items'.format(self.end, msg.count))
+        elif total > 0:
+            self.progressSignal.emit(0, total)
+        else:
+            self.__complete()
+
+    def acceptMissionItem(self, msg):
+        '''Store MISSION_ITEM_INT or MISSION_ITEM'''
+        if self.items == None or isMissionMessage(msg) == False:
+            return
+        with self.lock:
+            if self.items == None or self.count == None or self._fromTarget(msg) == False:
+                return
+            if msg.seq < self.first or msg.seq > self.end:
+                logger.warning('Mission item %d received, %d to %d requested', msg.seq, self.first, self.end)
+                return
+            if self.receivedMap[msg.seq] != 0:
+                self.duplicates += 1
+                return
+            self.items.setItem(msg)
+            self.receivedMap[msg.seq] = 1
+            self.outstanding.pop(msg.seq, None)
+            self.received += 1
+            self.stalls = 0
+            total = self.end - self.first + 1
+            done = self.received == total
+            if done:
+                self.__sendAck()
+            else:
+                self.__fillWindow(monotonic())
+            received = self.received
+        self.progressSignal.emit(received, total)
+        if done:
+            self.__complete()
+
+    def acceptMissionAck(self, msg):
+        '''The vehicle aborted the download'''
+        if self.items == None or isMissionMessage(msg) == False or self._fromTarget(msg) == False:
+            return
+        if msg.type == mavlink.MAV_MISSION_INVALID_SEQUENCE and self.window > 1:
+            # the vehicle only answers the requests in sequence
+            with self.lock:
+                logger.info('Mission requests out of sequence refused, requesting one item at a time')
+                self.window = 1
+                missing = self.receivedMap.find(0, self.first, self.end + 1)
+                self.nextSeq = self.end + 1 if missing < 0 else missing
+                self.outstanding = {}
+                self.__fillWindow(monotonic())
+            return
+        if msg.type != mavlink.MAV_MISSION_ACCEPTED:
+            self._finish(False, 'Mission download rejected: {}'.format(missionResultName(msg.type)))
+
+    def update(self, now = None):
+        '''Request again the items not received in time'''
+        if self.items == None:
+            return
+        now = monotonic() if now == None else now
+        failed = None
+        with self.lock:
+            if self.items == None:
+                return
+            if self.count == None:
+                if now >= self.listDeadline:
+                    if self.stalls >= self.retries:
+                        failed = 'Mission download timeout, no mission count received'
+                    else:
+                        self.stalls += 1
+                        self.__requestList()
+            else:
+                expired = sorted(seq for seq, deadline in self.outstanding.items() if now >= deadline) # lowest gap first
+                if len(expired) > 0:
+                    if self.stalls >= self.retries:
+                        failed = 'Mission download timeout after {} of {} items'.format(self.received,
+                                                                                         self.end - self.first + 1)
+                    else:
+                        self.stalls += 1
+                        for seq in expired:
+                            self.outstanding[seq] = now + self.timeout
+                            self.__requestItem(seq)
+        if failed != None:
+            self._finish(False, failed)
+
+    def __requestList(self):
+        self.listDeadline = monotonic() + self.timeout
+        self.send(mavlink.MAVLink_mission_request_list_message(self.targetSystem, self.targetComponent))
+
+    def __requestItem(self, seq):
+        self.send(mavlink.MAVLink_mission_request_int_message(self.targetSystem, self.targetComponent, seq))
+
+    def __fillWindow(self, now):
+        while len(self.outstanding) < self.window and self.nextSeq <= self.end:
+            if self.receivedMap[self.nextSeq] == 0:
+                self.outstanding[self.nextSeq] = now + self.timeout
+                self.__requestItem(self.nextSeq)
+            self.nextSeq += 1
+
+    def __sendAck(self):
+        self.send(mavlink.MAVLink_mission_ack_message(self.targetSystem, self.targetComponent, mavlink.MAV_MISSION_ACCEPTED))
+
+    def __complete(self):
+        items = self.items
+        if self._finish(True, '{} mission items downloaded'.format(self.end - self.first + 1)):
+            if self.duplicates > 0:
+                logger.info('%d duplicate mission items ignored', self.duplicates)
+            self.missionReceivedSignal.emit(items)
+
+class MissionManager(QObject):
+    '''
+    Transfer missions and keep the last mission known to be onboard each
+    vehicle, downloaded or uploaded and verified. An upload of a mission
+    of the same length only sends the range of items which changed, with
+    MISSION_WRITE_PARTIAL_LIST, and the whole mission otherwise or if the
+    vehicle refuses partial writes. With `verify` the items uploaded are
+    read back and compared.
+    '''
+
+    progressSignal = pyqtSignal(int, int) # items transferred, total items
+    finishedSignal = pyqtSignal(bool, str) # success, message to display
+    missionReceivedSignal = pyqtSignal(object) # MissionTable downloaded on request
+
+    def __init__(self, send, timeout = DEFAULT_MISSION_TIMEOUT, retries = DEFAULT_MISSION_RETRIES,
+                 window = DEFAULT_MISSION_DOWNLOAD_WINDOW, verify = True, parent = None):
+        super().__init__(parent)
+        self.uploader = MissionUploader(send, timeout, retries)
+        self.downloader = MissionDownloader(send, timeout, retries, window)
+        self.verify = verify
+        self.onboard = {} # (system id, component id) -> MissionTable
+        self.pendingUpload = None # (vehicle, table, first, last) until the upload is verified
+        self.downloadTarget = None
+        self.uploader.progressSignal.connect(self.progressSignal)
+        self.downloader.progressSignal.connect(self.progressSignal)
+        self.uploader.finishedSignal.connect(self.__uploadFinished)
+        self.downloader.finishedSignal.connect(self.__downloadFinished)
+        self.downloader.missionReceivedSignal.connect(self.__missionReceived)
+
+    def isBusy(self):
+        return self.uploader.isBusy() or self.downloader.isBusy() or self.pendingUpload != None
+
+    def download(self, targetSystem, targetComponent):
+        '''Download the whole mission, return False if a transfer is already running'''
+        if self.isBusy() or self.downloader.start(targetSystem, targetComponent) == False:
+            return False
+        self.downloadTarget = (targetSystem, targetComponent)
+        return True
+
+    def upload(self, table, targetSystem, targetComponent):
+        '''Upload the items of `table` not onboard yet, return False if a transfer is already running'''
+        if self.isBusy():
+            return False
+        vehicle = (targetSystem, targetComponent)
+        onboard = self.onboard.get(vehicle)
+        first, last = 0, len(table) - 1
+        if onboard != None and len(onboard) == len(table):
+            changed = onboard.diffRange(table)
+            if changed == None:
+                self.finishedSignal.emit(True, 'Mission unchanged, {} items onboard'.format(len(table)))
+                return True
+            first, last = changed
+        self.pendingUpload = (vehicle, table, first, last)
+        if first > 0 or last < len(table) - 1:
+            logger.info('Mission items %d to %d changed', first, last)
+            return self.uploader.start(table, targetSystem, targetComponent, first, last)
+        return self.uploader.start(table, targetSystem, targetComponent)
+
+    def acceptMissionRequest(self, msg):
+        self.uploader.acceptMissionRequest(msg)
+
+    def acceptMissionCount(self, msg):
+        self.downloader.acceptMissionCount(msg)
+
+    def acceptMissionItem(self, msg):
+        self.downloader.acceptMissionItem(msg)
+
+    def acceptMissionAck(self, msg):
+        self.uploader.acceptMissionAck(msg)
+        self.downloader.acceptMissionAck(msg)
+
+    def update(self, now = None):
+        self.uploader.update(now)
+        self.downloader.update(now)
+
+    def cancel(self):
+        self.pendingUpload = None
+        self.uploader.cancel()
+        self.downloader.cancel()
+
+    def __uploadFinished(self, success, text):
+        if self.pendingUpload == None:
+            self.finishedSignal.emit(success, text)
+            return
+        vehicle, table, first, last = self.pendingUpload
+        self.onboard.pop(vehicle, None) # unknown until verified
+        if success == False and (first > 0 or last < len(table) - 1):
+            logger.info('Partial mission upload failed (%s), sending the whole mission', text)
+            self.pendingUpload = (vehicle, table, 0, len(table) - 1)
+            self.uploader.start(table, *vehicle)
+            return
+        if success and self.verify and len(table) > 0:
+            self.downloader.start(*vehicle, first, last)
+            return
+        self.pendingUpload = None
+        if success:
+            self.onboard[vehicle] = table
+        self.finishedSignal.emit(success, text)
+
+    def __downloadFinished(self, success, text):
+        if self.pendingUpload == None:
+            self.finishedSignal.emit(success, text)
+        elif success == False:
+            self.pendingUpload = None
+            self.finishedSignal.emit(False, 'Mission upload not verified: {}'.format(text))
+        # the items read back are checked by __missionReceived()
+
+    def __missionReceived(self, table):
+        if self.pendingUpload == None:
+            if self.downloadTarget != None:
+                self.onboard[self.downloadTarget] = table
+            self.missionReceivedSignal.emit(table)
+            return
+        vehicle, uploaded, first, last = self.pendingUpload
+        self.pendingUpload = None
+        if len(table) == len(uploaded) and uploaded.matches(table, first, last):
+            self.onboard[vehicle] = uploaded
+            self.finishedSignal.emit(True, '{} mission items uploaded and verified'.format(last - first + 1))
+        else:
+            logger.warning('Mission items read back differ from the items uploaded')
+            self.finishedSignal.emit(False, 'Mission upload verification failed')
@@ -0,0 +1,160 @@
+'''
+Network links for MAVLinkConnection: UDP listen/connect and TCP client.
+Sockets are non-blocking with large receive buffers, so bursts are kept
+by the kernel while the link thread is busy. The TCP client never blocks
+the link thread, it connects in the background and reconnects with an
+exponential backoff when the connection is refused or lost.
+'''
+import errno
+import socket
+from time import monotonic
+
+from pymavlink import mavutil
+
+from gcslog import getLogger
+
+DEFAULT_UDP_PORT = 14550
+DEFAULT_TCP_PORT = 5760
+DEFAULT_RECEIVE_BUFFER_SIZE = 4 * 1024 * 1024 # bytes, the kernel may grant less
+RECONNECT_MIN_DELAY = 0.5 # seconds
+RECONNECT_MAX_DELAY = 10.0 # seconds
+TCP_MAX_PENDING_TX = 64 * 1024 # bytes queued while the socket is not writable, older data is dropped beyond
+
+PROTOCOL_UDP_LISTEN = 'UDP_LISTEN'
+PROTOCOL_UDP_CONNECT = 'UDP_CONNECT'
+PROTOCOL_TCP_CLIENT = 'TCP_CLIENT'
+NETWORK_PROTOCOLS = {
+    PROTOCOL_UDP_LISTEN : 'UDP (listen)',
+    PROTOCOL_UDP_CONNECT : 'UDP (connect)',
+    PROTOCOL_TCP_CLIENT : 'TCP client'
+}
+
+logger = getLogger('nettransport')
+
+def setReceiveBufferSize(sock, size):
+    '''Request a receive buffer of `size` bytes, return the size granted'''
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, size)
+    except OSError as e:
+        logger.warning('Unable to set the receive buffer size: %s', e)
+    granted = sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+    if granted < size:
+        # Linux caps the size to net.core.rmem_max (and reports it doubled)
+        logger.info('Receive buffer of %d bytes requested, %d granted', size, granted)
+    return granted
+
+def openNetworkConnection(protocol, host, port, receiveBufferSize = DEFAULT_RECEIVE_BUFFER_SIZE):
+    '''Return a pymavlink connection for one of NETWORK_PROTOCOLS'''
+    if protocol == PROTOCOL_TCP_CLIENT:
+        return TCPClientConnection(host, port, receiveBufferSize)
+    if protocol == PROTOCOL_UDP_LISTEN:
+        conn = mavutil.mavlink_connection('udpin:{}:{}'.format(host, port))
+    elif protocol == PROTOCOL_UDP_CONNECT:
+        conn = mavutil.mavlink_connection('udpout:{}:{}'.format(host, port))
+    else:
+        raise ValueError('Unknown network protocol: {}'.format(protocol))
+    setReceiveBufferSize(conn.port, receiveBufferSize)
+    if protocol == PROTOCOL_UDP_CONNECT:
+        # the vehicle only learns our address from the packets we send
+        conn.mav.heartbeat_send(mavutil.mavlink.MAV_TYPE_GCS, mavutil.mavlink.MAV_AUTOPILOT_INVALID, 0, 0, 0)
+    return conn
+
+class TCPClientConnection(mavutil.mavfile):
+    '''
+    A TCP client link which connects without blocking. recv() returns no
+    data while the link is down and write() queues a little data, then
+    drops it. After a refused or lost connection the next attempt is made
+    from recv(), the delay doubling from RECONNECT_MIN_DELAY up to
+    RECONNECT_MAX_DELAY and reset once data is received again.
+    '''
+
+    def __init__(self, host, port, receiveBufferSize = DEFAULT_RECEIVE_BUFFER_SIZE, source_system = 255, source_component = 0):
+        self.destination_addr = (host, port)
+        self.receiveBufferSize = receiveBufferSize
+        self.port = None
+        self.closed = False
+        self.connected = False
+        self.reconnectDelay = RECONNECT_MIN_DELAY
+        self.nextAttempt = 0.0
+        self.reconnects = 0
+        self.txPending = bytearray()
+        mavutil.mavfile.__init__(self, None, 'tcp:{}:{}'.format(host, port),
+                                 source_system = source_system, source_component = source_component)
+        self.__connect()
+
+    @property
+    def reconnecting(self):
+        '''True while waiting for the next connection attempt, there is no descriptor to wait on'''
+        return self.port == None
+
+    def __connect(self):
+        self.port = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        setReceiveBufferSize(self.port, self.receiveBufferSize) # before connecting, for window scaling
+        self.port.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.port.setblocking(False)
+        mavutil.set_close_on_exec(self.port.fileno())
+        err = self.port.connect_ex(self.destination_addr)
+        if err not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY):
+            self.__disconnect(errno.errorcode.get(err, err))
+            return
+        self.fd = self.port.fileno()
+
+    def __disconnect(self, reason):
+        if self.port != None:
+            self.port.close()
+            self.port = None
+        self.fd = None
+        self.connected = False
+        self.txPending = bytearray()
+        self.nextAttempt = monotonic() + self.reconnectDelay
+        logger.warning('TCP link %s:%d down (%s), reconnecting in %.1f s',
+                       self.destination_addr[0], self.destination_addr[1], reason, self.reconnectDelay)
+        self.reconnectDelay = min(self.reconnectDelay * 2, RECONNECT_MAX_DELAY)
+
+    def recv(self, n = None):
+        if self.port == None:
+            if self.closed == False and monotonic() >= self.nextAttempt:
+                self.reconnects += 1
+                self.__connect()
+            return b''
+        if n == None:
+            n = self.mav.bytes_needed()
+        try:
+            data = self.port.recv(n)
+        except (BlockingIOError, InterruptedError):
+            return b''
+        except OSError as e:
+            if e.errno == errno.ENOTCONN:
+                return b'' # still connecting
+            self.__disconnect(e)
+            return b''
+        if len(data) == 0:
+            self.__disconnect('EOF')
+            return b''
+        if self.connected == False:
+            self.connected = True
+            self.reconnectDelay = RECONNECT_MIN_DELAY
+            logger.info('TCP link %s:%d connected', *self.destination_addr)
+        return data
+
+    def write(self, buf):
+        if self.port == None:
+            return
+        self.txPending += buf
+        if len(self.txPending) > TCP_MAX_PENDING_TX:
+            del self.txPending[:len(self.txPending) - TCP_MAX_PENDING_TX]
+        try:
+            sent = self.port.send(self.txPending)
+            del self.txPending[:sent]
+        except (BlockingIOError, InterruptedError):
+            pass # not connected yet or the send buffer is full, keep the data
+        except OSError as e:
+            if e.errno != errno.ENOTCONN:
+                self.__disconnect(e)
+
+    def close(self):
+        self.closed = True
+        if self.port != None:
+            self.port.close()
+            self.port = None
+        self.fd = None
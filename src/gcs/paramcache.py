@@ -0,0 +1,100 @@
+'''
+On-disk cache of the onboard parameters, one JSON file per vehicle named
+after the UID of its AUTOPILOT_VERSION. A cached parameter set carries a
+CRC computed over the names, values and types of its parameters, checked
+when the file is loaded and compared with a fresh download to tell
+whether the parameters changed, and the hash the vehicle reported for it
+as the `_HASH_CHECK` parameter, when the vehicle supports it.
+'''
+import json
+import os
+import struct
+import zlib
+
+from pymavlink.mavutil import mavlink
+
+from gcslog import getLogger
+
+PARAM_CACHE_DIRECTORY = 'minigcs_params'
+HASH_CHECK_PARAM_ID = '_HASH_CHECK' # read to get the hash of the onboard parameters, not a parameter itself
+
+logger = getLogger('paramcache')
+
+def vehicleUID(msg):
+    '''The unique id of the board sending the AUTOPILOT_VERSION `msg`, None if it has none'''
+    uid2 = bytes(getattr(msg, 'uid2', None) or b'') # MAVLink 2 only, supersedes uid
+    if any(uid2):
+        return uid2.hex().upper()
+    if msg.uid != 0:
+        return '{:016X}'.format(msg.uid)
+    return None
+
+def hashCheckValue(msg):
+    '''The hash carried by a `_HASH_CHECK` PARAM_VALUE, the bits of its float value'''
+    return struct.unpack('<I', struct.pack('<f', msg.param_value))[0]
+
+def parameterHash(params):
+    '''CRC32 of a list of PARAM_VALUE, in their order'''
+    crc = 0
+    for msg in params:
+        crc = zlib.crc32(msg.param_id.encode('utf-8'), crc)
+        crc = zlib.crc32(struct.pack('<fB', msg.param_value, msg.param_type), crc)
+    return crc
+
+class CachedParameters:
+    '''A parameter set read from the cache'''
+
+    __slots__ = ('uid', 'params', 'crc', 'vehicleHash')
+
+    def __init__(self, uid, params, crc, vehicleHash):
+        self.uid = uid
+        self.params = params # PARAM_VALUE by index
+        self.crc = crc
+        self.vehicleHash = vehicleHash # None if the vehicle did not report a hash
+
+class ParameterCache:
+    '''The parameter files in `directory`, created on the first save'''
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, uid):
+        return os.path.join(self.directory, '{}.json'.format(uid))
+
+    def load(self, uid):
+        '''Return the CachedParameters of `uid`, None if there is none or it is damaged'''
+        try:
+            with open(self.path(uid), 'r') as f:
+                data = json.load(f)
+            entries = data['params']
+            count = len(entries)
+            params = [mavlink.MAVLink_param_value_message(name, value, ptype, count, index)
+                      for index, (name, value, ptype) in enumerate(entries)]
+            crc = parameterHash(params)
+            if crc != data['crc']:
+                logger.warning('Parameter cache of %s damaged, ignored', uid)
+                return None
+            return CachedParameters(uid, params, crc, data.get('vehicleHash'))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning('Unable to read the parameter cache of %s: %s', uid, e)
+            return None
+
+    def save(self, uid, params, vehicleHash = None):
+        '''Store a complete parameter set of `uid`, return its CRC'''
+        crc = parameterHash(params)
+        data = {
+            'crc' : crc,
+            'vehicleHash' : vehicleHash,
+            'params' : [(msg.param_id, msg.param_value, msg.param_type) for msg in params]
+        }
+        path = self.path(uid)
+        try:
+            os.makedirs(self.directory, exist_ok = True)
+            with open(path + '.tmp', 'w') as f:
+                json.dump(data, f)
+            os.replace(path + '.tmp', path) # never leave a partial file behind
+        except OSError as e:
+            logger.warning('Unable to write the parameter cache of %s: %s', uid, e)
+        return crc
@@ -1,8 +1,25 @@
+'''
+Onboard parameter editor. The parameters are kept by ParameterModel in
+columns sorted by name, formatted only when a row is displayed, and the
+edits are kept apart from the onboard values, so listing the changes
+costs one step per changed parameter. ParameterFilterModel shows the
+parameters matching a name prefix, found by binary search, or a regular
+expression, or only the changed ones. A parameter file is loaded as
+edits, which leaves only its differences with the onboard values.
+'''
+import re
+from array import array
+from bisect import bisect_left
+
 from pymavlink.mavutil import mavlink
-from PyQt5.QtCore import Qt, pyqtSignal
-from PyQt5.QtWidgets import (QFileDialog, QHBoxLayout, QHeaderView,
-                             QMessageBox, QPushButton, QTableWidget,
-                             QTableWidgetItem, QVBoxLayout, QWidget)
+from PyQt5.QtCore import QAbstractProxyModel, QAbstractTableModel, QModelIndex, Qt, pyqtSignal
+from PyQt5.QtGui import QFont
+from PyQt5.QtWidgets import (QCheckBox, QFileDialog, QHBoxLayout, QHeaderView,
+                             QLineEdit, QMessageBox, QPushButton, QTableView,
+                             QVBoxLayout, QWidget)
+
+from paramfile import ParameterFileError, readParameterFile
+from utils import toFloat32
 
 PARAM_VALUE_TYPE_NAMES = {
     mavlink.MAV_PARAM_TYPE_UINT8 : '8-bit unsigned integer',
@@ -16,107 +33,284 @@ PARAM_VALUE_TYPE_NAMES = {
     mavlink.MAV_PARAM_TYPE_REAL32 : '32-bit floating-point',
     mavlink.MAV_PARAM_TYPE_REAL64 : '64-bit floating-point'
 }
+INTEGER_PARAM_TYPES = (mavlink.MAV_PARAM_TYPE_UINT8, mavlink.MAV_PARAM_TYPE_INT8,
+                       mavlink.MAV_PARAM_TYPE_UINT16, mavlink.MAV_PARAM_TYPE_INT16,
+                       mavlink.MAV_PARAM_TYPE_UINT32, mavlink.MAV_PARAM_TYPE_INT32,
+                       mavlink.MAV_PARAM_TYPE_UINT64, mavlink.MAV_PARAM_TYPE_INT64)
 
 PARAM_TYPE_RAW_ROLE = Qt.UserRole + 1
+PARAM_NAME_PATTERN = re.compile(r'^\w*$') # a filter made of these characters is a name prefix
+
+NAME_COLUMN = 0
+VALUE_COLUMN = 1
+TYPE_COLUMN = 2
+COLUMN_HEADERS = ('Name', 'Value', 'Type')
 
-class ParameterList(QTableWidget):
+def formatFloat32(value):
+    '''The shortest text reading back as the 32 bit float `value`'''
+    for digits in range(6, 10):
+        text = '{:.{}g}'.format(value, digits)
+        if toFloat32(float(text)) == value:
+            return text
+    return repr(value)
+
+class ParameterModel(QAbstractTableModel):
+    '''
+    Parameters of a vehicle, one row per parameter sorted by name.
+    Only the value column is editable, the edits are validated by type.
+    '''
 
     def __init__(self, paramList, parent = None):
         super().__init__(parent)
-        self.paramNameIndexCache = {}
-        self.allParams = {}
-        self.changedParams = []
-        self.paramList = sorted(paramList, key = lambda p: p.param_id)
-        print('Init param list with {} params.'.format(len(self.paramList)))
-        self.createTableHeader()
-        self.createTableBody(self.paramList)
+        params = sorted(paramList, key = lambda p: p.param_id.upper())
+        self.names = [p.param_id for p in params]
+        self.rowOf = {name : row for row, name in enumerate(self.names)}
+        self.keys = [name.upper() for name in self.names] # sorted, for prefix search
+        self.types = array('B', [p.param_type for p in params])
+        self.values = array('d', [p.param_value for p in params]) # onboard values
+        self.edits = {} # row -> value different from the onboard value
+        self.editFont = QFont()
+        self.editFont.setBold(True)
+
+    def rowCount(self, parent = QModelIndex()):
+        return 0 if parent.isValid() else len(self.names)
+
+    def columnCount(self, parent = QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMN_HEADERS)
+
+    def headerData(self, section, orientation, role = Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return COLUMN_HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+    def flags(self, index):
+        flags = super().flags(index)
+        if index.column() == VALUE_COLUMN and self.types[index.row()] in PARAM_VALUE_TYPE_NAMES:
+            flags |= Qt.ItemIsEditable
+        return flags
+
+    def data(self, index, role = Qt.DisplayRole):
+        row, column = index.row(), index.column()
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            if column == NAME_COLUMN:
+                return self.names[row]
+            if column == VALUE_COLUMN:
+                return self.formatValue(row, self.value(row))
+            ptype = self.types[row]
+            return PARAM_VALUE_TYPE_NAMES.get(ptype, 'UNKNOWN TYPE: {}'.format(ptype))
+        if role == Qt.FontRole and row in self.edits:
+            return self.editFont
+        if role == PARAM_TYPE_RAW_ROLE:
+            return self.types[row]
+        return None
+
+    def setData(self, index, value, role = Qt.EditRole):
+        if role != Qt.EditRole or index.column() != VALUE_COLUMN:
+            return False
+        row = index.row()
+        try:
+            value = self.parseValue(row, value)
+        except ValueError:
+            return False # the editor keeps the previous value
+        if value == self.values[row]:
+            self.edits.pop(row, None)
+        else:
+            self.edits[row] = value
+        self.dataChanged.emit(self.index(row, NAME_COLUMN), self.index(row, TYPE_COLUMN))
+        return True
+
+    def value(self, row):
+        return self.edits.get(row, self.values[row])
 
-    def createTableHeader(self):
+    def formatValue(self, row, value):
+        ptype = self.types[row]
+        if ptype in INTEGER_PARAM_TYPES:
+            return str(int(value))
+        if ptype == mavlink.MAV_PARAM_TYPE_REAL32:
+            return formatFloat32(value)
+        return str(float(value))
+
+    def parseValue(self, row, text):
+        '''The value of `text` for the type of `row`, raise ValueError if it is not one'''
+        text = str(text).strip()
+        if self.types[row] in INTEGER_PARAM_TYPES:
+            try:
+                return int(text)
+            except ValueError:
+                pass # e.g. 1.0
+        return self.convertValue(row, float(text))
+
+    def convertValue(self, row, value):
+        '''The number `value` as stored for the type of `row`, raise ValueError if it is not one'''
+        ptype = self.types[row]
+        if ptype in INTEGER_PARAM_TYPES:
+            if float(value).is_integer() == False:
+                raise ValueError('{} is an integer parameter'.format(self.names[row]))
+            return int(value)
+        if ptype == mavlink.MAV_PARAM_TYPE_REAL32:
+            return toFloat32(value)
+        return float(value)
+
+    def applyValues(self, values):
         '''
-        [param_index], param_id, param_value, param_type
+        Edit the parameters to the (name, value) of `values`, return the
+        number of values different from the onboard ones and the names
+        unknown or not valid for their parameter.
         '''
-        hdr = ['Name', 'Value', 'Type']
-        self.setColumnCount(len(hdr))
-        self.setHorizontalHeaderLabels(hdr)
+        self.edits.clear()
+        rejected = []
+        for name, value in values:
+            row = self.rowOf.get(name)
+            if row == None or self.types[row] not in PARAM_VALUE_TYPE_NAMES:
+                rejected.append(name)
+                continue
+            try:
+                value = self.convertValue(row, value)
+            except ValueError:
+                rejected.append(name)
+                continue
+            if value != self.values[row]:
+                self.edits[row] = value
+        if len(self.names) > 0:
+            self.dataChanged.emit(self.index(0, NAME_COLUMN), self.index(len(self.names) - 1, TYPE_COLUMN))
+        return len(self.edits), rejected
+
+    def changedRows(self):
+        return sorted(self.edits)
+
+    def changedParameters(self):
+        '''PARAM_VALUE messages of the edited parameters, with their new values'''
+        rows = self.changedRows()
+        return [mavlink.MAVLink_param_value_message(self.names[row], self.edits[row], self.types[row], len(rows), i)
+                for i, row in enumerate(rows)]
+
+    def allValues(self):
+        '''Name and current value of every parameter, edits included'''
+        return [(self.names[row], self.formatValue(row, self.value(row))) for row in range(len(self.names))]
+
+    def prefixRange(self, prefix):
+        '''First and past the last row whose name starts with `prefix`, case insensitive'''
+        key = prefix.upper()
+        first = bisect_left(self.keys, key)
+        last = bisect_left(self.keys, key + '\uffff', first)
+        return first, last
+
+class ParameterFilterModel(QAbstractProxyModel):
+    '''
+    Rows of a ParameterModel matching a filter, in their order. The rows
+    shown are kept as a list of source rows, so the view only asks for
+    those and mapping an index is a lookup or a binary search.
+    '''
+
+    def __init__(self, source, parent = None):
+        super().__init__(parent)
+        self.pattern = ''
+        self.changedOnly = False
+        self.rows = range(source.rowCount())
+        self.setSourceModel(source)
+        source.dataChanged.connect(self.__sourceDataChanged)
+
+    def setFilter(self, pattern):
+        '''Show the names starting with `pattern`, or matching it as a regular expression, return False if invalid'''
+        if PARAM_NAME_PATTERN.match(pattern) == None:
+            try:
+                re.compile(pattern, re.IGNORECASE)
+            except re.error:
+                return False
+        self.pattern = pattern
+        self.__refilter()
+        return True
+
+    def setChangedOnly(self, changedOnly):
+        self.changedOnly = changedOnly
+        self.__refilter()
+
+    def __refilter(self):
+        source = self.sourceModel()
+        if self.changedOnly:
+            rows = source.changedRows()
+            if self.pattern != '':
+                rows = [row for row in rows if self.__matches(source.names[row])]
+        elif PARAM_NAME_PATTERN.match(self.pattern) != None:
+            rows = range(*source.prefixRange(self.pattern))
+        else:
+            regex = re.compile(self.pattern, re.IGNORECASE)
+            rows = [row for row, name in enumerate(source.names) if regex.search(name) != None]
+        self.beginResetModel()
+        self.rows = rows
+        self.endResetModel()
+
+    def __matches(self, name):
+        if PARAM_NAME_PATTERN.match(self.pattern) != None:
+            return name.upper().startswith(self.pattern.upper())
+        return re.search(self.pattern, name, re.IGNORECASE) != None
+
+    def __sourceDataChanged(self, topLeft, bottomRight):
+        first = self.mapFromSource(topLeft)
+        last = self.mapFromSource(bottomRight)
+        if first.isValid() and last.isValid():
+            self.dataChanged.emit(first, last)
+
+    def index(self, row, column, parent = QModelIndex()):
+        if parent.isValid() or row < 0 or row >= len(self.rows) or column < 0 or column >= len(COLUMN_HEADERS):
+            return QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index = QModelIndex()):
+        return QModelIndex()
+
+    def rowCount(self, parent = QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent = QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMN_HEADERS)
+
+    def headerData(self, section, orientation, role = Qt.DisplayRole):
+        if orientation == Qt.Horizontal:
+            return self.sourceModel().headerData(section, orientation, role)
+        return None
+
+    def mapToSource(self, index):
+        if index.isValid() == False:
+            return QModelIndex()
+        return self.sourceModel().index(self.rows[index.row()], index.column())
+
+    def mapFromSource(self, index):
+        if index.isValid() == False:
+            return QModelIndex()
+        row = index.row()
+        if isinstance(self.rows, range):
+            i = row - self.rows.start
+        else:
+            i = bisect_left(self.rows, row)
+        if i < 0 or i >= len(self.rows) or self.rows[i] != row:
+            return QModelIndex()
+        return self.createIndex(i, index.column())
+
+class ParameterList(QTableView):
+
+    def __init__(self, paramList, parent = None):
+        super().__init__(parent)
+        self.parameterModel = ParameterModel(paramList, self)
+        self.filterModel = ParameterFilterModel(self.parameterModel, self)
+        self.setModel(self.filterModel)
+        self.verticalHeader().hide()
         self.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
 
-    def createTableBody(self, plist, correctCount = False):
-        rowNumber = 0
-        paramCount = len(plist)
-        self.setRowCount(paramCount)
-        for param in plist:
-            self.paramNameIndexCache[param.param_id] = rowNumber
-            if correctCount:
-                param.param_count = paramCount
-            name = QTableWidgetItem(param.param_id)
-            name.setFlags(name.flags() ^ Qt.ItemIsEditable)
-            vstr = None
-            if self._isIntegerType(param.param_type):
-                vstr = str(int(param.param_value))
-            elif self._isFloatType(param.param_type):
-                vstr = str(float(param.param_value))
-            else:
-                vstr = str(param.param_value)
-            value = QTableWidgetItem(vstr)
-            pstr = None
-            if param.param_type in PARAM_VALUE_TYPE_NAMES:
-                pstr = PARAM_VALUE_TYPE_NAMES[param.param_type]
-            else:
-                pstr = 'UNKNOWN TYPE: {}'.format(param.param_type)
-            ptype = QTableWidgetItem(pstr)
-            ptype.setData(PARAM_TYPE_RAW_ROLE, int(param.param_type))
-            ptype.setFlags(ptype.flags() ^ Qt.ItemIsEditable)
-            self.setItem(rowNumber, 0, name)
-            self.setItem(rowNumber, 1, value)
-            self.setItem(rowNumber, 2, ptype)
-            rowNumber += 1
-        self.resizeRowsToContents()
-        self.resizeColumnsToContents()
-
-    def showChangedParametersOnly(self):
-        while self.rowCount() > 0:  # Remove current parameters, if any
-            self.removeRow(0)
-        self.createTableBody(self.changedParams, True)
-
-    def collectTableBody(self):
-        self.changedParams.clear()
-        self.allParams.clear()
-        changedParamIdx = 0
-        for rowNumber in range(self.rowCount()):
-            name = self.item(rowNumber, 0).text()
-            ptype = self.item(rowNumber, 2).data(PARAM_TYPE_RAW_ROLE)
-            if self._isIntegerType(ptype):
-                value = int(self.item(rowNumber, 1).text())
-            elif self._isFloatType(ptype):
-                value = float(self.item(rowNumber, 1).text())
-            else:
-                value = self.item(rowNumber, 1).text()
-            self.allParams[name] = value
-            oldVal = self._initValue(name)
-            if oldVal != value and self.paramList[self.paramNameIndexCache[name]].param_type in PARAM_VALUE_TYPE_NAMES:
-                # value of param_count will be corrected in showChangedParametersOnly()
-                p = mavlink.MAVLink_param_value_message(name, value, ptype, 0, changedParamIdx)
-                self.changedParams.append(p)
-                changedParamIdx += 1
-
-    def _initValue(self, name):
-        if name in self.paramNameIndexCache:
-            return self.paramList[self.paramNameIndexCache[name]].param_value
-        return 0.0
-
-    def _isIntegerType(self, ptype):
-        return ptype in (mavlink.MAV_PARAM_TYPE_UINT8,
-                         mavlink.MAV_PARAM_TYPE_INT8,
-                         mavlink.MAV_PARAM_TYPE_UINT16,
-                         mavlink.MAV_PARAM_TYPE_INT16,
-                         mavlink.MAV_PARAM_TYPE_UINT32,
-                         mavlink.MAV_PARAM_TYPE_INT32,
-                         mavlink.MAV_PARAM_TYPE_UINT64,
-                         mavlink.MAV_PARAM_TYPE_INT64)
-
-    def _isFloatType(self, ptype):
-        return ptype in (mavlink.MAV_PARAM_TYPE_REAL32,
-                         mavlink.MAV_PARAM_TYPE_REAL64)
+    def changedParameters(self):
+        return self.parameterModel.changedParameters()
+
+    def showChangedParametersOnly(self, changedOnly = True):
+        self.filterModel.setChangedOnly(changedOnly)
+
+    def setFilter(self, pattern):
+        return self.filterModel.setFilter(pattern)
+
+    def loadValues(self, values):
+        '''Replace the edits by the values loaded from a file, see ParameterModel.applyValues()'''
+        result = self.parameterModel.applyValues(values)
+        self.filterModel.setChangedOnly(self.filterModel.changedOnly) # the changed rows are not the same
+        return result
 
 class ParameterPanel(QWidget):
 
@@ -125,11 +319,27 @@ class ParameterPanel(QWidget):
     def __init__(self, params, parent = None):
         super().__init__(parent)
         self.uploadUAVStep = 0
+        self.changedParams = []
         l = QVBoxLayout()
+        filterPanel = QWidget()
+        fLayout = QHBoxLayout()
+        fLayout.setContentsMargins(0, 0, 0, 0)
+        self.filterEdit = QLineEdit()
+        self.filterEdit.setPlaceholderText('Filter by name prefix or regular expression')
+        self.filterEdit.textChanged.connect(self.__filterParameters)
+        fLayout.addWidget(self.filterEdit)
+        self.changedOnlyCheckBox = QCheckBox('Changed only')
+        self.changedOnlyCheckBox.toggled.connect(self.__showChangedOnly)
+        fLayout.addWidget(self.changedOnlyCheckBox)
+        filterPanel.setLayout(fLayout)
+        l.addWidget(filterPanel)
         self.paramList = ParameterList(params, parent)
         l.addWidget(self.paramList)
         self.actionPanel = QWidget()
         pLayout = QHBoxLayout()
+        self.loadFromFileButton = QPushButton('Load from file')
+        pLayout.addWidget(self.loadFromFileButton)
+        self.loadFromFileButton.clicked.connect(self.loadFromFile)
         self.saveToFileButton = QPushButton('Save to file')
         pLayout.addWidget(self.saveToFileButton)
         self.saveToFileButton.clicked.connect(self.saveToFile)
@@ -143,25 +353,56 @@ class ParameterPanel(QWidget):
         l.addWidget(self.actionPanel)
         self.setLayout(l)
 
+    def __filterParameters(self, text):
+        valid = self.paramList.setFilter(text)
+        self.filterEdit.setStyleSheet('' if valid else 'color: red')
+
+    def __showChangedOnly(self, checked):
+        self.paramList.showChangedParametersOnly(checked)
+
     def uploadToUAV(self):
         if self.uploadUAVStep == 0:  ## 'Upload to UAV' clicked
-            self.paramList.collectTableBody()
-            if (len(self.paramList.changedParams) == 0):
+            self.changedParams = self.paramList.changedParameters()
+            if (len(self.changedParams) == 0):
                 QMessageBox.warning(self.window(), 'Warning', 'No changes have been made.', QMessageBox.Ok)
                 return
-            self.paramList.showChangedParametersOnly()
+            self.filterEdit.clear()
+            self.changedOnlyCheckBox.setChecked(True)
+            self.changedOnlyCheckBox.setEnabled(False)
+            self.paramList.setEditTriggers(QTableView.NoEditTriggers) # what is shown is what is uploaded
             self.uploadButton.setText('Confirm Upload')
             self.uploadUAVStep += 1
         elif self.uploadUAVStep == 1:  ## 'Confirm Upload' clicked
             self.uploadUAVStep = 0
-            self.uploadNewParametersSignal.emit(self.paramList.changedParams)
+            self.uploadNewParametersSignal.emit(self.changedParams)
             self.close()
 
+    def loadFromFile(self):
+        fileName = QFileDialog.getOpenFileName(self, 'Load Parameters', '',
+                                               'Parameter files (*.param *.params *.parm *.txt);;All files (*)')
+        if fileName[0] == '':
+            return
+        try:
+            values = readParameterFile(fileName[0])
+        except (OSError, ParameterFileError) as e:
+            QMessageBox.critical(self.window(), 'Error', 'Unable to load the parameters: {}'.format(e), QMessageBox.Ok)
+            return
+        changed, rejected = self.paramList.loadValues(values)
+        text = '{} of {} parameters differ from the onboard values.'.format(changed, len(values))
+        if len(rejected) > 0:
+            text += '\n{} ignored, unknown or not valid: {}'.format(len(rejected), ', '.join(rejected[:10]))
+            if len(rejected) > 10:
+                text += ', ...'
+        self.filterEdit.clear()
+        self.changedOnlyCheckBox.setChecked(changed > 0)
+        QMessageBox.information(self.window(), 'Parameters loaded', text, QMessageBox.Ok)
+
     def saveToFile(self):
         fileName = QFileDialog.getSaveFileName(self, 'Save Parameters', 'config.txt')
-        self.paramList.collectTableBody()
+        if fileName[0] == '':
+            return
         txt = open(fileName[0], 'w')
-        for param, value in self.paramList.allParams.items():
+        for param, value in self.paramList.parameterModel.allValues():
             txt.write('{} = {}\n'.format(param, value))
         txt.close()
         self.close()
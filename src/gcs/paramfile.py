@@ -0,0 +1,48 @@
+'''
+Parameter files written by the ground stations:
+
+Mission Planner .param    NAME,VALUE
+QGroundControl .params    SYSID<TAB>COMPID<TAB>NAME<TAB>VALUE<TAB>TYPE
+MiniGCS and .parm         NAME = VALUE, NAME VALUE
+
+Lines starting with # are comments. The format is recognized line by
+line, so files edited by hand may mix them.
+'''
+import re
+
+QGC_FIELD_COUNT = 5
+PARAM_LINE_PATTERN = re.compile(r'^([^\s,=]+)\s*(?:,|=|\s)\s*(\S+)\s*$')
+
+class ParameterFileError(Exception):
+    pass
+
+def parseParameterLine(line):
+    '''Return (name, value) of a line, None for a blank line or a comment'''
+    line = line.strip()
+    if line == '' or line.startswith('#'):
+        return None
+    fields = line.split('\t')
+    if len(fields) == QGC_FIELD_COUNT:
+        name, value = fields[2], fields[3]
+    else:
+        match = PARAM_LINE_PATTERN.match(line)
+        if match == None:
+            raise ValueError('not a parameter: {}'.format(line))
+        name, value = match.groups()
+    return name.strip(), float(value)
+
+def readParameterFile(fileName):
+    '''
+    Return the (name, value) of the parameters in `fileName`, in their
+    order, raise ParameterFileError on the first line not understood.
+    '''
+    params = []
+    with open(fileName, 'r') as f:
+        for lineNumber, line in enumerate(f, 1):
+            try:
+                param = parseParameterLine(line)
+            except ValueError as e:
+                raise ParameterFileError('{} line {}: {}'.format(fileName, lineNumber, e))
+            if param != None:
+                params.append(param)
+    return params
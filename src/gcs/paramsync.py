@@ -0,0 +1,494 @@
+'''
+Onboard parameter download and upload, run by the link thread of
+MAVLinkConnection.
+
+PARAM_REQUEST_LIST makes the vehicle stream every parameter once, some
+of them are lost on a noisy link and some arrive out of order. Received
+indices are tracked in a bitmap, so the progress does not depend on the
+order of arrival. Once the stream has been quiet for a moment the missing
+indices are requested with PARAM_REQUEST_READ, a burst at a time. The
+next burst is sent as soon as the previous one is answered, or when its
+answers stop for twice the measured round trip time. The download
+completes when every index is received, or fails after several bursts in
+a row without any new parameter.
+
+With a ParameterCache the vehicle is identified by AUTOPILOT_VERSION
+first. The parameters cached for its UID are used at once, and checked
+in the background: by the `_HASH_CHECK` the vehicle reports if it did so
+when they were cached, otherwise by a full download compared with the
+CRC of the cached set. A vehicle without a UID, or unknown to the cache,
+is downloaded as usual and cached afterwards.
+
+ParameterUploader keeps a window of PARAM_SET outstanding. Each one is
+confirmed by the PARAM_VALUE the vehicle echoes with the new value, and
+the next parameter is sent at once. A PARAM_SET without echo, or echoed
+with another value, is sent again after four times the measured round
+trip time, at most the configured timeout, and the parameters
+still not confirmed after several attempts are reported at the end.
+'''
+from collections import deque
+from threading import Lock
+from time import monotonic
+
+from pymavlink.mavutil import mavlink
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from gcslog import getLogger
+from paramcache import HASH_CHECK_PARAM_ID, hashCheckValue, vehicleUID
+from utils import toFloat32
+
+DEFAULT_PARAM_QUIET_PERIOD = 0.5 # seconds without PARAM_VALUE before the missing parameters are requested
+DEFAULT_PARAM_BURST = 20 # PARAM_REQUEST_READ sent at once
+DEFAULT_PARAM_RETRIES = 5 # bursts in a row without any new parameter before giving up
+DEFAULT_PARAM_SET_TIMEOUT = 1.0 # seconds without the echo of a PARAM_SET before sending it again
+DEFAULT_PARAM_SET_WINDOW = 10 # PARAM_SET outstanding at once
+PARAM_SET_RTT_FACTOR = 4 # timeout of a PARAM_SET, in round trip times
+PARAM_REPORT_NAMES = 5 # parameters named in the report of an incomplete upload
+PARAM_MIN_BURST_TIMEOUT = 0.05 # seconds, lower bound of the wait for the rest of a burst
+PARAM_IDENTIFY_ATTEMPTS = 2 # AUTOPILOT_VERSION or _HASH_CHECK requests, a quiet period each, before downloading
+
+PHASE_IDENTIFY = 'IDENTIFY' # waiting for AUTOPILOT_VERSION
+PHASE_VERIFY = 'VERIFY' # cached parameters in use, waiting for _HASH_CHECK
+PHASE_DOWNLOAD = 'DOWNLOAD'
+
+logger = getLogger('paramsync')
+
+class ParameterSync(QObject):
+    '''
+    Download all parameters of a vehicle. start() may be called from any
+    thread, the accept methods and update() are called by the link thread.
+    `send(msg)` queues a message for the vehicle, `cache` is a
+    ParameterCache or None.
+    '''
+
+    progressSignal = pyqtSignal(int, int) # parameters received, total parameters
+    finishedSignal = pyqtSignal(bool, str) # success, message to display
+    verifiedSignal = pyqtSignal(bool, str) # the cached parameters were replaced, message to display
+
+    def __init__(self, send, quietPeriod = DEFAULT_PARAM_QUIET_PERIOD, burst = DEFAULT_PARAM_BURST,
+                 retries = DEFAULT_PARAM_RETRIES, cache = None, parent = None):
+        super().__init__(parent)
+        self.send = send
+        self.quietPeriod = quietPeriod
+        self.burst = max(1, burst)
+        self.retries = retries
+        self.cache = cache
+        self.lock = Lock()
+        self.phase = None # None when idle
+        self.background = False # the cached parameters were delivered, the download verifies them
+        self.uid = None
+        self.cached = None # CachedParameters in use
+        self.vehicleHash = None # last _HASH_CHECK received
+        self.attempts = 0 # AUTOPILOT_VERSION or _HASH_CHECK requests sent
+        self.complete = None # last complete parameter set
+        self.count = None # None until the first PARAM_VALUE
+        self.values = [] # PARAM_VALUE by index
+        self.receivedMap = bytearray() # 1 for each index received
+        self.received = 0
+        self.duplicates = 0
+        self.pending = set() # indices of the burst in flight
+        self.nextMissing = 0 # where the next burst starts looking for missing indices
+        self.lastActivity = 0.0
+        self.startTime = 0.0
+        self.stalls = 0 # quiet periods since the last new parameter
+        self.requests = 0 # PARAM_REQUEST_READ sent
+        self.burstTime = None # when the last burst was sent, until its first answer
+        self.rtt = None # smoothed seconds from a burst to its first answer
+
+    def isBusy(self):
+        '''True until the parameters are available, a background verification excluded'''
+        return self.phase != None and self.background == False
+
+    def missingCount(self):
+        '''Parameters not received yet, None until the total is known'''
+        return None if self.count == None else self.count - self.received
+
+    def parameters(self):
+        '''The last complete parameter set, or what was received of a failed download, ordered by index'''
+        with self.lock:
+            if self.complete != None:
+                return list(self.complete)
+            return [msg for msg in self.values if msg != None]
+
+    def start(self):
+        with self.lock:
+            self.background = False
+            self.uid = None
+            self.cached = None
+            self.vehicleHash = None
+            self.complete = None
+            if self.cache == None:
+                self.__startDownload()
+            else:
+                self.phase = PHASE_IDENTIFY
+                self.lastActivity = monotonic()
+                self.attempts = 0
+                self.__requestIdentity()
+
+    def cancel(self):
+        self.__finish(False, 'Parameter download cancelled')
+
+    def acceptAutopilotVersion(self, msg):
+        '''Look for the parameters of the vehicle in the cache'''
+        if self.phase != PHASE_IDENTIFY:
+            return
+        with self.lock:
+            if self.phase != PHASE_IDENTIFY:
+                return
+            self.uid = vehicleUID(msg)
+            if self.uid == None:
+                logger.info('Vehicle without UID, parameters not cached')
+                self.__startDownload()
+                return
+            self.__requestHashCheck() # cached along with the download if unknown
+            self.cached = self.cache.load(self.uid)
+            if self.cached == None:
+                self.__startDownload()
+                return
+            self.complete = self.cached.params
+            self.background = True
+            if self.cached.vehicleHash == None:
+                self.__startDownload() # no hash to compare, verify the whole set
+            else:
+                self.phase = PHASE_VERIFY
+                self.lastActivity = monotonic()
+                self.attempts = 1
+            text = '{} parameters loaded from the cache of {}'.format(len(self.cached.params), self.uid)
+        logger.info(text)
+        self.finishedSignal.emit(True, text)
+
+    def acceptParameterValue(self, msg):
+        '''Store a parameter of the download, return False if it is not part of one'''
+        if msg.param_id == HASH_CHECK_PARAM_ID:
+            self.__acceptHashCheck(msg)
+            return True # never shown as a parameter
+        if self.phase != PHASE_DOWNLOAD:
+            return False
+        with self.lock:
+            if self.phase != PHASE_DOWNLOAD:
+                return False
+            if msg.param_count != self.count:
+                self.__resize(msg.param_count)
+            index = msg.param_index
+            if index >= self.count:
+                return False # e.g. the answer to a PARAM_SET, sent with index 65535
+            self.lastActivity = monotonic()
+            if index in self.pending:
+                self.pending.discard(index)
+                self.__measureRoundTrip(self.lastActivity)
+            self.values[index] = msg
+            if self.receivedMap[index] != 0:
+                self.duplicates += 1
+                return True
+            self.receivedMap[index] = 1
+            self.received += 1
+            self.stalls = 0
+            received, count = self.received, self.count
+        self.progressSignal.emit(received, count)
+        if received == count:
+            self.__complete()
+        return True
+
+    def update(self, now = None):
+        '''Request what is missing once the vehicle is quiet or the last burst is answered'''
+        if self.phase == None:
+            return
+        now = monotonic() if now == None else now
+        failed = None
+        with self.lock:
+            if self.phase == None:
+                return
+            if self.phase != PHASE_DOWNLOAD:
+                if now - self.lastActivity >= self.quietPeriod:
+                    self.__retryRequest(now)
+                return
+            answered = self.requests > 0 and len(self.pending) == 0
+            if answered == False and now - self.lastActivity < self.__timeout():
+                return
+            if answered == False:
+                if self.stalls >= self.retries:
+                    failed = self.__failure()
+                self.stalls += 1
+            if failed == None:
+                self.lastActivity = now
+                if self.count == None:
+                    self.send(mavlink.MAVLink_param_request_list_message(255, 0))
+                else:
+                    self.__requestMissing()
+        if failed != None:
+            self.__finish(False, failed)
+
+    def __startDownload(self):
+        now = monotonic()
+        self.phase = PHASE_DOWNLOAD
+        self.count = None
+        self.values = []
+        self.receivedMap = bytearray()
+        self.received = 0
+        self.duplicates = 0
+        self.pending = set()
+        self.nextMissing = 0
+        self.lastActivity = now
+        self.startTime = now
+        self.stalls = 0
+        self.requests = 0
+        self.burstTime = None
+        self.send(mavlink.MAVLink_param_request_list_message(255, 0))
+
+    def __requestIdentity(self):
+        self.attempts += 1
+        self.send(mavlink.MAVLink_command_long_message(255, 255, mavlink.MAV_CMD_REQUEST_AUTOPILOT_CAPABILITIES,
+                                                       0, 1, 0, 0, 0, 0, 0, 0))
+
+    def __requestHashCheck(self):
+        self.send(mavlink.MAVLink_param_request_read_message(255, 255, HASH_CHECK_PARAM_ID.encode('utf-8'), -1))
+
+    def __retryRequest(self, now):
+        '''The vehicle did not answer in the identify or verify phase'''
+        self.lastActivity = now
+        if self.attempts < PARAM_IDENTIFY_ATTEMPTS:
+            self.attempts += 1
+            if self.phase == PHASE_IDENTIFY:
+                self.__requestIdentity()
+            else:
+                self.__requestHashCheck()
+            return
+        if self.phase == PHASE_IDENTIFY:
+            logger.info('No AUTOPILOT_VERSION received, parameters not cached')
+        else:
+            logger.info('No %s received, verifying the cached parameters by a download', HASH_CHECK_PARAM_ID)
+        self.__startDownload()
+
+    def __acceptHashCheck(self, msg):
+        with self.lock:
+            self.vehicleHash = hashCheckValue(msg)
+            if self.phase != PHASE_VERIFY:
+                return
+            if self.vehicleHash != self.cached.vehicleHash:
+                logger.info('Parameters of %s changed since cached', self.uid)
+                self.__startDownload()
+                return
+        self.__finish(True, 'Cached parameters verified')
+
+    def __complete(self):
+        '''Every parameter was received, cache them'''
+        with self.lock:
+            self.complete = [msg for msg in self.values if msg != None]
+            elapsed = max(monotonic() - self.startTime, 1.0e-3)
+            text = '{} parameters received in {:.1f} s ({:.0f}/s), {} requested again'.format(
+                self.count, elapsed, self.count / elapsed, self.requests)
+            params, uid, vehicleHash, cached = self.complete, self.uid, self.vehicleHash, self.cached
+        changed = False
+        if uid != None:
+            crc = self.cache.save(uid, params, vehicleHash)
+            if cached != None:
+                changed = crc != cached.crc
+                text = 'Cached parameters {}, {}'.format('replaced' if changed else 'verified', text)
+        self.__finish(True, text, changed)
+
+    def __resize(self, count):
+        if self.count != None:
+            logger.warning('Parameter count changed from %d to %d', self.count, count)
+        self.count = count
+        del self.values[count:]
+        del self.receivedMap[count:]
+        self.values += [None] * (count - len(self.values))
+        self.receivedMap += bytearray(count - len(self.receivedMap))
+        self.received = self.receivedMap.count(1)
+        self.nextMissing = 0
+
+    def __timeout(self):
+        '''Silence ending the wait for PARAM_VALUE'''
+        if self.requests == 0 or self.rtt == None:
+            return self.quietPeriod # the stream of PARAM_REQUEST_LIST, or no burst answered yet
+        return min(self.quietPeriod, max(PARAM_MIN_BURST_TIMEOUT, 2 * self.rtt))
+
+    def __measureRoundTrip(self, now):
+        if self.burstTime == None:
+            return
+        sample = now - self.burstTime
+        self.rtt = sample if self.rtt == None else 0.875 * self.rtt + 0.125 * sample
+        self.burstTime = None
+
+    def __requestMissing(self):
+        self.pending = set()
+        self.burstTime = monotonic()
+        index = self.receivedMap.find(0, self.nextMissing)
+        if index < 0:
+            index = self.receivedMap.find(0) # wrap around
+        while index >= 0 and len(self.pending) < self.burst:
+            self.pending.add(index)
+            self.send(mavlink.MAVLink_param_request_read_message(255, 255, b'', index))
+            self.requests += 1
+            index = self.receivedMap.find(0, index + 1)
+        self.nextMissing = 0 if index < 0 else index
+        logger.debug('%d missing parameters requested', len(self.pending))
+
+    def __failure(self):
+        if self.count == None:
+            return 'Parameter download failed, no parameter received'
+        missing = self.count - self.received
+        return 'Parameter download failed, {} of {} parameters missing'.format(missing, self.count)
+
+    def __finish(self, success, text, changed = False):
+        with self.lock:
+            if self.phase == None:
+                return
+            self.phase = None
+            self.pending = set()
+            background = self.background
+        if success:
+            logger.info(text)
+        else:
+            logger.warning(text)
+        if background:
+            self.verifiedSignal.emit(changed, text if success else '{}, cached parameters kept'.format(text))
+        else:
+            self.finishedSignal.emit(success, text)
+
+class ParameterUploader(QObject):
+    '''
+    Set parameters of a vehicle. start() may be called from any thread,
+    acceptParameterValue() and update() are called by the link thread.
+    `send(msg)` queues a message for the vehicle.
+    '''
+
+    progressSignal = pyqtSignal(int, int) # parameters confirmed, total parameters
+    finishedSignal = pyqtSignal(bool, str) # success, message to display
+
+    def __init__(self, send, timeout = DEFAULT_PARAM_SET_TIMEOUT, window = DEFAULT_PARAM_SET_WINDOW,
+                 retries = DEFAULT_PARAM_RETRIES, parent = None):
+        super().__init__(parent)
+        self.send = send
+        self.timeout = timeout
+        self.window = max(1, window)
+        self.retries = retries
+        self.lock = Lock()
+        self.queue = None # PARAM_VALUE not sent yet, None when idle
+        self.outstanding = {} # name -> [PARAM_VALUE, attempts, deadline, time sent]
+        self.rtt = None # smoothed seconds from a first PARAM_SET to its echo
+        self.total = 0
+        self.confirmed = 0
+        self.resent = 0
+        self.rejected = {} # name -> value last echoed, different from the value set
+        self.failed = [] # names given up
+        self.startTime = 0.0
+
+    def isBusy(self):
+        return self.queue != None
+
+    def start(self, params):
+        '''Set the values of the PARAM_VALUE messages `params`, return False if busy'''
+        with self.lock:
+            if self.queue != None:
+                return False
+            now = monotonic()
+            self.queue = deque(params)
+            self.outstanding = {}
+            self.total = len(params)
+            self.confirmed = 0
+            self.resent = 0
+            self.rejected = {}
+            self.failed = []
+            self.startTime = now
+            self.__fill(now)
+        if self.total == 0:
+            self.__finish(True, 'No parameter to set')
+        return True
+
+    def cancel(self):
+        self.__finish(False, 'Parameter upload cancelled')
+
+    def acceptParameterValue(self, msg):
+        '''Check the echo of a PARAM_SET, return False if `msg` is not one'''
+        if self.queue == None:
+            return False
+        with self.lock:
+            entry = None if self.queue == None else self.outstanding.get(msg.param_id)
+            if entry == None:
+                return False
+            if toFloat32(msg.param_value) != toFloat32(entry[0].param_value):
+                self.rejected[msg.param_id] = msg.param_value # or an older value, sent again on timeout
+                return True
+            now = monotonic()
+            if entry[1] == 1:
+                # the echo of a PARAM_SET sent again may answer any of its copies
+                sample = now - entry[3]
+                self.rtt = sample if self.rtt == None else 0.875 * self.rtt + 0.125 * sample
+            del self.outstanding[msg.param_id]
+            self.rejected.pop(msg.param_id, None)
+            self.confirmed += 1
+            self.__fill(now)
+            confirmed, done = self.confirmed, self.__done()
+        self.progressSignal.emit(confirmed, self.total)
+        if done:
+            self.__complete()
+        return True
+
+    def update(self, now = None):
+        '''Send again the PARAM_SET whose echo is late'''
+        if self.queue == None:
+            return
+        now = monotonic() if now == None else now
+        with self.lock:
+            if self.queue == None:
+                return
+            for name, entry in list(self.outstanding.items()):
+                if now < entry[2]:
+                    continue
+                if entry[1] > self.retries:
+                    del self.outstanding[name]
+                    self.failed.append(name)
+                    continue
+                self.__send(entry[0])
+                entry[1] += 1
+                entry[2] = now + self.__timeout()
+                self.resent += 1
+            self.__fill(now)
+            done = self.__done()
+        if done:
+            self.__complete()
+
+    def __fill(self, now):
+        while len(self.outstanding) < self.window and len(self.queue) > 0:
+            msg = self.queue.popleft()
+            self.__send(msg)
+            self.outstanding[msg.param_id] = [msg, 1, now + self.__timeout(), now]
+
+    def __timeout(self):
+        if self.rtt == None:
+            return self.timeout
+        return min(self.timeout, max(PARAM_MIN_BURST_TIMEOUT, PARAM_SET_RTT_FACTOR * self.rtt))
+
+    def __send(self, msg):
+        self.send(mavlink.MAVLink_param_set_message(255, 255, msg.param_id.encode('utf-8'),
+                                                    msg.param_value, msg.param_type))
+
+    def __done(self):
+        return len(self.outstanding) == 0 and len(self.queue) == 0
+
+    def __complete(self):
+        with self.lock:
+            elapsed = monotonic() - self.startTime
+            failed = list(self.failed)
+            rejected = dict(self.rejected)
+        if len(failed) == 0:
+            self.__finish(True, '{} parameters set in {:.1f} s, {} sent again'.format(self.total, elapsed, self.resent))
+            return
+        names = ['{} (vehicle kept {})'.format(name, rejected[name]) if name in rejected else name
+                 for name in failed[:PARAM_REPORT_NAMES]]
+        if len(failed) > PARAM_REPORT_NAMES:
+            names.append('...')
+        self.__finish(False, '{} of {} parameters not set: {}'.format(len(failed), self.total, ', '.join(names)))
+
+    def __finish(self, success, text):
+        with self.lock:
+            if self.queue == None:
+                return
+            self.queue = None
+            self.outstanding = {}
+        if success:
+            logger.info(text)
+        else:
+            logger.warning(text)
+        self.finishedSignal.emit(success, text)
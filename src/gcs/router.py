@@ -0,0 +1,258 @@
+'''
+Route MAVLink traffic over several links to the same vehicles, e.g. a
+900 MHz radio and a backup LTE/UDP link used at the same time.
+
+All links are served by the thread of the MAVLinkConnection owning the
+router, waiting on the file descriptors of every link at once. Frames
+received on more than one link are de-duplicated by source and sequence
+number, and messages are sent over the best link, measured by TIMESYNC
+round trip time and sequence loss.
+'''
+from array import array
+from time import monotonic
+
+from pymavlink import mavutil
+
+from gcslog import getLogger
+from linkstats import MAVLINK_SEQ_MODULO, MAVLINK_SEQ_REORDER_WINDOW
+
+DEDUP_WINDOW = 0.05 # seconds, the skew between links, a frame received again after this long is not a duplicate
+LINK_TIMEOUT = 3.0 # seconds without data before a link is considered down
+LINK_PROBE_INTERVAL = 1.0 # seconds between TIMESYNC probes and loss samples
+LINK_PROBE_TIMEOUT = 5.0 # seconds before an unanswered probe is forgotten
+LINK_EWMA_ALPHA = 0.3 # weight of the newest round trip time and loss samples
+LINK_DEFAULT_RTT = 0.5 # seconds, assumed for links without TIMESYNC replies
+LINK_SWITCH_MARGIN = 0.8 # a link must score this much better to take over transmission
+
+logger = getLogger('router')
+
+class SourceFrames:
+
+    __slots__ = ('crcs', 'times', 'counts', 'accepted')
+
+    def __init__(self):
+        self.crcs = array('H', bytes(2 * MAVLINK_SEQ_MODULO))
+        self.times = array('d', bytes(8 * MAVLINK_SEQ_MODULO))
+        self.counts = array('Q', bytes(8 * MAVLINK_SEQ_MODULO)) # value of accepted when stored
+        self.accepted = 0
+
+class DuplicateFilter:
+    '''
+    Remember the CRC, arrival time and position in the stream of the last
+    frame seen for each sequence number of a source, arrays of 256 entries
+    per source. The CRC covers the sequence number and the payload, so the
+    same value is the same frame received over another link, as long as it
+    comes within the skew between the links and before the sequence number
+    of the source wrapped. A fast source wraps within the window, then a
+    frame repeating the same content would pass for a duplicate, so the
+    wrap is counted in frames accepted from the source.
+    '''
+
+    def __init__(self):
+        self.sources = {} # (sysid, compid) -> SourceFrames
+
+    def isDuplicate(self, msg, now):
+        key = (msg.get_srcSystem(), msg.get_srcComponent())
+        src = self.sources.get(key)
+        if src == None:
+            src = self.sources[key] = SourceFrames()
+        seq = msg.get_seq()
+        crc = msg.get_crc()
+        if src.crcs[seq] == crc and now - src.times[seq] < DEDUP_WINDOW \
+           and src.accepted - src.counts[seq] < MAVLINK_SEQ_REORDER_WINDOW:
+            return True
+        src.accepted += 1
+        src.crcs[seq] = crc
+        src.times[seq] = now
+        src.counts[seq] = src.accepted
+        return False
+
+class MAVLinkLink:
+    '''One pymavlink connection of the router, and its receive quality'''
+
+    def __init__(self, connection, name = None):
+        self.connection = connection
+        self.name = connection.address if name == None else name
+        self.rxBytes = 0
+        self.rxMessages = 0
+        self.rxDuplicates = 0
+        self.txMessages = 0
+        self.lastReceived = None
+        self.lastSeq = {} # (sysid, compid) -> seq
+        self.windowReceived = 0
+        self.windowLost = 0
+        self.loss = None
+        self.rtt = None
+
+    def isUp(self, now):
+        return self.lastReceived != None and now - self.lastReceived < LINK_TIMEOUT
+
+    def countSequence(self, msg):
+        key = (msg.get_srcSystem(), msg.get_srcComponent())
+        seq = msg.get_seq()
+        last = self.lastSeq.get(key)
+        if last != None:
+            gap = (seq - last - 1) % MAVLINK_SEQ_MODULO
+            if gap < MAVLINK_SEQ_REORDER_WINDOW:
+                self.windowLost += gap
+        self.lastSeq[key] = seq
+        self.windowReceived += 1
+
+    def sampleLoss(self):
+        total = self.windowReceived + self.windowLost
+        if total > 0:
+            self.loss = ewma(self.loss, self.windowLost / total)
+        self.windowReceived = 0
+        self.windowLost = 0
+
+    def score(self):
+        '''Expected cost of sending over this link, lower is better'''
+        rtt = LINK_DEFAULT_RTT if self.rtt == None else self.rtt
+        loss = 0.0 if self.loss == None else min(self.loss, 0.95)
+        return rtt / (1.0 - loss)
+
+def ewma(average, sample):
+    return sample if average == None else LINK_EWMA_ALPHA * sample + (1 - LINK_EWMA_ALPHA) * average
+
+class MAVLinkRouter:
+    '''
+    Own the links of a MAVLinkConnection, the first link is the primary one
+    used to establish the connection. With `forwarding` enabled, every frame
+    received on one link is also written to the other links.
+    '''
+
+    def __init__(self, primary, forwarding = False):
+        self.links = [MAVLinkLink(primary)]
+        self.txLink = self.links[0]
+        self.forwarding = forwarding
+        self.duplicates = DuplicateFilter()
+        self.pendingProbes = {} # ts1 -> (link, sent time)
+        self.lastProbe = 0.0
+
+    def addLink(self, connection, name = None):
+        link = MAVLinkLink(connection, name)
+        self.links.append(link)
+        logger.info('Link added: %s', link.name)
+        return link
+
+    def fds(self):
+        '''File descriptors to wait on, None if a link can not be waited on'''
+        fds = []
+        for link in self.links:
+            fd = getattr(link.connection, 'fd', None)
+            if fd == None:
+                if getattr(link.connection, 'reconnecting', False):
+                    continue # polled for the next attempt at least every wait timeout
+                return None
+            fds.append(fd)
+        return fds
+
+    def receive(self, readSize):
+        '''
+        Read what is available on every link and return the messages
+        decoded, without the copies already received on another link.
+        Returns the messages and the number of bytes read.
+        '''
+        msgs = []
+        nbytes = 0
+        now = monotonic()
+        dedup = len(self.links) > 1
+        for link in self.links:
+            buf = link.connection.recv(readSize)
+            if len(buf) > 0:
+                link.rxBytes += len(buf)
+                link.lastReceived = now
+                nbytes += len(buf)
+            # Always parse, frames left in the parser buffer by a previous read may be complete
+            decoded = link.connection.mav.parse_buffer(buf)
+            if decoded == None:
+                continue
+            for msg in decoded:
+                link.connection.post_message(msg)
+                if msg.get_type() == 'BAD_DATA':
+                    msgs.append(msg)
+                    continue
+                link.rxMessages += 1
+                if dedup:
+                    link.countSequence(msg)
+                    if self.duplicates.isDuplicate(msg, now):
+                        link.rxDuplicates += 1
+                        continue
+                    if self.forwarding:
+                        self.__forward(link, msg)
+                if msg.get_type() == 'TIMESYNC' and msg.tc1 != 0:
+                    self.__acceptProbeReply(msg, now)
+                msgs.append(msg)
+        return msgs, nbytes
+
+    def __forward(self, source, msg):
+        buf = msg.get_msgbuf()
+        for link in self.links:
+            if link is not source:
+                try:
+                    link.connection.write(buf)
+                except OSError as e:
+                    logger.warning('Forwarding to %s failed: %s', link.name, e, extra = {'rateKey' : ('forward', link.name)})
+
+    def send(self, msg):
+        '''Send `msg` over the current transmit link'''
+        self.txLink.txMessages += 1
+        self.txLink.connection.mav.send(msg)
+
+    def update(self):
+        '''Probe the links and choose the transmit link, call regularly from the link thread'''
+        if len(self.links) < 2:
+            return
+        now = monotonic()
+        if now - self.lastProbe < LINK_PROBE_INTERVAL:
+            return
+        self.lastProbe = now
+        for ts1, (_, sent) in list(self.pendingProbes.items()):
+            if now - sent > LINK_PROBE_TIMEOUT:
+                del self.pendingProbes[ts1]
+        base = int(now * 1.0e9)
+        for i, link in enumerate(self.links):
+            link.sampleLoss()
+            ts1 = base + i # unique per link
+            self.pendingProbes[ts1] = (link, now)
+            try:
+                link.connection.mav.send(mavutil.mavlink.MAVLink_timesync_message(0, ts1))
+            except OSError:
+                pass # a link without a peer yet, e.g. UDP before the first packet
+        self.__selectTxLink(now)
+
+    def __acceptProbeReply(self, msg, now):
+        probe = self.pendingProbes.pop(msg.ts1, None)
+        if probe != None:
+            link, sent = probe
+            link.rtt = ewma(link.rtt, now - sent)
+
+    def __selectTxLink(self, now):
+        up = [link for link in self.links if link.isUp(now)]
+        if len(up) == 0:
+            return
+        best = min(up, key = MAVLinkLink.score)
+        if best is self.txLink:
+            return
+        if self.txLink.isUp(now) == False or best.score() < self.txLink.score() * LINK_SWITCH_MARGIN:
+            logger.info('Transmitting over %s', best.name)
+            self.txLink = best
+
+    def close(self):
+        for link in self.links:
+            link.connection.close()
+
+    def snapshot(self):
+        '''Return the state of every link as plain values'''
+        now = monotonic()
+        return [{
+            'name' : link.name,
+            'up' : link.isUp(now),
+            'tx' : link is self.txLink,
+            'rx_bytes' : link.rxBytes,
+            'rx_messages' : link.rxMessages,
+            'duplicates' : link.rxDuplicates,
+            'tx_messages' : link.txMessages,
+            'loss' : 0.0 if link.loss == None else link.loss,
+            'rtt' : link.rtt
+        } for link in self.links]
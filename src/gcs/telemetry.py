@@ -1,22 +1,35 @@
-import os, struct
+import os, select, socket
+from math import nan
 from secrets import token_bytes
 from enum import Enum
-from time import time, sleep
+from time import time, monotonic, perf_counter
+from threading import Event
 from collections import deque
 from pymavlink import mavutil
 from pymavlink.mavutil import mavlogfile, mavlink
-from pymavlink.mavwp import MAVWPLoader
-from PyQt5.QtCore import (QMutex, Qt, QThread, QTimer, QVariant, QObject,
-                          QWaitCondition, pyqtSignal)
+from PyQt5.QtCore import Qt, QThread, QTimer, QVariant, QObject, pyqtSignal
 from PyQt5.QtWidgets import (QComboBox, QGridLayout, QLabel, QPushButton, QLineEdit, QFileDialog,
                              QSizePolicy, QWidget, QTabWidget, QVBoxLayout, QHBoxLayout, QMessageBox, QProgressBar)
-from PyQt5.QtGui import QFontMetrics
+from PyQt5.QtGui import QFontMetrics, QIntValidator
+from serial import SerialException
 from serial.tools.list_ports import comports
 
 from parameters import ParameterPanel
 from waypoint import Waypoint
 from UserData import UserData
-from uas import UASInterfaceFactory
+from gcslog import getLogger
+from chunkedlog import ChunkedLogFile, ChunkedLogStream, isChunkedLog, CHUNKED_LOG_EXTENSION, DEFAULT_CHUNK_SIZE, DEFAULT_CHUNK_MAX_AGE
+from linkstats import LinkStatistics
+from logreplay import ReplayIndexBuilder
+from mission import (MissionManager, MissionTable, DEFAULT_MISSION_DOWNLOAD_WINDOW,
+                     DEFAULT_MISSION_RETRIES, DEFAULT_MISSION_TIMEOUT)
+from autobaud import BaudRateDetector
+from router import MAVLinkRouter
+from nettransport import (openNetworkConnection, DEFAULT_RECEIVE_BUFFER_SIZE, DEFAULT_TCP_PORT, DEFAULT_UDP_PORT,
+                          NETWORK_PROTOCOLS, PROTOCOL_TCP_CLIENT, PROTOCOL_UDP_CONNECT, PROTOCOL_UDP_LISTEN)
+from tlogwriter import (TLogWriter, DEFAULT_LOG_BUFFER_SIZE, DEFAULT_LOG_FLUSH_INTERVAL,
+                        DEFAULT_LOG_FSYNC_INTERVAL, FSYNC_NEVER)
+from uas import UASRegistry
 
 BAUD_RATES = {
     0 : 'AUTO',
@@ -89,13 +102,44 @@ MAVLINK_DIALECTS = {
 
 UD_TELEMETRY_KEY = 'TELEMETRY'
 UD_TELEMETRY_LOG_FOLDER_KEY = 'LOG_FOLDER'
+UD_TELEMETRY_LOG_BUFFER_SIZE_KEY = 'LOG_BUFFER_SIZE'
+UD_TELEMETRY_LOG_FLUSH_INTERVAL_KEY = 'LOG_FLUSH_INTERVAL'
+UD_TELEMETRY_LOG_FSYNC_KEY = 'LOG_FSYNC' # NEVER, FLUSH or PERIODIC
+UD_TELEMETRY_LOG_FSYNC_INTERVAL_KEY = 'LOG_FSYNC_INTERVAL'
+UD_TELEMETRY_LOG_FORMAT_KEY = 'LOG_FORMAT' # TLOG or CHUNKED
+UD_TELEMETRY_LOG_CODEC_KEY = 'LOG_CODEC' # zstd, lz4 or zlib, for the CHUNKED format
+UD_TELEMETRY_LOG_CHUNK_SIZE_KEY = 'LOG_CHUNK_SIZE' # uncompressed bytes, for the CHUNKED format
+UD_TELEMETRY_LOG_CHUNK_MAX_AGE_KEY = 'LOG_CHUNK_MAX_AGE' # seconds, for the CHUNKED format
+UD_TELEMETRY_LINK_STATS_KEY = 'LINK_STATS'
+UD_TELEMETRY_ROUTER_FORWARDING_KEY = 'ROUTER_FORWARDING' # forward frames between the links of a connection
+UD_TELEMETRY_MISSION_TIMEOUT_KEY = 'MISSION_TIMEOUT' # seconds before a mission transfer message is sent again
+UD_TELEMETRY_MISSION_RETRIES_KEY = 'MISSION_RETRIES'
+UD_TELEMETRY_MISSION_DOWNLOAD_WINDOW_KEY = 'MISSION_DOWNLOAD_WINDOW' # mission items requested at once
+UD_TELEMETRY_MISSION_VERIFY_KEY = 'MISSION_VERIFY' # read back the mission items uploaded
+
+LOG_FORMAT_TLOG = 'TLOG'
+LOG_FORMAT_CHUNKED = 'CHUNKED'
 UD_TELEMETRY_TIMEOUT_THRESHOLD_KEY = 'TIMEOUT_THRESHOLD'
 UD_TELEMETRY_HEARTBEAT_TIMEOUT_KEY = 'HB_TIMEOUT'
 UD_TELEMETRY_LAST_CONNECTION_KEY = 'LAST_CONN'
 UD_TELEMETRY_LAST_CONNECTION_PORT_KEY = 'PORT'
 UD_TELEMETRY_LAST_CONNECTION_BAUD_RATE_KEY = 'BAUD_RATE'
+UD_TELEMETRY_AUTOBAUD_HISTORY_KEY = 'AUTOBAUD_HISTORY' # port -> {baud rate : number of detections}
+UD_TELEMETRY_LAST_NETWORK_KEY = 'LAST_NETWORK'
+UD_TELEMETRY_LAST_NETWORK_PROTOCOL_KEY = 'PROTOCOL' # UDP_LISTEN, UDP_CONNECT or TCP_CLIENT
+UD_TELEMETRY_LAST_NETWORK_HOST_KEY = 'HOST'
+UD_TELEMETRY_LAST_NETWORK_PORT_KEY = 'PORT'
+UD_TELEMETRY_RECEIVE_BUFFER_SIZE_KEY = 'RECEIVE_BUFFER_SIZE' # bytes, socket receive buffer of network links
 
 DEFAULT_RC_AUTO_SCALE_SAMPLES = 10
+RX_WAIT_TIMEOUT = 0.1  # seconds, upper bound of a single wait on the link
+RX_POLL_INTERVAL = 0.001  # seconds, used when the link can not be waited on (no file descriptor)
+RX_READ_SIZE = 16384  # bytes, maximum size of a single read from the link
+RX_DISPATCH_QUEUE_SIZE = 4096  # decoded messages buffered between the link thread and the GUI thread
+RX_DISPATCH_INTERVAL = 20  # msec, the GUI thread drains decoded messages once per tick
+REPLAY_POSITION_UPDATE_INTERVAL = 0.2  # seconds between replay position updates
+
+logger = getLogger('telemetry')
 MAVLINKV2_MESSAGE_SIGNING_KEY_LEN = 32 # bytes
 
 class MavStsKeys(Enum):
@@ -121,7 +165,7 @@ class MessageSigningSetupWindow(QWidget):
         self.__mavlinkVersionUpdated.connect(self.__initUI)
 
     def setMAVLinkVersion(self, mavlinkVersion):
-        print('Set MAVLink version to:', mavlinkVersion)
+        logger.info('Set MAVLink version to: %s', mavlinkVersion)
         self.__mavlinkVersion = float(mavlinkVersion)
         self.__mavlinkVersionUpdated.emit()
 
@@ -284,8 +328,10 @@ class ConnectionEditWindow(QWidget):
 
     def _createTabs(self):
         self.serialConnTab = SerialConnectionEditTab(parent=self)
+        self.networkConnTab = NetworkConnectionEditTab(self)
         self.logReplayTab = LogFileReplayEditTab(self)
         self.tabs.addTab(self.serialConnTab, 'Serial Link')
+        self.tabs.addTab(self.networkConnTab, 'Network Link')
         self.tabs.addTab(self.logReplayTab, 'Log File Replay')
 
     def __createActionButtons(self):
@@ -312,20 +358,98 @@ class ConnectionEditWindow(QWidget):
                 self.close()
 
 class LogFileReplaySpeedControl(mavlogfile, QObject):
+    '''
+    Replay a log file at a given speed, with pause and seek.
+    Messages are released against a monotonic wall clock schedule anchored
+    at one (wall time, log time) pair, so timing errors do not accumulate.
+    The schedule is re-anchored on every seek, speed change and resume.
+    '''
 
     replayCompleteSignal = pyqtSignal()
-
+    replayPositionSignal = pyqtSignal(float) # log timestamp in seconds
+    replayIndexReadySignal = pyqtSignal(object) # ReplayIndex
 
     def __init__(self, filename):
         mavlogfile.__init__(self, filename)
         QObject.__init__(self)
-        self.replaySpeed = 1.0
+        self.replaySpeed = 1.0 # 0 replays as fast as possible
+        self.replayPaused = False
+        self.replayIndex = None
+        self.replayAborted = False
+        self.__seekRequest = None
+        self.__anchor = None # (wall time, log time)
+        self.__lastPositionUpdate = 0.0
+        self.__interrupt = Event()
+        if isChunkedLog(filename):
+            # replay the uncompressed record stream
+            self.f.close()
+            self.f = ChunkedLogStream(filename)
+            self.filesize = self.f.size
+        self.indexBuilder = ReplayIndexBuilder(filename)
+        self.indexBuilder.indexReadySignal.connect(self.__acceptIndex)
+        self.indexBuilder.start()
+
+    def __acceptIndex(self, index):
+        self.replayIndex = index
+        self.replayIndexReadySignal.emit(index)
+
+    def setReplaySpeed(self, speed):
+        self.replaySpeed = speed
+        self.__anchor = None
+        self.__interrupt.set()
+
+    def setReplayPaused(self, paused):
+        self.replayPaused = paused
+        self.__anchor = None
+        self.__interrupt.set()
+
+    def seekToTime(self, timestamp):
+        '''Continue the replay from `timestamp`, seconds in log time, once the index is ready'''
+        if self.replayIndex != None:
+            self.__seekRequest = timestamp
+            self.__interrupt.set()
+
+    def abortReplay(self):
+        '''Release the replay thread from any pending wait'''
+        self.replayAborted = True
+        self.__interrupt.set()
 
     def pre_message(self):
+        target = self.__seekRequest
+        if target != None:
+            # called on a record boundary, safe to move the read position
+            self.__seekRequest = None
+            self.f.seek(self.replayIndex.offsetFor(target))
+            self._last_timestamp = None
+            # records before the target are released immediately
+            self.__anchor = (monotonic(), target)
         super().pre_message()
-        if self._last_timestamp is not None and self.replaySpeed > 0:
-            ts = abs(self._timestamp - self._last_timestamp) * self.replaySpeed
-            sleep(ts)
+        self.__waitUntilDue(self._timestamp)
+
+    def __waitUntilDue(self, timestamp):
+        while self.replayAborted == False:
+            self.__interrupt.clear()
+            if self.__seekRequest != None:
+                return # the message is released, the seek is done before the next one
+            if self.replayPaused:
+                self.__interrupt.wait(RX_WAIT_TIMEOUT)
+                continue
+            now = monotonic()
+            if now - self.__lastPositionUpdate >= REPLAY_POSITION_UPDATE_INTERVAL:
+                self.__lastPositionUpdate = now
+                self.replayPositionSignal.emit(timestamp)
+            # both are reset from the GUI thread, work on the values read once
+            replaySpeed = self.replaySpeed
+            if replaySpeed <= 0:
+                return
+            anchor = self.__anchor
+            if anchor == None:
+                self.__anchor = (now, timestamp)
+                return
+            delay = anchor[0] + (timestamp - anchor[1]) / replaySpeed - now
+            if delay <= 0:
+                return
+            self.__interrupt.wait(delay)
 
     def recv(self,n=None):
         b = super().recv(n)
@@ -333,6 +457,11 @@ class LogFileReplaySpeedControl(mavlogfile, QObject):
             self.replayCompleteSignal.emit()
         return b
 
+    def close(self):
+        self.abortReplay()
+        self.indexBuilder.wait()
+        super().close()
+
     def write(self, buf):
         '''Log files will be open in read only mode. All write operations are ignored.'''
         pass
@@ -365,7 +494,7 @@ class LogFileReplayEditTab(QWidget):
     def doConnect(self):
         fileName = self.logFilePathEdit.text()
         if os.path.isfile(fileName):
-            print('Replay Log file:', fileName)
+            logger.info('Replay log file: %s', fileName)
             connection = LogFileReplaySpeedControl(fileName)
             self.MAVLinkConnectedSignal.emit(connection)
             return True
@@ -373,10 +502,80 @@ class LogFileReplayEditTab(QWidget):
         return False
 
     def __chooseLogFile(self):
-        fileName = QFileDialog.getOpenFileName(self, 'Choose Log File')
+        fileName = QFileDialog.getOpenFileName(self, 'Choose Log File', '',
+                                               'Telemetry logs (*.bin *{});;All files (*)'.format(CHUNKED_LOG_EXTENSION))
         if fileName != None:
             self.logFilePathEdit.setText(fileName[0])
 
+class NetworkConnectionEditTab(QWidget):
+    '''UDP and TCP links, e.g. to SITL or a networked radio'''
+
+    DEFAULT_HOSTS = {
+        PROTOCOL_UDP_LISTEN : '0.0.0.0',
+        PROTOCOL_UDP_CONNECT : '127.0.0.1',
+        PROTOCOL_TCP_CLIENT : '127.0.0.1'
+    }
+    DEFAULT_PORTS = {
+        PROTOCOL_UDP_LISTEN : DEFAULT_UDP_PORT,
+        PROTOCOL_UDP_CONNECT : DEFAULT_UDP_PORT,
+        PROTOCOL_TCP_CLIENT : DEFAULT_TCP_PORT
+    }
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.MAVLinkConnectedSignal = parent.MAVLinkConnectedSignal
+        pParam = UserData.getInstance().getUserDataEntry(UD_TELEMETRY_KEY, {})
+        self.params = UserData.getParameterValue(pParam, UD_TELEMETRY_LAST_NETWORK_KEY, {})
+        self.receiveBufferSize = UserData.getParameterValue(pParam, UD_TELEMETRY_RECEIVE_BUFFER_SIZE_KEY, DEFAULT_RECEIVE_BUFFER_SIZE)
+        protocol = UserData.getParameterValue(self.params, UD_TELEMETRY_LAST_NETWORK_PROTOCOL_KEY, PROTOCOL_UDP_LISTEN)
+        l = QGridLayout()
+        l.setAlignment(Qt.AlignTop)
+        row = 0
+        l.addWidget(QLabel('Protocol'), row, 0, 1, 1, Qt.AlignRight)
+        self.protocolDropDown = QComboBox(self)
+        for key, val in NETWORK_PROTOCOLS.items():
+            self.protocolDropDown.addItem(val, QVariant(key))
+            if key == protocol:
+                self.protocolDropDown.setCurrentIndex(self.protocolDropDown.count() - 1)
+        self.protocolDropDown.currentIndexChanged.connect(self.__protocolChanged)
+        l.addWidget(self.protocolDropDown, row, 1, 1, 1, Qt.AlignLeft)
+        row += 1
+        l.addWidget(QLabel('Host'), row, 0, 1, 1, Qt.AlignRight)
+        self.hostEdit = QLineEdit(UserData.getParameterValue(self.params, UD_TELEMETRY_LAST_NETWORK_HOST_KEY,
+                                                             self.DEFAULT_HOSTS[protocol]))
+        l.addWidget(self.hostEdit, row, 1, 1, 1)
+        row += 1
+        l.addWidget(QLabel('Port'), row, 0, 1, 1, Qt.AlignRight)
+        self.portEdit = QLineEdit(str(UserData.getParameterValue(self.params, UD_TELEMETRY_LAST_NETWORK_PORT_KEY,
+                                                                 self.DEFAULT_PORTS[protocol])))
+        self.portEdit.setValidator(QIntValidator(1, 65535, self))
+        l.addWidget(self.portEdit, row, 1, 1, 1)
+        l.setColumnStretch(1, 1)
+        self.setLayout(l)
+
+    def __protocolChanged(self, i):
+        protocol = self.protocolDropDown.itemData(i)
+        self.hostEdit.setText(self.DEFAULT_HOSTS[protocol])
+        self.portEdit.setText(str(self.DEFAULT_PORTS[protocol]))
+
+    def doConnect(self):
+        protocol = self.protocolDropDown.currentData()
+        host = self.hostEdit.text().strip()
+        if self.portEdit.hasAcceptableInput() == False or host == '':
+            QMessageBox.critical(self.window(), 'Error', 'Invalid host or port', QMessageBox.Ok)
+            return False
+        port = int(self.portEdit.text())
+        try:
+            connection = openNetworkConnection(protocol, host, port, self.receiveBufferSize)
+        except OSError as e:
+            QMessageBox.critical(self.window(), 'Error', 'Unable to open {}:{}: {}'.format(host, port, e), QMessageBox.Ok)
+            return False
+        self.params[UD_TELEMETRY_LAST_NETWORK_PROTOCOL_KEY] = protocol
+        self.params[UD_TELEMETRY_LAST_NETWORK_HOST_KEY] = host
+        self.params[UD_TELEMETRY_LAST_NETWORK_PORT_KEY] = port
+        self.MAVLinkConnectedSignal.emit(connection)
+        return True
+
 class SerialConnectionEditTab(QWidget):
 
     __autoBaudStartSignal = pyqtSignal(object)
@@ -481,7 +680,7 @@ class SerialConnectionEditTab(QWidget):
         self.autoBaud.start()
 
     def __recordLastConnection(self, conn):
-        if isinstance(conn, mavlogfile) == False:
+        if isinstance(conn, mavutil.mavserial):
             self.params[UD_TELEMETRY_LAST_CONNECTION_PORT_KEY] = conn.device
             self.params[UD_TELEMETRY_LAST_CONNECTION_BAUD_RATE_KEY] = conn.baud
 
@@ -493,34 +692,32 @@ class AutoBaudThread(QThread):
 
     autoBaudStatusUpdateSignal = pyqtSignal(object)
 
+    DEFAULT_BAUD_RATE = 57600
+
     def __init__(self, port, parent):
         super().__init__(parent)
         self.MAVLinkConnectedSignal = parent.MAVLinkConnectedSignal
         self.port = port
+        pParam = UserData.getInstance().getUserDataEntry(UD_TELEMETRY_KEY, {})
+        history = UserData.getParameterValue(pParam, UD_TELEMETRY_AUTOBAUD_HISTORY_KEY, {})
+        self.history = UserData.getParameterValue(history, port, {})
 
     def run(self):
-        for b in BAUD_RATES:
-            if b >= self.__minimumBaudRate():
-                self.autoBaudStatusUpdateSignal.emit('AutoBaud: try baud rate {}'.format(b))
-                conn = mavutil.mavlink_connection(self.port, b)
-                hb = conn.wait_heartbeat(timeout=2.0)  # set timeout to 2 second
-                if hb == None:
-                    self.autoBaudStatusUpdateSignal.emit('AutoBaud: timeout for baud rate {}'.format(b))
-                    # Reset environment variables after a failed attempt
-                    # Otherwise mavutil.auto_mavlink_version may result in
-                    # unexpected behaviour
-                    if 'MAVLINK09' in os.environ:
-                        del os.environ['MAVLINK09']
-                    if 'MAVLINK20' in os.environ:
-                        del os.environ['MAVLINK20']
-                    conn.close()
-                else:
-                    self.autoBaudStatusUpdateSignal.emit('AutoBaud: correct baud rate is {}'.format(b))
-                    self.MAVLinkConnectedSignal.emit(conn)
-                    return
-        # Fail back to default mavlink baud rate
-        self.autoBaudStatusUpdateSignal.emit('AutoBaud: default 57600')
-        self.MAVLinkConnectedSignal.emit(mavutil.mavlink_connection(self.port, 57600))
+        candidates = [b for b in BAUD_RATES if b >= self.__minimumBaudRate()]
+        detector = BaudRateDetector(self.port, candidates, self.history)
+        try:
+            baud = detector.detect(lambda b: self.autoBaudStatusUpdateSignal.emit('AutoBaud: try baud rate {}'.format(b)))
+        except SerialException as e:
+            logger.warning('AutoBaud failed on %s: %s', self.port, e)
+            baud = None
+        if baud == None:
+            # Fail back to default mavlink baud rate
+            self.autoBaudStatusUpdateSignal.emit('AutoBaud: default {}'.format(self.DEFAULT_BAUD_RATE))
+            baud = self.DEFAULT_BAUD_RATE
+        else:
+            self.history[str(baud)] = self.history.get(str(baud), 0) + 1
+            self.autoBaudStatusUpdateSignal.emit('AutoBaud: correct baud rate is {}'.format(baud))
+        self.MAVLinkConnectedSignal.emit(mavutil.mavlink_connection(self.port, baud))
 
     def __minimumBaudRate(self):
         return 4800
@@ -530,6 +727,7 @@ class MAVLinkConnection(QThread):
     externalMessageHandler = pyqtSignal(object)  # pass any types of message to an external handler
 
     connectionEstablishedSignal = pyqtSignal()
+    activeUASChangedSignal = pyqtSignal(object)  # the vehicle shown by the instruments and addressed by commands
     onboardWaypointsReceivedSignal = pyqtSignal(object)  # pass the list of waypoints as parameter
     newTextMessageSignal = pyqtSignal(object)
     messageTimeoutSignal = pyqtSignal(float)  # pass number of seconds without receiving any messages
@@ -546,95 +744,237 @@ class MAVLinkConnection(QThread):
         # self.paramList = []
         self.paramPanel = None
 
-        self.txLock = QMutex()  # uplink lock
-        self.txResponseCond = QWaitCondition()
-        self.txTimeoutTimer = QTimer()
-        self.finalWPSent = False
-
-        self.wpLoader = MAVWPLoader()
-        self.onboardWPCount = 0
-        self.numberOfonboardWP = 0
-        self.onboardWP = []
-
         self.mavlinkLogFile = None
         self.lastMessageReceivedTimestamp = 0.0
-        self.lastMessages = {} # type = (msg, timestamp)
+        # Decoded messages are handed over to the GUI thread through a bounded
+        # ring buffer. deque.append() and deque.popleft() are atomic, so the
+        # link thread (producer) and the GUI thread (consumer) need no lock.
+        # When the GUI falls behind the oldest messages are dropped.
+        self.rxDispatchQueue = deque(maxlen = RX_DISPATCH_QUEUE_SIZE)
+        self.rxDroppedMessages = 0
+        self.rxReportedDrops = 0
+        self.rxDispatchTimer = QTimer()
 
         self.param = UserData.getInstance().getUserDataEntry(UD_TELEMETRY_KEY, {})
         self.messageTimeoutThreshold = UserData.getParameterValue(self.param,
                                                                   UD_TELEMETRY_TIMEOUT_THRESHOLD_KEY,
                                                                   MAVLinkConnection.DEFAULT_MESSAGE_TIMEOUT_THRESHOLD)
-        self.txTimeoutmsec = self.messageTimeoutThreshold * 1000000
         # timeout for wait initial heartbeat signal
         self.initHeartbeatTimeout = UserData.getParameterValue(self.param,
                                                                UD_TELEMETRY_HEARTBEAT_TIMEOUT_KEY,
                                                                MAVLinkConnection.DEFAULT_HEARTBEAT_TIMEOUT)
+        missionTimeout = UserData.getParameterValue(self.param, UD_TELEMETRY_MISSION_TIMEOUT_KEY, DEFAULT_MISSION_TIMEOUT)
+        missionRetries = UserData.getParameterValue(self.param, UD_TELEMETRY_MISSION_RETRIES_KEY, DEFAULT_MISSION_RETRIES)
+        self.missionManager = MissionManager(self.sendMavlinkMessage, missionTimeout, missionRetries,
+                                             UserData.getParameterValue(self.param,
+                                                                        UD_TELEMETRY_MISSION_DOWNLOAD_WINDOW_KEY,
+                                                                        DEFAULT_MISSION_DOWNLOAD_WINDOW),
+                                             UserData.getParameterValue(self.param, UD_TELEMETRY_MISSION_VERIFY_KEY, True))
+        self.missionManager.missionReceivedSignal.connect(self.__acceptOnboardMission)
+        self.linkStats = LinkStatistics(UserData.getParameterValue(self.param, UD_TELEMETRY_LINK_STATS_KEY, False))
         self.txMessageQueue = deque()
+        # self-pipe used to wake up the receive loop when there is something to send
+        self.__wakeupReader, self.__wakeupWriter = socket.socketpair()
+        self.__wakeupReader.setblocking(False)
+        self.__wakeupWriter.setblocking(False)
         self.running = True
-        self.connection = connection
+        self.connection = connection  # the primary link
+        self.router = MAVLinkRouter(connection, UserData.getParameterValue(self.param, UD_TELEMETRY_ROUTER_FORWARDING_KEY, False))
         self.replayMode = replayMode
         self.enableLog = enableLog
-        self.uas = None
+        self.uas = None  # the active vehicle
+        self.vehicles = UASRegistry()
+        self.vehicles.uasAddedSignal.connect(self.__acceptUAS)
         if replayMode:
             self.enableLog = False
             connection.replayCompleteSignal.connect(self.requestExit)
         self.internalHandlerLookup['PARAM_VALUE'] = self.receiveOnboardParameter
         self.internalHandlerLookup['MISSION_REQUEST'] = self.receiveMissionRequest
+        self.internalHandlerLookup['MISSION_REQUEST_INT'] = self.receiveMissionRequest
         self.internalHandlerLookup['MISSION_ACK'] = self.receiveMissionAcknowledge
         self.internalHandlerLookup['MISSION_COUNT'] = self.receiveMissionItemCount
         self.internalHandlerLookup['MISSION_ITEM'] = self.receiveMissionItem
+        self.internalHandlerLookup['MISSION_ITEM_INT'] = self.receiveMissionItem
         self.internalHandlerLookup['DATA_STREAM'] = self.receiveDataStream
         self.internalHandlerLookup['PARAM_SET'] = self.receiveParameterSet
 
-        self.txTimeoutTimer.timeout.connect(self._timerTimeout)
-        self.txTimeoutTimer.setSingleShot(True)
+        self.rxDispatchTimer.setInterval(RX_DISPATCH_INTERVAL)
+        self.rxDispatchTimer.timeout.connect(self.dispatchReceivedMessages)
+        self.finished.connect(self.__stopDispatching)
         # print('waiting for heart beat...')
         # self._establishConnection()
 
     def requestExit(self):
         # print('exit conn thread...')
         self.running = False
+        if self.replayMode:
+            self.connection.abortReplay()
+        self.__wakeup()
 
     def run(self):
         while self.running:
-            msg = self.connection.recv_match(blocking=False)
-            if msg != None:
-                msgType = msg.get_type()
-                if msgType != 'BAD_DATA':
-                    # exclude BAD_DATA from any other messages
-                    self.lastMessageReceivedTimestamp = time()
-                    self.lastMessages[msgType] = (msg, self.lastMessageReceivedTimestamp)
-                    if self.enableLog:
-                        ts = int(time() * 1.0e6) & ~3
-                        self.mavlinkLogFile.write(struct.pack('>Q', ts) + msg.get_msgbuf())
-                    # 1. send message to external destination
-                    self.externalMessageHandler.emit(msg)
-                    # 2. process message with internal UASInterface
-                    self.uas.receiveMAVLinkMessage(msg)
-                    # 3. process message with other internal handlers
-                    if msgType in self.internalHandlerLookup:
-                        self.internalHandlerLookup[msgType](msg)
-                else:
-                    # TODO handle BAD_DATA?
-                    print('BAD_DATA:', msg)
+            msgs = self.__receiveMessages()
+            if len(msgs) > 0:
+                self.__processMessages(msgs)
             rs = time() - self.lastMessageReceivedTimestamp
             if (rs > self.messageTimeoutThreshold):
-                print('Message timeout:', rs)
+                logger.warning('Message timeout: %.1f s', rs)
                 self.messageTimeoutSignal.emit(rs)
+            if self.replayMode == False:
+                self.missionManager.update()
+                for uas in self.vehicles.allUAS():
+                    uas.parameterSync.update()
+                    uas.parameterUploader.update()
+                self.router.update()
+            self.__sendQueuedMessages()
+            if len(msgs) == 0 and self.running:
+                # Nothing left to decode, block on the link until more data
+                # arrives, a message is queued for sending or the message
+                # timeout threshold is about to be crossed.
+                remaining = self.messageTimeoutThreshold - rs
+                self.__waitForLink(RX_WAIT_TIMEOUT if remaining <= 0 else min(RX_WAIT_TIMEOUT, remaining))
+        self.__doDisconnect()
+
+    def __receiveMessages(self):
+        '''
+        Read all bytes currently available on the links, a single read
+        per link, and return every complete message decoded from them.
+        '''
+        if self.replayMode:
+            # Log files interleave timestamps with frames and are paced
+            # by the replay speed control, read them one message at a time.
+            msg = self.connection.recv_match(blocking=False)
+            if msg == None:
+                return []
+            if self.linkStats.enabled:
+                self.linkStats.recordBytes(len(msg.get_msgbuf()))
+            return [msg]
+        msgs, nbytes = self.router.receive(RX_READ_SIZE)
+        if self.linkStats.enabled:
+            self.linkStats.recordBytes(nbytes)
+        return msgs
+
+    def __processMessages(self, msgs):
+        ts = time()
+        stats = self.linkStats if self.linkStats.enabled else None
+        if stats != None:
+            stats.recordMessages(msgs)
+        for msg in msgs:
+            msgType = msg.get_type()
+            if msgType != 'BAD_DATA':
+                # exclude BAD_DATA from any other messages
+                self.lastMessageReceivedTimestamp = ts
+                if self.enableLog:
+                    self.mavlinkLogFile.write(ts, msg.get_msgbuf())
+                # 1. process message with internal protocol handlers,
+                # mission and parameter transfers are answered from the link thread
+                if msgType in self.internalHandlerLookup:
+                    if stats == None:
+                        self.internalHandlerLookup[msgType](msg)
+                    else:
+                        t0 = perf_counter()
+                        self.internalHandlerLookup[msgType](msg)
+                        stats.recordHandlerTime(msgType, perf_counter() - t0)
+                # 2. hand over to the GUI thread, see dispatchReceivedMessages()
+                if len(self.rxDispatchQueue) == RX_DISPATCH_QUEUE_SIZE:
+                    self.rxDroppedMessages += 1
+                self.rxDispatchQueue.append(msg)
+            else:
+                # TODO handle BAD_DATA?
+                logger.debug('BAD_DATA: %s', msg)
+
+    def dispatchReceivedMessages(self):
+        '''
+        Drain the messages decoded since the last tick, runs in the GUI thread.
+        Only the messages queued when the tick starts are processed, so a
+        busy link can not starve the event loop. The vehicles then notify
+        the changes of their state once for the tick.
+        '''
+        stats = self.linkStats if self.linkStats.enabled else None
+        routes = self.vehicles.routes
+        for _ in range(len(self.rxDispatchQueue)):
             try:
-                txMsg = self.txMessageQueue.popleft()
-                print('sending mavlink msg:', txMsg)
-                self.connection.mav.send(txMsg)
+                msg = self.rxDispatchQueue.popleft()
             except IndexError:
-                pass
-        self.__doDisconnect()
+                break  # drained by a nested event loop, e.g. a modal dialog
+            # 1. send message to external destination
+            self.externalMessageHandler.emit(msg)
+            # 2. process message with the UASInterface of its vehicle
+            uas = routes.get((msg.get_srcSystem(), msg.get_srcComponent()))
+            if uas == None:
+                uas = self.vehicles.route(msg)
+                if uas == None:
+                    continue  # no HEARTBEAT from this system yet
+                routes = self.vehicles.routes  # rebuilt when a vehicle is added
+            if stats == None:
+                uas.receiveMAVLinkMessage(msg)
+            else:
+                t0 = perf_counter()
+                uas.receiveMAVLinkMessage(msg)
+                stats.recordHandlerTime(msg.get_type(), perf_counter() - t0)
+        # 3. one notification per vehicle for the whole tick
+        for uas in self.vehicles.interfaces.values():
+            uas.notifyStateChanged()
+        dropped = self.rxDroppedMessages
+        if dropped != self.rxReportedDrops:
+            logger.warning('GUI falling behind, %d received messages dropped in total', dropped,
+                           extra = {'rateKey' : 'rxDispatchDrop'})
+            self.rxReportedDrops = dropped
+
+    def __stopDispatching(self):
+        self.rxDispatchTimer.stop()
+        self.dispatchReceivedMessages()
+
+    def __sendQueuedMessages(self):
+        while len(self.txMessageQueue) > 0:
+            txMsg = self.txMessageQueue.popleft()
+            logger.debug('sending mavlink msg: %s', txMsg)
+            self.router.send(txMsg)
+
+    def __waitForLink(self, timeout):
+        '''
+        Wait for up to `timeout` seconds until the link becomes readable
+        or the receive loop is woken up by `__wakeup()`.
+        '''
+        fds = [self.__wakeupReader]
+        linkFds = self.router.fds()
+        if linkFds != None:
+            fds += linkFds
+        else:
+            # Serial ports on Windows and log files can not be selected,
+            # fall back to a short sleep between polls.
+            timeout = min(timeout, RX_POLL_INTERVAL)
+        try:
+            readable = select.select(fds, [], [], timeout)[0]
+        except (OSError, ValueError):
+            return
+        if self.__wakeupReader in readable:
+            try:
+                while self.__wakeupReader.recv(64):
+                    pass
+            except OSError:
+                pass  # drained
+
+    def __wakeup(self):
+        try:
+            self.__wakeupWriter.send(b'\x00')
+        except OSError:
+            pass  # a wake up is already pending or the link is closed
 
     def __doDisconnect(self, txtmsg = 'Disconnected'):
-        self.connection.close()
+        self.missionManager.cancel()
+        for uas in self.vehicles.allUAS():
+            uas.parameterSync.cancel()
+            uas.parameterUploader.cancel()
+        self.router.close()
+        self.__wakeupReader.close()
+        self.__wakeupWriter.close()
         self.isConnected = False
         if self.enableLog and self.mavlinkLogFile != None:
             self.mavlinkLogFile.close()
-        self.uas.resetOnboardParameterList()
+            logger.info('Log file closed: %s', self.mavlinkLogFile.metrics())
+        for uas in self.vehicles.allUAS():
+            uas.resetOnboardParameterList()
         self.newTextMessageSignal.emit(txtmsg)
 
     def establishConnection(self):
@@ -647,12 +987,14 @@ class MAVLinkConnection(QThread):
         self.lastMessageReceivedTimestamp = time()
         self.__createLogFile()
         self.__setMavlinkDialect(hb.autopilot)
+        self.setActiveUAS(self.vehicles.createUAS(hb.autopilot, hb.get_srcSystem(), hb.get_srcComponent()))
         self.mavStatus[MavStsKeys.VEHICLE_TYPE] = hb.type
         self.mavStatus[MavStsKeys.AP_TYPE] = hb.autopilot
         self.mavStatus[MavStsKeys.AP_MODE] = hb.base_mode
         self.mavStatus[MavStsKeys.CUSTOM_AP_MODE] = hb.custom_mode
         self.mavStatus[MavStsKeys.AP_SYS_STS] = hb.system_status
         self.mavStatus[MavStsKeys.MAVLINK_VER] = hb.mavlink_version
+        self.rxDispatchTimer.start()
         # request all parameters
         if self.replayMode:
             self.newTextMessageSignal.emit('Conneced in log file replay mode')
@@ -662,55 +1004,94 @@ class MAVLinkConnection(QThread):
             self.newTextMessageSignal.emit('Conneced to AP:{}'.format(self.mavStatus[MavStsKeys.AP_TYPE]))
             self.uas.fetchAllOnboardParameters()
 
+    def setActiveUAS(self, uas):
+        '''Show `uas` on the instruments and address commands to it'''
+        self.vehicles.setActiveUAS(uas)
+        self.uas = uas
+        self.connection.target_system = uas.systemId
+        self.connection.target_component = uas.componentId
+        self.activeUASChangedSignal.emit(uas)
+        if self.isConnected and self.replayMode == False and len(uas.onboardParameters) == 0 \
+           and uas.parameterSync.isBusy() == False:
+            uas.fetchAllOnboardParameters()
+
+    def addLink(self, connection):
+        '''Receive from and transmit over `connection` too, the vehicles must be the same'''
+        link = self.router.addLink(connection)
+        self.newTextMessageSignal.emit('Link added: {}'.format(link.name))
+        self.__wakeup()
+
+    def __acceptUAS(self, uas):
+        uas.mavlinkMessageTxSignal.connect(lambda msg: self.sendMavlinkMessage(msg, uas))
+        uas.parameterSync.finishedSignal.connect(lambda success, text: self.__acceptOnboardParameters(uas, success, text))
+        uas.parameterSync.verifiedSignal.connect(lambda changed, text: self.__acceptParameterVerification(uas, changed, text))
+        uas.parameterUploader.finishedSignal.connect(lambda success, text: self.__acceptParameterUpload(uas, success, text))
+
     def receiveOnboardParameter(self, msg):
-        self.uas.acceptOnboardParameter(msg)
+        uas = self.vehicles.get(msg.get_srcSystem(), msg.get_srcComponent())
+        if uas == None:
+            return  # requested again when the vehicle becomes active
+        uas.acceptOnboardParameter(msg)
+        if uas != self.uas:
+            return
         self.newTextMessageSignal.emit('Param: {} = {}'.format(msg.param_id, msg.param_value))
-        if self.uas.onboardParamNotReceived == 0:
-            self.newTextMessageSignal.emit('{} parameters received'.format(msg.param_count))
-            if self.param['DOWNLOAD_WAYPOINTS_ON_CONNECT']:
-                self.downloadWaypoints()  # request to read all onboard waypoints
-            if self.isConnected == False:
-                # prevent further signals when refreshing parameters
-                self.isConnected = True
-                self.connectionEstablishedSignal.emit()
+
+    def __acceptOnboardParameters(self, uas, success, text):
+        '''The parameter download of `uas` is over, complete or not'''
+        if uas != self.uas or self.running == False:
+            return
+        self.newTextMessageSignal.emit(text)
+        if self.param['DOWNLOAD_WAYPOINTS_ON_CONNECT']:
+            self.downloadWaypoints()  # request to read all onboard waypoints
+        if self.isConnected == False:
+            # prevent further signals when refreshing parameters
+            self.isConnected = True
+            self.connectionEstablishedSignal.emit()
+
+    def __acceptParameterVerification(self, uas, changed, text):
+        '''The cached parameters `uas` was connected with were checked in the background'''
+        if uas == self.uas and self.running:
+            self.newTextMessageSignal.emit(text)
+
+    def __acceptParameterUpload(self, uas, success, text):
+        '''All the parameters edited for `uas` were set, or given up'''
+        if success == False and self.running:
+            QMessageBox.warning(None, 'Warning', '{}: {}'.format(uas.vehicleName(), text), QMessageBox.Ok)
+        self.newTextMessageSignal.emit('{}: {}'.format(uas.vehicleName(), text))
 
     def receiveMissionItem(self, msg):
-        self.numberOfonboardWP += 1
-        wp = Waypoint(msg.seq, msg.x, msg.y, msg.z)
-        wp.waypointType = msg.command
-        self.onboardWP.append(wp)
-        if self.numberOfonboardWP < self.onboardWPCount:
-            self.connection.waypoint_request_send(self.numberOfonboardWP)  # read next one
-        else:
-            self.newTextMessageSignal.emit('Total {} waypoint(s) onboard'.format(len(self.onboardWP)))
-            self.onboardWaypointsReceivedSignal.emit(self.onboardWP)  # all done, send signal
+        self.missionManager.acceptMissionItem(msg)
 
     def receiveMissionItemCount(self, msg):
-        self.onboardWPCount = msg.count
-        if self.onboardWPCount > 0:
-            self.connection.waypoint_request_send(0)  # start reading onboard waypoints
+        self.missionManager.acceptMissionCount(msg)
 
     def receiveMissionRequest(self, msg):
-        # print('missionRequest:', msg)
-        self.sendMavlinkMessage(self.wpLoader.wp(msg.seq))
+        self.missionManager.acceptMissionRequest(msg)
 
     def receiveMissionAcknowledge(self, msg):
-        print('missionRequestAck:', msg)
-        self.txResponseCond.wakeAll()
+        logger.debug('missionRequestAck: %s', msg)
+        self.missionManager.acceptMissionAck(msg)
+
+    def __acceptOnboardMission(self, table):
+        wpList = table.toWaypoints()
+        self.newTextMessageSignal.emit('Total {} waypoint(s) onboard'.format(len(wpList)))
+        self.onboardWaypointsReceivedSignal.emit(wpList)
 
     def receiveDataStream(self, msg):
         # DATA_STREAM {stream_id : 10, message_rate : 0, on_off : 0}
-        print(msg)
+        logger.debug('%s', msg)
 
     def receiveParameterSet(self, msg):
         # PARAM_SET {target_system : 81, target_component : 50, param_id : BFLOW_GYRO_COM, param_value : 0.0, param_type : 9}
-        print(msg)
+        logger.debug('%s', msg)
 
     def showParameterEditWindow(self):
         if self.isConnected:
-            if self.uas.onboardParamNotReceived > 0:
+            if self.uas.parameterSync.isBusy():
+                missing = self.uas.parameterSync.missingCount()
                 QMessageBox.warning(None, 'Warning',
-                                    'Please wait while receiving all onboard parameters, {} parameters left.'.format(self.uas.onboardParamNotReceived),
+                                    'Please wait while receiving all onboard parameters, {} parameters left.'.format(
+                                        'all' if missing == None else missing),
                                     QMessageBox.Ok)
             else:
                 self.paramPanel = ParameterPanel(self.uas.onboardParameters)
@@ -718,52 +1099,41 @@ class MAVLinkConnection(QThread):
                 self.paramPanel.show()
 
     def downloadWaypoints(self):
-        self.connection.waypoint_request_list_send()
+        if self.missionManager.download(self.connection.target_system, self.connection.target_component) == False:
+            self.newTextMessageSignal.emit('Mission transfer already in progress')
 
     def uploadWaypoints(self, wpList):
-        seq = 0
-        for wp in wpList:
-            item = wp.toMavlinkMessage(self.connection.target_system, self.connection.target_component, seq, 0, 1)
-            seq += 1
-            self.wpLoader.add(item)
-        print('all wp queued!')
-        self._sendMissionCount(len(wpList))
+        table = MissionTable.fromWaypoints(wpList)
+        if self.missionManager.upload(table, self.connection.target_system, self.connection.target_component) == False:
+            self.newTextMessageSignal.emit('Mission transfer already in progress')
 
     def setHomePosition(self, wp):
-        item = mavutil.mavlink.MAVLink_mission_item_message(self.connection.target_system, self.connection.target_component, 0,
-                                                            mavlink.MAV_FRAME_GLOBAL, mavlink.MAV_CMD_DO_SET_HOME , 1, 0,
-                                                            1, None, None, None,
-                                                            wp.latitude, wp.longitude, wp.altitude)
+        item = mavutil.mavlink.MAVLink_mission_item_int_message(self.connection.target_system, self.connection.target_component, 0,
+                                                                mavlink.MAV_FRAME_GLOBAL, mavlink.MAV_CMD_DO_SET_HOME , 1, 0,
+                                                                1, nan, nan, nan,
+                                                                int(round(wp.latitude * 1.0e7)), int(round(wp.longitude * 1.0e7)),
+                                                                wp.altitude)
         self.sendMavlinkMessage(item)
 
-    def _sendMissionCount(self, cnt):
-        print('{} waypoints to be sent'.format(cnt))
-        # self.txTimeoutTimer.start(self.txTimeoutmsec)
-        self.txLock.lock()
-        # self.connection.waypoint_clear_all_send()
-        self.connection.waypoint_count_send(cnt)
-        print('[CNT] wait for response...')
-        self.txResponseCond.wait(self.txLock)
-        self.txLock.unlock()
-        print('[CNT] Got response!')
-
-    def sendMavlinkMessage(self, msg):
-        ''' Add a mavlink message to the tx queue '''
+    def sendMavlinkMessage(self, msg, uas = None):
+        '''
+        Add a mavlink message to the tx queue, a target of 255 is
+        replaced by the vehicle `uas`, or the active vehicle if None
+        '''
         if msg.target_system == 255:
-            msg.target_system = self.connection.target_system
+            msg.target_system = self.connection.target_system if uas == None else uas.systemId
         if msg.target_component == 255:
-            msg.target_component = self.connection.target_component
+            msg.target_component = self.connection.target_component if uas == None else uas.componentId
         self.txMessageQueue.append(msg)
-
-    def _timerTimeout(self):
-        print('Timeout')
-        self.txResponseCond.wakeAll()
+        self.__wakeup()
 
     def navigateToWaypoint(self, wp: Waypoint):
-        item = mavutil.mavlink.MAVLink_mission_item_message(self.connection.target_system, self.connection.target_component, 0,
-                                                            mavlink.MAV_FRAME_GLOBAL, mavlink.MAV_CMD_NAV_WAYPOINT, 1,
-                                                            1,  # Auto continue to next waypoint
-                                                            0, 0, 0, 0, wp.latitude, wp.longitude, wp.altitude)
+        item = mavutil.mavlink.MAVLink_mission_item_int_message(self.connection.target_system, self.connection.target_component, 0,
+                                                                mavlink.MAV_FRAME_GLOBAL, mavlink.MAV_CMD_NAV_WAYPOINT, 1,
+                                                                1,  # Auto continue to next waypoint
+                                                                0, 0, 0, 0,
+                                                                int(round(wp.latitude * 1.0e7)), int(round(wp.longitude * 1.0e7)),
+                                                                wp.altitude)
         self.sendMavlinkMessage(item)
 
     def initializeReturnToHome(self):
@@ -773,13 +1143,10 @@ class MAVLinkConnection(QThread):
         # the params from UI are MAVLink_param_value_message,
         # which are required to be consistent with all parameters
         # download upon connection. They will be converted to
-        # MAVLink_param_set_message before sending to UAV
-        for param in params:
-            paramSet = mavutil.mavlink.MAVLink_param_set_message(self.connection.target_system,
-                                                                 self.connection.target_component,
-                                                                 param.param_id.encode('utf-8'),
-                                                                 param.param_value, param.param_type)
-            self.sendMavlinkMessage(paramSet)
+        # MAVLink_param_set_message before sending to UAV,
+        # confirmed by the PARAM_VALUE echoed by the vehicle
+        if self.uas.parameterUploader.start(params) == False:
+            QMessageBox.warning(None, 'Warning', 'Parameter upload already in progress', QMessageBox.Ok)
 
     def setupMessageSigningKey(self, key, ts):
         key0 = None
@@ -799,19 +1166,43 @@ class MAVLinkConnection(QThread):
 
     def __createLogFile(self):
         if self.enableLog:
-            name = 'MAV_{}.bin'.format(int(time() * 1000))
-            self.mavlinkLogFile = open(os.path.join(self.param[UD_TELEMETRY_LOG_FOLDER_KEY], name), 'wb')
+            name = os.path.join(self.param[UD_TELEMETRY_LOG_FOLDER_KEY], 'MAV_{}'.format(int(time() * 1000)))
+            logFile = None
+            if UserData.getParameterValue(self.param, UD_TELEMETRY_LOG_FORMAT_KEY, LOG_FORMAT_TLOG) == LOG_FORMAT_CHUNKED:
+                name += CHUNKED_LOG_EXTENSION
+                logFile = ChunkedLogFile(name, UserData.getParameterValue(self.param, UD_TELEMETRY_LOG_CODEC_KEY, 'zstd'),
+                                         chunkSize = UserData.getParameterValue(self.param,
+                                                                                UD_TELEMETRY_LOG_CHUNK_SIZE_KEY,
+                                                                                DEFAULT_CHUNK_SIZE),
+                                         maxAge = UserData.getParameterValue(self.param,
+                                                                             UD_TELEMETRY_LOG_CHUNK_MAX_AGE_KEY,
+                                                                             DEFAULT_CHUNK_MAX_AGE))
+            else:
+                name += '.bin'
+            self.mavlinkLogFile = TLogWriter(name,
+                                             bufferSize = UserData.getParameterValue(self.param,
+                                                                                     UD_TELEMETRY_LOG_BUFFER_SIZE_KEY,
+                                                                                     DEFAULT_LOG_BUFFER_SIZE),
+                                             flushInterval = UserData.getParameterValue(self.param,
+                                                                                        UD_TELEMETRY_LOG_FLUSH_INTERVAL_KEY,
+                                                                                        DEFAULT_LOG_FLUSH_INTERVAL),
+                                             fsyncPolicy = UserData.getParameterValue(self.param,
+                                                                                      UD_TELEMETRY_LOG_FSYNC_KEY,
+                                                                                      FSYNC_NEVER),
+                                             fsyncInterval = UserData.getParameterValue(self.param,
+                                                                                        UD_TELEMETRY_LOG_FSYNC_INTERVAL_KEY,
+                                                                                        DEFAULT_LOG_FSYNC_INTERVAL),
+                                             logFile = logFile)
+            self.mavlinkLogFile.start()
 
     def __setMavlinkDialect(self, ap):
         mavutil.mavlink = None  # reset previous dialect
-        self.uas = UASInterfaceFactory.getUASInterface(ap)
-        self.uas.mavlinkMessageTxSignal.connect(self.sendMavlinkMessage)
         if ap in MAVLINK_DIALECTS:
-            print('Set dialect to: {} ({})'.format(MAVLINK_DIALECTS[ap], ap))
+            logger.info('Set dialect to: %s (%s)', MAVLINK_DIALECTS[ap], ap)
             mavutil.set_dialect(MAVLINK_DIALECTS[ap])
         elif ap != mavlink.MAV_AUTOPILOT_INVALID:
             # default to common
-            print('Set dialect to common for unknown AP type:', ap)
+            logger.info('Set dialect to common for unknown AP type: %s', ap)
             mavutil.set_dialect(MAVLINK_DIALECTS[mavlink.MAV_AUTOPILOT_GENERIC])
         # Hot patch after setting mavlink dialect on the fly
         self.connection.mav = mavutil.mavlink.MAVLink(self.connection,
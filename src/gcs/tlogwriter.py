@@ -0,0 +1,208 @@
+import os, struct
+from collections import deque
+from time import time
+from PyQt5.QtCore import QMutex, QThread, QWaitCondition
+
+from gcslog import getLogger
+
+DEFAULT_LOG_BUFFER_SIZE = 256 * 1024 # bytes
+DEFAULT_LOG_MAX_BUFFERS = 64 # up to 16MB pending when the storage stalls
+DEFAULT_LOG_FLUSH_INTERVAL = 1.0 # seconds
+DEFAULT_LOG_FSYNC_INTERVAL = 10.0 # seconds, used by FSYNC_PERIODIC
+
+FSYNC_NEVER = 'NEVER' # leave it to the OS
+FSYNC_ON_FLUSH = 'FLUSH' # after every batch written
+FSYNC_PERIODIC = 'PERIODIC' # at most once every fsync interval
+FSYNC_POLICIES = (FSYNC_NEVER, FSYNC_ON_FLUSH, FSYNC_PERIODIC)
+
+TIMESTAMP_SIZE = 8
+TIMESTAMP_FORMAT = '>Q'
+
+logger = getLogger('tlogwriter')
+
+class TLogWriter(QThread):
+    '''
+    Write MAVLink messages to a tlog file from a dedicated thread.
+    Each record is a big endian 64 bit timestamp in microseconds followed
+    by the raw MAVLink frame, the same format replayed by mavlogfile.
+    Records are packed into preallocated buffers by the caller, full buffers
+    are written out by the writer thread in one call, so the receive loop
+    never waits for the storage. Pending data is flushed when a buffer is
+    full or every flush interval. If the storage stalls long enough to use
+    up all buffers, new records are dropped and counted instead of blocking.
+    '''
+
+    def __init__(self, fileName,
+                 bufferSize = DEFAULT_LOG_BUFFER_SIZE,
+                 maxBuffers = DEFAULT_LOG_MAX_BUFFERS,
+                 flushInterval = DEFAULT_LOG_FLUSH_INTERVAL,
+                 fsyncPolicy = FSYNC_NEVER,
+                 fsyncInterval = DEFAULT_LOG_FSYNC_INTERVAL,
+                 logFile = None,
+                 parent = None):
+        '''
+        `logFile` is an optional file object opened for writing, e.g. a
+        ChunkedLogFile, instead of the plain file created from `fileName`.
+        '''
+        super().__init__(parent)
+        self.fileName = fileName
+        self.bufferSize = bufferSize
+        self.maxBuffers = max(2, maxBuffers)
+        self.flushInterval = flushInterval
+        self.fsyncPolicy = fsyncPolicy if fsyncPolicy in FSYNC_POLICIES else FSYNC_NEVER
+        self.fsyncInterval = fsyncInterval
+        self.logFile = open(fileName, 'wb', buffering = 0) if logFile == None else logFile
+        self.running = True
+        self.lock = QMutex()
+        self.dataReady = QWaitCondition()
+        self.freeBuffers = deque()
+        self.fullBuffers = deque() # (buffer, length, records)
+        self.buffer = bytearray(bufferSize)
+        self.bufferPos = 0
+        self.bufferRecords = 0
+        self.bufferCount = 1
+        self.lastFsync = time()
+        # metrics, of the data actually written to the file
+        self.recordsWritten = 0
+        self.bytesWritten = 0
+        self.recordsDropped = 0
+        self.flushCount = 0
+        self.fsyncCount = 0
+        self.maxFlushTime = 0.0
+        self.maxPendingBuffers = 0
+        self.writeErrors = 0
+
+    def write(self, timestamp, msgbuf):
+        '''
+        Append one record, `timestamp` in seconds.
+        Called from the receive loop, only copies into the current buffer.
+        '''
+        size = TIMESTAMP_SIZE + len(msgbuf)
+        self.lock.lock()
+        try:
+            if self.buffer == None or self.bufferPos + size > len(self.buffer):
+                if self.__swapBuffer(size) == False:
+                    self.recordsDropped += 1
+                    return
+            struct.pack_into(TIMESTAMP_FORMAT, self.buffer, self.bufferPos, int(timestamp * 1.0e6) & ~3)
+            self.buffer[self.bufferPos + TIMESTAMP_SIZE : self.bufferPos + size] = msgbuf
+            self.bufferPos += size
+            self.bufferRecords += 1
+        finally:
+            self.lock.unlock()
+
+    def __swapBuffer(self, size):
+        '''Queue the current buffer for writing and take a free one, lock must be held'''
+        if self.buffer != None and self.bufferPos > 0:
+            self.fullBuffers.append((self.buffer, self.bufferPos, self.bufferRecords))
+            self.maxPendingBuffers = max(self.maxPendingBuffers, len(self.fullBuffers))
+            self.dataReady.wakeOne()
+        self.bufferPos = 0
+        self.bufferRecords = 0
+        if len(self.freeBuffers) > 0:
+            self.buffer = self.freeBuffers.popleft()
+        elif self.bufferCount < self.maxBuffers:
+            self.buffer = bytearray(self.bufferSize)
+            self.bufferCount += 1
+        else:
+            # the writer is stalled and holds every buffer
+            self.buffer = None
+            return False
+        if size > len(self.buffer):
+            self.buffer = bytearray(size)
+        return True
+
+    def metrics(self):
+        self.lock.lock()
+        try:
+            pending = self.bufferPos + sum(length for _, length, _ in self.fullBuffers)
+            return {
+                'records' : self.recordsWritten,
+                'bytes' : self.bytesWritten,
+                'dropped' : self.recordsDropped,
+                'pending_bytes' : pending,
+                'pending_buffers' : len(self.fullBuffers),
+                'max_pending_buffers' : self.maxPendingBuffers,
+                'buffers' : self.bufferCount,
+                'flushes' : self.flushCount,
+                'fsyncs' : self.fsyncCount,
+                'max_flush_time' : self.maxFlushTime,
+                'write_errors' : self.writeErrors
+            }
+        finally:
+            self.lock.unlock()
+
+    def run(self):
+        while True:
+            self.lock.lock()
+            try:
+                if self.running and len(self.fullBuffers) == 0:
+                    self.dataReady.wait(self.lock, int(self.flushInterval * 1000))
+                if len(self.fullBuffers) == 0 and (self.buffer == None or self.bufferPos > 0):
+                    # flush interval elapsed or exiting, write out the partial buffer
+                    self.__swapBuffer(0)
+                batch = list(self.fullBuffers)
+                self.fullBuffers.clear()
+                exiting = self.running == False
+            finally:
+                self.lock.unlock()
+            self.__flush(batch, exiting)
+            if exiting:
+                break
+        self.logFile.close()
+
+    def __flush(self, batch, closing):
+        if len(batch) > 0:
+            t0 = time()
+            for buf, length, records in batch:
+                try:
+                    self.__writeAll(memoryview(buf)[:length])
+                    self.recordsWritten += records
+                except OSError as e:
+                    self.writeErrors += 1
+                    logger.error('Failed to write log file %s: %s', self.fileName, e)
+            try:
+                self.logFile.flush() # a chunked log holds the records until then
+            except OSError as e:
+                self.writeErrors += 1
+                logger.error('Failed to flush log file %s: %s', self.fileName, e)
+            self.flushCount += 1
+            self.__sync(closing)
+            self.maxFlushTime = max(self.maxFlushTime, time() - t0)
+            self.lock.lock()
+            self.freeBuffers.extend(buf for buf, _, _ in batch if len(buf) == self.bufferSize)
+            self.lock.unlock()
+        elif closing:
+            self.__sync(closing)
+
+    def __writeAll(self, view):
+        '''Write the whole of `view`, a raw file may take only part of it per call'''
+        while len(view) > 0:
+            written = self.logFile.write(view)
+            if written == None:
+                written = len(view) # buffered file objects take everything or raise
+            self.bytesWritten += written
+            view = view[written:]
+
+    def __sync(self, closing):
+        if self.fsyncPolicy == FSYNC_NEVER:
+            return
+        now = time()
+        if self.fsyncPolicy == FSYNC_ON_FLUSH or closing or now - self.lastFsync >= self.fsyncInterval:
+            try:
+                os.fsync(self.logFile.fileno())
+                self.fsyncCount += 1
+            except OSError:
+                self.writeErrors += 1
+            self.lastFsync = now
+
+    def close(self):
+        '''Write out everything pending and close the file, blocks until done'''
+        self.lock.lock()
+        self.running = False
+        self.dataReady.wakeOne()
+        self.lock.unlock()
+        if self.isRunning():
+            self.wait()
+        elif self.logFile.closed == False:
+            self.run()
@@ -1,79 +1,141 @@
+import os
 from abc import abstractmethod
-from math import log, sqrt
 from PyQt5.QtCore import QObject, pyqtSignal
 from pymavlink.mavutil import mavlink
+from gcslog import getLogger
+from paramcache import ParameterCache, PARAM_CACHE_DIRECTORY
+from paramsync import (ParameterSync, ParameterUploader, DEFAULT_PARAM_BURST, DEFAULT_PARAM_QUIET_PERIOD,
+                       DEFAULT_PARAM_RETRIES, DEFAULT_PARAM_SET_TIMEOUT, DEFAULT_PARAM_SET_WINDOW)
+from units import (convertMessage, pressureAltitude, DEFAULT_ALTITUDE_REFERENCE,
+                   DEFAULT_PRESSURE_REFERENCE, UINT16_MAX)
 from utils import unused
 from UserData import UserData
+from vehiclestate import RC_CHANNEL_COUNT, VehicleState
 
-UINT16_MAX = 0xFFFF
-MAVLINK_LXTITUDE_SCALE = 1E7
-UNIVERSAL_GAS_CONSTANT = 8.3144598 # J/(mol·K)
-MOLAR_MASS = 0.0289644 # kg/mol
-gravity = 9.80665 # m/s2
-DEFAULT_ALTITUDE_REFERENCE = 0.0  # METER
-DEFAULT_PRESSURE_REFERENCE = 101325.0  # PA
-ZERO_KELVIN = -273.15 # degree
+logger = getLogger('uas')
 
 UD_UAS_CONF_KEY = 'UAS'
 UD_UAS_CONF_GPS_SRC_KEY = 'GPS_SRC'
+UD_UAS_CONF_PARAM_QUIET_PERIOD_KEY = 'PARAM_QUIET_PERIOD' # seconds before the missing parameters are requested
+UD_UAS_CONF_PARAM_BURST_KEY = 'PARAM_BURST'
+UD_UAS_CONF_PARAM_RETRIES_KEY = 'PARAM_RETRIES'
+UD_UAS_CONF_PARAM_SET_TIMEOUT_KEY = 'PARAM_SET_TIMEOUT' # seconds without the echo of a PARAM_SET before sending it again
+UD_UAS_CONF_PARAM_SET_WINDOW_KEY = 'PARAM_SET_WINDOW'
+UD_UAS_CONF_PARAM_CACHE_KEY = 'PARAM_CACHE' # keep the parameters of each vehicle on disk to skip their download
+
+RC_CHANNEL_FIELDS = tuple('chan{}_raw'.format(i + 1) for i in range(RC_CHANNEL_COUNT))
 
 class UASInterface(QObject):
 
-    updateAttitudeSignal = pyqtSignal(object, int, float, float, float) # uas, timestamp, roll, pitch, yaw
-    updateBatterySignal = pyqtSignal(object, int, float, float, float) # uas, timestamp, voltage, current, percent
-    updateGlobalPositionSignal = pyqtSignal(object, int, float, float, float) # uas, timestamp, lat, lng, altitude
-    updateGPSStatusSignal = pyqtSignal(object, int, int, int, int, int, int, int, int, int) # uas, timestamp, fix type, HDOP, VDOP, satellites visible, h acc, v acc, vel acc, hdg acc
-    updateAirSpeedSignal = pyqtSignal(object, int, float) # uas, timestamp, speed
-    updateGroundSpeedSignal = pyqtSignal(object, int, float) # uas, timestamp, speed
-    updateVelocitySignal = pyqtSignal(object, int, float, float, float) # uas, timestamp, x, y, z
-    updatePrimaryAltitudeSignal = pyqtSignal(object, int, float) # uas, timestamp, altitude
-    updateGPSAltitudeSignal = pyqtSignal(object, int, float) # uas, timestamp, altitude
-    updateAirPressureSignal = pyqtSignal(object, int, float, float, float) # uas, timestamp, abs press, diff press, temperature
-    updateRCStatusSignal = pyqtSignal(object, int, int, int, int) # uas, type(local, remote), rssi, noise, errors
-    # uas, desiredRoll, desiredPitch, desiredHeading, targetBearing, wpDist
-    updateNavigationControllerOutputSignal = pyqtSignal(object, float, float, float, float, float)
-    updateRCChannelsSignal = pyqtSignal(object, int, int, object) # uas, timestamp, rssi, channels
+    stateChangedSignal = pyqtSignal(object, int) # uas, mask of the changed vehiclestate domains
     mavlinkMessageTxSignal = pyqtSignal(object) # mavlink message object
 
-    def __init__(self, name, parent = None):
+    # message type -> name of the handler method, resolved once per class, see handlerTable()
+    MESSAGE_HANDLERS = {
+        'SYS_STATUS' : 'uasStatusHandler',
+        'GPS_RAW_INT' : 'uasLocationHandler',
+        'GLOBAL_POSITION_INT' : 'uasFilteredLocationHandler',
+        'SCALED_PRESSURE' : 'uasAltitudeHandler',
+        'ATTITUDE' : 'uasAttitudeHandler',
+        'GPS_STATUS' : 'uasGPSStatusHandler',
+        'RADIO_STATUS' : 'uasRadioStatusHandler',
+        'RC_CHANNELS' : 'uasRCChannelsHandler',
+        'NAV_CONTROLLER_OUTPUT' : 'uasNavigationControllerOutputHandler',
+        'LOCAL_POSITION_NED' : 'uasDefaultMessageHandler',
+        'PARAM_VALUE' : 'uasDefaultMessageHandler',
+        'HEARTBEAT' : 'uasDefaultMessageHandler',
+        'ATTITUDE_QUATERNION' : 'uasDefaultMessageHandler',
+        'SYSTEM_TIME' : 'uasDefaultMessageHandler',
+        'VFR_HUD' : 'uasDefaultMessageHandler',
+        'AUTOPILOT_VERSION' : 'uasAutopilotVersionHandler',
+        'BATTERY_STATUS' : 'uasDefaultMessageHandler',
+        'SCALED_IMU' : 'uasDefaultMessageHandler',
+        'RAW_IMU' : 'uasDefaultMessageHandler'
+    }
+    __handlerTables = {} # class -> {message type : function}
+
+    def __init__(self, name, systemId = 1, componentId = 1, parent = None):
         super().__init__(parent)
         self.uasName = name
+        self.systemId = systemId
+        self.componentId = componentId
         self.autopilotClass = mavlink.MAV_AUTOPILOT_GENERIC
         self.param = UserData.getInstance().getUserDataEntry(UD_UAS_CONF_KEY, {})
         self.onboardParameters = []
         self.oldOnboardParameters = []
-        self.onboardParamNotReceived = 0
-        self.messageHandlers = {}
-        self.messageHandlers['SYS_STATUS'] = self.uasStatusHandler
-        self.messageHandlers['GPS_RAW_INT'] = self.uasLocationHandler
-        self.messageHandlers['GLOBAL_POSITION_INT'] = self.uasFilteredLocationHandler
-        self.messageHandlers['SCALED_PRESSURE'] = self.uasAltitudeHandler
-        self.messageHandlers['ATTITUDE'] = self.uasAttitudeHandler
-        self.messageHandlers['GPS_STATUS'] = self.uasGPSStatusHandler
-        self.messageHandlers['RADIO_STATUS'] = self.uasRadioStatusHandler
-        self.messageHandlers['RC_CHANNELS'] = self.uasRCChannelsHandler
-        self.messageHandlers['NAV_CONTROLLER_OUTPUT'] = self.uasNavigationControllerOutputHandler
-        self.messageHandlers['LOCAL_POSITION_NED'] = self.uasDefaultMessageHandler
-        self.messageHandlers['PARAM_VALUE'] = self.uasDefaultMessageHandler
-        self.messageHandlers['HEARTBEAT'] = self.uasDefaultMessageHandler
-        self.messageHandlers['ATTITUDE_QUATERNION'] = self.uasDefaultMessageHandler
-        self.messageHandlers['SYSTEM_TIME'] = self.uasDefaultMessageHandler
-        self.messageHandlers['VFR_HUD'] = self.uasDefaultMessageHandler
-        self.messageHandlers['AUTOPILOT_VERSION'] = self.uasDefaultMessageHandler
-        self.messageHandlers['BATTERY_STATUS'] = self.uasDefaultMessageHandler
-        self.messageHandlers['SCALED_IMU'] = self.uasDefaultMessageHandler
-        self.messageHandlers['RAW_IMU'] = self.uasDefaultMessageHandler
+        self.parameterSync = ParameterSync(self.mavlinkMessageTxSignal.emit,
+                                           UserData.getParameterValue(self.param, UD_UAS_CONF_PARAM_QUIET_PERIOD_KEY,
+                                                                      DEFAULT_PARAM_QUIET_PERIOD),
+                                           UserData.getParameterValue(self.param, UD_UAS_CONF_PARAM_BURST_KEY,
+                                                                      DEFAULT_PARAM_BURST),
+                                           UserData.getParameterValue(self.param, UD_UAS_CONF_PARAM_RETRIES_KEY,
+                                                                      DEFAULT_PARAM_RETRIES),
+                                           self.__createParameterCache())
+        self.parameterSync.finishedSignal.connect(self.__acceptParameterSync)
+        self.parameterSync.verifiedSignal.connect(self.__acceptParameterVerification)
+        self.parameterUploader = ParameterUploader(self.mavlinkMessageTxSignal.emit,
+                                                   UserData.getParameterValue(self.param, UD_UAS_CONF_PARAM_SET_TIMEOUT_KEY,
+                                                                              DEFAULT_PARAM_SET_TIMEOUT),
+                                                   UserData.getParameterValue(self.param, UD_UAS_CONF_PARAM_SET_WINDOW_KEY,
+                                                                              DEFAULT_PARAM_SET_WINDOW),
+                                                   UserData.getParameterValue(self.param, UD_UAS_CONF_PARAM_RETRIES_KEY,
+                                                                              DEFAULT_PARAM_RETRIES))
+        self.messageHandlers = self.handlerTable()
         self.altitudeReference = DEFAULT_ALTITUDE_REFERENCE
         self.pressureReference = DEFAULT_PRESSURE_REFERENCE
         self.signingKey = None
         self.initialTimestamp = 0
+        self.state = VehicleState()
+        self.unknownMessageTypes = set()
+
+    @classmethod
+    def handlerTable(cls):
+        '''
+        Message type -> handler function of this class, built once and shared
+        by all instances instead of a dictionary of bound methods per vehicle.
+        Call as `table[tp](uas, msg)`.
+        '''
+        table = UASInterface.__handlerTables.get(cls)
+        if table == None:
+            table = {tp : getattr(cls, name) for tp, name in cls.MESSAGE_HANDLERS.items()}
+            UASInterface.__handlerTables[cls] = table
+        return table
+
+    def vehicleName(self):
+        return 'System {}:{}'.format(self.systemId, self.componentId)
 
     def receiveMAVLinkMessage(self, msg):
         tp = msg.get_type()
-        if tp in self.messageHandlers:
-            self.messageHandlers[tp](msg)
+        handler = self.messageHandlers.get(tp)
+        if handler != None:
+            handler(self, msg)
         else:
-            print('UNKNOWN MSG:', msg)
+            if tp not in self.unknownMessageTypes:
+                # once per type, unhandled messages usually arrive at a steady rate
+                self.unknownMessageTypes.add(tp)
+                logger.info('Unhandled message type: %s', msg)
+
+    def notifyStateChanged(self):
+        '''
+        Emit stateChangedSignal once for all the domains changed since the
+        previous call, called after each batch of dispatched messages.
+        '''
+        dirty = self.state.takeDirty()
+        if dirty != 0:
+            self.stateChangedSignal.emit(self, dirty)
+
+    def applyState(self, sinceRevision, handlers):
+        '''
+        Call `handlers[domain](self, record)` for every domain changed after `sinceRevision`,
+        return the revision to pass to the next call.
+        '''
+        changed = self.state.changedSince(sinceRevision)
+        if changed != 0:
+            records = self.state.records
+            for domain, handler in handlers.items():
+                if changed & domain:
+                    handler(self, records[domain])
+        return self.state.revision
 
     def setPressureAltitudeReference(self, presRef, altiRef):
         self.altitudeReference = altiRef
@@ -122,6 +184,9 @@ class UASInterface(QObject):
     def uasDefaultMessageHandler(self, msg):
         pass
 
+    def uasAutopilotVersionHandler(self, msg):
+        self.parameterSync.acceptAutopilotVersion(msg)
+
     def __backupOnboardParameters(self, dest, src):
         '''
         Copy parameters from `src` to `dest`,
@@ -142,13 +207,33 @@ class UASInterface(QObject):
         # copy oldOnboardParameters to onboardParameters
         self.__backupOnboardParameters(self.onboardParameters, self.oldOnboardParameters)
 
+    def updateOnboardParameter(self, msg):
+        '''Replace the value of a parameter received outside of a download, e.g. after PARAM_SET'''
+        for i, param in enumerate(self.onboardParameters):
+            if param.param_id == msg.param_id:
+                self.onboardParameters[i] = msg
+                return
+        self.onboardParameters.append(msg)
+
+    def __acceptParameterSync(self, success, text):
+        unused(text)
+        params = self.parameterSync.parameters()
+        if success or len(params) > 0:
+            self.onboardParameters[:] = params
+
+    def __acceptParameterVerification(self, changed, text):
+        unused(text)
+        if changed:
+            self.onboardParameters[:] = self.parameterSync.parameters()
+
+    def __createParameterCache(self):
+        confDir = UserData.getInstance().confDir
+        if confDir == None or UserData.getParameterValue(self.param, UD_UAS_CONF_PARAM_CACHE_KEY, True) == False:
+            return None
+        return ParameterCache(os.path.join(confDir, PARAM_CACHE_DIRECTORY))
+
     def getPressureAltitude(self, pressure, temperature):
-        try:
-            kelvin = temperature - ZERO_KELVIN
-            altitude = self.altitudeReference - (UNIVERSAL_GAS_CONSTANT * kelvin) * log(pressure / self.pressureReference) / (gravity * MOLAR_MASS)
-            return altitude
-        except ValueError:
-            return 0
+        return float(pressureAltitude(pressure, temperature, self.pressureReference, self.altitudeReference))
 
     def acceptMessageSigningKey(self, key, ts):
         key0 = self.signingKey
@@ -176,90 +261,191 @@ class StandardMAVLinkInterface(UASInterface):
 
     DEFAULT_GPS_SRC = 'GPS_RAW_INT'
 
-    def __init__(self, name, parent = None):
-        super().__init__(name, parent)
+    def __init__(self, name, systemId = 1, componentId = 1, parent = None):
+        super().__init__(name, systemId, componentId, parent)
         self.gpsSrc = UserData.getParameterValue(self.param, UD_UAS_CONF_GPS_SRC_KEY, StandardMAVLinkInterface.DEFAULT_GPS_SRC)
 
     def uasStatusHandler(self, msg):
-        self.updateBatterySignal.emit(self, 0, msg.voltage_battery / 1000.0, msg.current_battery / 1000.0, msg.battery_remaining)
+        battery = self.state.battery
+        battery.voltage, battery.current = convertMessage(msg)
+        battery.percent = msg.battery_remaining
+        self.state.touch(battery)
 
     def uasLocationHandler(self, msg):
         if (self.gpsSrc == msg.get_type()):
-            self.updateGlobalPositionSignal.emit(self, msg.time_usec, msg.lat / MAVLINK_LXTITUDE_SCALE, msg.lon / MAVLINK_LXTITUDE_SCALE, msg.alt / 1000.0)
-            self.updateGPSAltitudeSignal.emit(self, msg.time_usec, msg.alt / 1000.0) # mm -> meter
+            position = self.state.position
+            position.lat, position.lng, position.altitude, speed, _, _ = convertMessage(msg)
             if msg.vel != UINT16_MAX:
-                self.updateGroundSpeedSignal.emit(self, msg.time_usec, msg.vel / 100 * 3.6)  # cm/s to km/h
-        self.updateGPSStatusSignal.emit(self, msg.time_usec, msg.fix_type, msg.eph, msg.epv, msg.satellites_visible, 0, 0, 0, 0)
+                position.groundSpeed = speed
+            position.timestamp = msg.time_usec
+            self.state.touch(position)
+        gps = self.state.gps
+        gps.timestamp = msg.time_usec
+        gps.fixType = msg.fix_type
+        gps.hdop = msg.eph
+        gps.vdop = msg.epv
+        gps.satellites = msg.satellites_visible
+        self.state.touch(gps)
 
     def uasFilteredLocationHandler(self, msg):
         if (self.gpsSrc == msg.get_type()):
-            self.updateGlobalPositionSignal.emit(self, msg.time_boot_ms, msg.lat / MAVLINK_LXTITUDE_SCALE, msg.lon / MAVLINK_LXTITUDE_SCALE, msg.alt / 1000.0)
-            self.updateGPSAltitudeSignal.emit(self, msg.time_boot_ms, msg.alt / 1000.0) # mm -> meter
-            vel = msg.vx * msg.vx
-            vel += msg.vy * msg.vy
-            vel += msg.vz * msg.vz
-            self.updateGroundSpeedSignal.emit(self, msg.time_boot_ms, sqrt(vel) / 100 * 3.6)  # cm/s to km/h
+            position = self.state.position
+            position.lat, position.lng, position.altitude, position.groundSpeed = convertMessage(msg)
+            position.timestamp = msg.time_boot_ms
+            self.state.touch(position)
 
     def uasAltitudeHandler(self, msg):
-        self.updateAirPressureSignal.emit(self, msg.time_boot_ms, msg.press_abs, msg.press_diff, msg.temperature)
-        alt = self.getPressureAltitude(msg.press_abs * 100, msg.temperature)  # hPa to Pa
-        self.updatePrimaryAltitudeSignal.emit(self, msg.time_boot_ms, alt)
+        air = self.state.air
+        air.timestamp = msg.time_boot_ms
+        air.absPressure = msg.press_abs
+        air.diffPressure = msg.press_diff
+        air.temperature = msg.temperature
+        air.altitude, = convertMessage(msg, pressureReference = self.pressureReference, altitudeReference = self.altitudeReference)
+        self.state.touch(air)
 
     def uasAttitudeHandler(self, msg):
-        self.updateAttitudeSignal.emit(self, msg.time_boot_ms, msg.roll, msg.pitch, msg.yaw)
+        attitude = self.state.attitude
+        attitude.timestamp = msg.time_boot_ms
+        attitude.roll = msg.roll
+        attitude.pitch = msg.pitch
+        attitude.yaw = msg.yaw
+        self.state.touch(attitude)
 
     def uasRadioStatusHandler(self, msg):
-        self.updateRCStatusSignal.emit(self, 0, msg.rssi, msg.noise, msg.rxerrors)
+        radio = self.state.radio
+        radio.rssi = msg.rssi
+        radio.noise = msg.noise
+        radio.errors = msg.rxerrors
+        self.state.touch(radio)
 
     def uasRCChannelsHandler(self, msg):
-        rcChannels = {}
-        for i in range(msg.chancount):
-            ch = 'chan{}_raw'.format(i + 1)
-            rcChannels[i + 1] = getattr(msg, ch)
-        self.updateRCChannelsSignal.emit(self, msg.time_boot_ms, msg.rssi, rcChannels)
+        rc = self.state.rc
+        rc.timestamp = msg.time_boot_ms
+        rc.rssi = msg.rssi
+        rc.channelCount = min(msg.chancount, RC_CHANNEL_COUNT)
+        channels = rc.channels
+        for i in range(rc.channelCount):
+            channels[i] = getattr(msg, RC_CHANNEL_FIELDS[i])
+        self.state.touch(rc)
 
     def uasGPSStatusHandler(self, msg):
         # can be used to view gps SNR
         pass
 
     def acceptOnboardParameter(self, msg):
-        self.onboardParameters.append(msg)
-        self.onboardParamNotReceived = msg.param_count - msg.param_index - 1
+        self.parameterUploader.acceptParameterValue(msg) # the echo of a PARAM_SET, a parameter all the same
+        if self.parameterSync.acceptParameterValue(msg) == False:
+            self.updateOnboardParameter(msg)
 
     def fetchAllOnboardParameters(self):
         self.resetOnboardParameterList()
-        self.mavlinkMessageTxSignal.emit(mavlink.MAVLink_param_request_list_message(255, 0))
+        self.parameterSync.start()
 
     def uasNavigationControllerOutputHandler(self, msg):
-        self.updateNavigationControllerOutputSignal.emit(self, msg.nav_roll, msg.nav_pitch, msg.nav_bearing, msg.target_bearing, msg.wp_dist)
+        navigation = self.state.navigation
+        navigation.desiredRoll = msg.nav_roll
+        navigation.desiredPitch = msg.nav_pitch
+        navigation.desiredHeading = msg.nav_bearing
+        navigation.targetBearing = msg.target_bearing
+        navigation.wpDist = msg.wp_dist
+        self.state.touch(navigation)
 
 class AutoQuadMAVLinkInterface(StandardMAVLinkInterface):
 
-    def __init__(self, name, parent = None):
-        super().__init__(name, parent)
+    def __init__(self, name, systemId = 1, componentId = 1, parent = None):
+        super().__init__(name, systemId, componentId, parent)
         self.autopilotClass = mavlink.MAV_AUTOPILOT_AUTOQUAD
 
     def uasLocationHandler(self, msg):
-        self.updateGlobalPositionSignal.emit(self, msg.time_usec, msg.lat / MAVLINK_LXTITUDE_SCALE, msg.lon / MAVLINK_LXTITUDE_SCALE, msg.alt / 1000.0)
-        self.updateGPSAltitudeSignal.emit(self, msg.time_usec, msg.alt / 1000.0) # mm -> meter
-        self.updateGPSStatusSignal.emit(self, msg.time_usec, msg.fix_type, UINT16_MAX, UINT16_MAX, msg.satellites_visible, int(msg.eph / 100), int(msg.epv / 100), 0, 0)
+        position = self.state.position
+        position.lat, position.lng, position.altitude, speed, hacc, vacc = convertMessage(msg)
         if msg.vel != UINT16_MAX:
-            self.updateGroundSpeedSignal.emit(self, msg.time_usec, msg.vel / 100 * 3.6)  # cm/s to km/h
+            position.groundSpeed = speed
+        position.timestamp = msg.time_usec
+        self.state.touch(position)
+        gps = self.state.gps
+        gps.timestamp = msg.time_usec
+        gps.fixType = msg.fix_type
+        gps.hdop = UINT16_MAX
+        gps.vdop = UINT16_MAX
+        gps.satellites = msg.satellites_visible
+        gps.hacc = int(hacc)
+        gps.vacc = int(vacc)
+        self.state.touch(gps)
 
 class UASInterfaceFactory:
-    UAS_INTERFACES = {}
 
     @staticmethod
-    def __initUas():
-        UASInterfaceFactory.UAS_INTERFACES[mavlink.MAV_AUTOPILOT_GENERIC] = StandardMAVLinkInterface('Generic MAVLink Interface')
-        UASInterfaceFactory.UAS_INTERFACES[mavlink.MAV_AUTOPILOT_AUTOQUAD] = AutoQuadMAVLinkInterface('AutoQuad MAVLink Interface')
-
-    @staticmethod
-    def getUASInterface(dialect):
-        if len(UASInterfaceFactory.UAS_INTERFACES) == 0:
-            UASInterfaceFactory.__initUas()
-        if dialect in UASInterfaceFactory.UAS_INTERFACES:
-            return UASInterfaceFactory.UAS_INTERFACES[dialect]
-        inst = UASInterfaceFactory.UAS_INTERFACES[mavlink.MAV_AUTOPILOT_GENERIC]
-        inst.autopilotClass = dialect
+    def createUASInterface(autopilot, systemId = 1, componentId = 1):
+        '''Return a new interface instance for the vehicle `systemId`:`componentId`'''
+        if autopilot == mavlink.MAV_AUTOPILOT_AUTOQUAD:
+            return AutoQuadMAVLinkInterface('AutoQuad MAVLink Interface', systemId, componentId)
+        inst = StandardMAVLinkInterface('Generic MAVLink Interface', systemId, componentId)
+        inst.autopilotClass = autopilot
         return inst
+
+class UASRegistry(QObject):
+    '''
+    The vehicles seen on one link, one UASInterface per (sysid, compid)
+    created on its first HEARTBEAT. All vehicles are served by the thread
+    dispatching the messages, nothing is allocated per vehicle besides
+    the interface itself.
+    '''
+
+    uasAddedSignal = pyqtSignal(object) # uas
+
+    # sent by the radio modems, not by a vehicle, handed to the active vehicle
+    LINK_MESSAGE_TYPES = ('RADIO_STATUS',)
+
+    def __init__(self, parent = None):
+        super().__init__(parent)
+        self.interfaces = {} # (sysid, compid) -> uas
+        self.routes = {} # (sysid, compid) -> uas, vehicles and the other components of their systems
+        self.activeUAS = None
+        self.pressureAltitudeReference = (DEFAULT_PRESSURE_REFERENCE, DEFAULT_ALTITUDE_REFERENCE)
+
+    def get(self, sysid, compid):
+        return self.interfaces.get((sysid, compid))
+
+    def allUAS(self):
+        return [self.interfaces[key] for key in sorted(self.interfaces)]
+
+    def createUAS(self, autopilot, sysid, compid):
+        uas = UASInterfaceFactory.createUASInterface(autopilot, sysid, compid)
+        uas.setPressureAltitudeReference(*self.pressureAltitudeReference)
+        self.interfaces[(sysid, compid)] = uas
+        # drop the cached routes of components, they may belong to the new vehicle
+        self.routes = dict(self.interfaces)
+        if self.activeUAS == None:
+            self.activeUAS = uas
+        self.uasAddedSignal.emit(uas)
+        return uas
+
+    def route(self, msg):
+        '''
+        Return the vehicle a message from a source without its own interface
+        belongs to, creating it if `msg` is the HEARTBEAT of an autopilot.
+        Messages of other components go to the vehicle of the same system.
+        '''
+        key = (msg.get_srcSystem(), msg.get_srcComponent())
+        uas = self.interfaces.get(key)
+        if uas != None:
+            return uas
+        tp = msg.get_type()
+        if tp == 'HEARTBEAT' and msg.type != mavlink.MAV_TYPE_GCS and msg.autopilot != mavlink.MAV_AUTOPILOT_INVALID:
+            return self.createUAS(msg.autopilot, *key)
+        if tp in UASRegistry.LINK_MESSAGE_TYPES:
+            return self.activeUAS
+        for (sysid, _), uas in sorted(self.interfaces.items()):
+            if sysid == key[0]:
+                self.routes[key] = uas
+                return uas
+        return None
+
+    def setActiveUAS(self, uas):
+        self.activeUAS = uas
+
+    def setPressureAltitudeReference(self, presRef, altiRef):
+        self.pressureAltitudeReference = (presRef, altiRef)
+        for uas in self.interfaces.values():
+            uas.setPressureAltitudeReference(presRef, altiRef)
@@ -0,0 +1,138 @@
+'''
+Conversion of raw MAVLink fields to the units shown by the GCS, from one
+table of conversions per message type, for two uses:
+
+convertArrays()   columns of a message type, e.g. from logexport.loadColumns(),
+                  converted to float64 numpy arrays in one call per quantity
+convertMessage()  one live message, converted to a tuple of floats
+
+Both apply the same operations in the same order to float64 values, and
+the functions beyond arithmetic are the numpy ones in both cases, so a
+value converted live is bit for bit the value converted from the log.
+The arithmetic conversions run on plain floats in the live path.
+'''
+from operator import attrgetter
+
+import numpy as np
+
+UINT16_MAX = 0xFFFF
+UNIVERSAL_GAS_CONSTANT = 8.3144598 # J/(mol·K)
+MOLAR_MASS = 0.0289644 # kg/mol
+gravity = 9.80665 # m/s2
+DEFAULT_ALTITUDE_REFERENCE = 0.0  # METER
+DEFAULT_PRESSURE_REFERENCE = 101325.0  # PA
+ZERO_KELVIN = -273.15 # degree
+HECTOPASCAL = 100.0 # Pa
+
+class Scale:
+    '''
+    value / divisor * multiplier, NaN for the `invalid` raw value if any.
+    Called with a number or an array.
+    '''
+
+    __slots__ = ('divisor', 'multiplier', 'invalid')
+
+    def __init__(self, divisor, multiplier = 1.0, invalid = None):
+        self.divisor = divisor
+        self.multiplier = multiplier
+        self.invalid = invalid
+
+    def __call__(self, value, **context):
+        if isinstance(value, np.ndarray):
+            converted = value.astype(np.float64) / self.divisor * self.multiplier
+            if self.invalid != None:
+                converted[value == self.invalid] = np.nan
+            return converted
+        if value == self.invalid:
+            return np.nan
+        return value / self.divisor * self.multiplier
+
+DEGREES_E7 = Scale(1E7) # degrees * 1e7 to degrees
+MILLIMETRES = Scale(1000.0) # mm to m
+MILLIVOLTS = Scale(1000.0) # mV to V
+BATTERY_CURRENT = Scale(1000.0)
+GPS_SPEED = Scale(100, 3.6, UINT16_MAX) # cm/s to km/h, UINT16_MAX if unknown
+GPS_ACCURACY = Scale(100) # cm to m
+
+def groundSpeed(vx, vy, vz, **context):
+    '''Norm of a velocity in cm/s, in km/h'''
+    return np.sqrt(vx * vx + vy * vy + vz * vz) / 100 * 3.6
+
+def pressureAltitude(pressure, temperature, pressureReference = DEFAULT_PRESSURE_REFERENCE,
+                     altitudeReference = DEFAULT_ALTITUDE_REFERENCE, **context):
+    '''
+    Altitude in m at the absolute `pressure` in Pa, from the altitude and
+    pressure of a reference point, 0 for a pressure not above 0
+    '''
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        kelvin = temperature - ZERO_KELVIN
+        altitude = altitudeReference - (UNIVERSAL_GAS_CONSTANT * kelvin) * np.log(pressure / pressureReference) / (gravity * MOLAR_MASS)
+    if isinstance(altitude, np.ndarray):
+        return np.where(pressure > 0, altitude, 0.0)
+    return altitude if pressure > 0 else 0.0
+
+def scaledPressureAltitude(pressAbs, temperature, **context):
+    '''pressureAltitude() of a pressure in hPa'''
+    return pressureAltitude(pressAbs * HECTOPASCAL, temperature, **context)
+
+# message type -> (quantity, raw fields, conversion), in the order of the converted tuple
+MESSAGE_CONVERSIONS = {
+    'GPS_RAW_INT' : (
+        ('lat', ('lat',), DEGREES_E7),
+        ('lng', ('lon',), DEGREES_E7),
+        ('altitude', ('alt',), MILLIMETRES),
+        ('groundSpeed', ('vel',), GPS_SPEED),
+        ('hacc', ('eph',), GPS_ACCURACY),
+        ('vacc', ('epv',), GPS_ACCURACY)
+    ),
+    'GLOBAL_POSITION_INT' : (
+        ('lat', ('lat',), DEGREES_E7),
+        ('lng', ('lon',), DEGREES_E7),
+        ('altitude', ('alt',), MILLIMETRES),
+        ('groundSpeed', ('vx', 'vy', 'vz'), groundSpeed)
+    ),
+    'SYS_STATUS' : (
+        ('voltage', ('voltage_battery',), MILLIVOLTS),
+        ('current', ('current_battery',), BATTERY_CURRENT)
+    ),
+    'SCALED_PRESSURE' : (
+        ('altitude', ('press_abs', 'temperature'), scaledPressureAltitude),
+    )
+}
+
+class MessageConverter:
+    '''The conversions of one message type, compiled for single messages'''
+
+    __slots__ = ('quantities', 'conversions')
+
+    def __init__(self, msgType):
+        table = MESSAGE_CONVERSIONS[msgType]
+        self.quantities = tuple(quantity for quantity, _, _ in table)
+        self.conversions = tuple((attrgetter(*fields), len(fields) > 1, conversion) for _, fields, conversion in table)
+
+    def convert(self, msg, **context):
+        values = []
+        for getter, multiple, conversion in self.conversions:
+            raw = getter(msg)
+            values.append(float(conversion(*raw, **context) if multiple else conversion(raw, **context)))
+        return tuple(values)
+
+CONVERTERS = {msgType : MessageConverter(msgType) for msgType in MESSAGE_CONVERSIONS}
+
+def convertMessage(msg, **context):
+    '''
+    The converted quantities of a live message, in the order of
+    MESSAGE_CONVERSIONS. `context` holds the references of conversions
+    such as pressureAltitude().
+    '''
+    return CONVERTERS[msg.get_type()].convert(msg, **context)
+
+def convertArrays(msgType, columns, **context):
+    '''Return {quantity: float64 array} from {raw field: array} of `msgType`'''
+    converted = {}
+    for quantity, fields, conversion in MESSAGE_CONVERSIONS[msgType]:
+        raw = [np.asarray(columns[field]) for field in fields]
+        if isinstance(conversion, Scale) == False:
+            raw = [column.astype(np.float64) for column in raw] # as the integers of a live message, without overflow
+        converted[quantity] = np.asarray(conversion(*raw, **context), dtype = np.float64)
+    return converted
@@ -1,3 +1,8 @@
+import struct
 
 def unused(*args):
     pass
+
+def toFloat32(value):
+    '''`value` rounded to a 32 bit float, as parameters are sent'''
+    return struct.unpack('<f', struct.pack('<f', value))[0]
@@ -0,0 +1,174 @@
+'''
+Latest state of a vehicle, one record per domain updated in place by the
+message handlers of its UASInterface:
+
+attitude     AttitudeState    ATTITUDE
+position     PositionState    GPS_RAW_INT or GLOBAL_POSITION_INT, per GPS_SRC
+gps          GPSState         GPS_RAW_INT
+battery      BatteryState     SYS_STATUS
+radio        RadioState       RADIO_STATUS
+rc           RCState          RC_CHANNELS
+air          AirState         SCALED_PRESSURE
+navigation   NavigationState  NAV_CONTROLLER_OUTPUT
+
+Each domain has a bit, STATE_*. A change is recorded with touch(), which
+stamps the domain with an increasing revision and marks it dirty. Readers
+either take the mask of the domains changed since their own revision
+with changedSince(), or receive the dirty mask of a whole dispatch tick
+from UASInterface.stateChangedSignal. The records are written and read
+in the GUI thread only.
+'''
+from array import array
+
+STATE_ATTITUDE = 1 << 0
+STATE_POSITION = 1 << 1
+STATE_GPS = 1 << 2
+STATE_BATTERY = 1 << 3
+STATE_RADIO = 1 << 4
+STATE_RC = 1 << 5
+STATE_AIR = 1 << 6
+STATE_NAVIGATION = 1 << 7
+STATE_DOMAIN_COUNT = 8
+STATE_ALL = (1 << STATE_DOMAIN_COUNT) - 1
+
+RC_CHANNEL_COUNT = 18
+NAN = float('nan')
+
+class AttitudeState:
+
+    __slots__ = ('timestamp', 'roll', 'pitch', 'yaw')
+    DOMAIN = STATE_ATTITUDE
+
+    def __init__(self):
+        self.timestamp = 0
+        self.roll = NAN # rad
+        self.pitch = NAN
+        self.yaw = NAN
+
+class PositionState:
+
+    __slots__ = ('timestamp', 'lat', 'lng', 'altitude', 'groundSpeed')
+    DOMAIN = STATE_POSITION
+
+    def __init__(self):
+        self.timestamp = 0
+        self.lat = NAN # degree
+        self.lng = NAN
+        self.altitude = NAN # m, from the GPS
+        self.groundSpeed = NAN # km/h, the last valid one
+
+class GPSState:
+
+    __slots__ = ('timestamp', 'fixType', 'hdop', 'vdop', 'satellites', 'hacc', 'vacc', 'velacc', 'hdgacc')
+    DOMAIN = STATE_GPS
+
+    def __init__(self):
+        self.timestamp = 0
+        self.fixType = 0
+        self.hdop = 0
+        self.vdop = 0
+        self.satellites = 0
+        self.hacc = 0
+        self.vacc = 0
+        self.velacc = 0
+        self.hdgacc = 0
+
+class BatteryState:
+
+    __slots__ = ('timestamp', 'voltage', 'current', 'percent')
+    DOMAIN = STATE_BATTERY
+
+    def __init__(self):
+        self.timestamp = 0
+        self.voltage = 0.0 # V
+        self.current = 0.0 # A
+        self.percent = 0
+
+class RadioState:
+
+    __slots__ = ('type', 'rssi', 'noise', 'errors')
+    DOMAIN = STATE_RADIO
+
+    def __init__(self):
+        self.type = 0 # local, remote
+        self.rssi = 0
+        self.noise = 0
+        self.errors = 0
+
+class RCState:
+
+    __slots__ = ('timestamp', 'rssi', 'channelCount', 'channels')
+    DOMAIN = STATE_RC
+
+    def __init__(self):
+        self.timestamp = 0
+        self.rssi = 0
+        self.channelCount = 0
+        self.channels = array('H', bytes(2 * RC_CHANNEL_COUNT)) # raw values, channel 1 first
+
+class AirState:
+
+    __slots__ = ('timestamp', 'absPressure', 'diffPressure', 'temperature', 'altitude')
+    DOMAIN = STATE_AIR
+
+    def __init__(self):
+        self.timestamp = 0
+        self.absPressure = NAN # hPa
+        self.diffPressure = NAN
+        self.temperature = 0
+        self.altitude = NAN # m, pressure altitude, the primary altitude
+
+class NavigationState:
+
+    __slots__ = ('desiredRoll', 'desiredPitch', 'desiredHeading', 'targetBearing', 'wpDist')
+    DOMAIN = STATE_NAVIGATION
+
+    def __init__(self):
+        self.desiredRoll = 0.0
+        self.desiredPitch = 0.0
+        self.desiredHeading = 0
+        self.targetBearing = 0
+        self.wpDist = 0
+
+class VehicleState:
+    '''The state records of one vehicle and the revisions of their domains'''
+
+    __slots__ = ('attitude', 'position', 'gps', 'battery', 'radio', 'rc', 'air', 'navigation',
+                 'records', 'revision', 'revisions', 'dirty')
+
+    def __init__(self):
+        self.attitude = AttitudeState()
+        self.position = PositionState()
+        self.gps = GPSState()
+        self.battery = BatteryState()
+        self.radio = RadioState()
+        self.rc = RCState()
+        self.air = AirState()
+        self.navigation = NavigationState()
+        # domain bit -> record
+        self.records = {r.DOMAIN : r for r in (self.attitude, self.position, self.gps, self.battery,
+                                               self.radio, self.rc, self.air, self.navigation)}
+        self.revision = 0
+        self.revisions = array('Q', bytes(8 * STATE_DOMAIN_COUNT)) # revision of the last change, by bit index
+        self.dirty = 0
+
+    def touch(self, record):
+        '''Record a change of `record`, call once its fields are written'''
+        self.revision += 1
+        domain = record.DOMAIN
+        self.revisions[domain.bit_length() - 1] = self.revision
+        self.dirty |= domain
+
+    def changedSince(self, revision):
+        '''Mask of the domains changed after `revision`, 0 to get all the domains ever written'''
+        changed = 0
+        for i, r in enumerate(self.revisions):
+            if r > revision:
+                changed |= 1 << i
+        return changed
+
+    def takeDirty(self):
+        '''Return and clear the mask of the domains changed since the previous call'''
+        dirty = self.dirty
+        self.dirty = 0
+        return dirty
@@ -1,3 +1,5 @@
+from math import nan
+
 from pymavlink.mavutil import mavlink
 from PyQt5.QtCore import QObject, QPoint, QRect, Qt, QVariant, pyqtSignal
 from PyQt5.QtGui import (QCursor, QDoubleValidator, QIntValidator, QPalette,
@@ -19,6 +21,7 @@ class Waypoint(QObject):
         self.longitude = longitude
         self.altitude = altitude
         self.waypointType = waypointType
+        self.frame = mavlink.MAV_FRAME_GLOBAL  # of the position in params 5 to 7
         self.mavlinkParameters = {}
         if self.waypointType in (mavlink.MAV_CMD_NAV_LAND_LOCAL, mavlink.MAV_CMD_NAV_TAKEOFF_LOCAL):
             self.mavlinkParameters[MAVWaypointParameter.PARAM5] = 0.0
@@ -44,28 +47,15 @@ class Waypoint(QObject):
     def copy(self):
         c = Waypoint(self.rowNumber, self.latitude, self.longitude, self.altitude, self.parent())
         c.waypointType = self.waypointType
+        c.frame = self.frame
         return c
 
-    def toMavlinkMessage(self, sysId, compId, seq, current = 0, autocontinue = 0):
-        item = mavlink.MAVLink_mission_item_message(
-            sysId, compId, seq, mavlink.MAV_FRAME_GLOBAL,
-            self.waypointType, current, autocontinue,
-            Waypoint.defaultParameterValue(self.waypointType, MAVWaypointParameter.PARAM1) \
-                if MAVWaypointParameter.PARAM1 not in self.mavlinkParameters \
-                else self.mavlinkParameters[MAVWaypointParameter.PARAM1],
-            Waypoint.defaultParameterValue(self.waypointType, MAVWaypointParameter.PARAM2) \
-                if MAVWaypointParameter.PARAM2 not in self.mavlinkParameters \
-                else self.mavlinkParameters[MAVWaypointParameter.PARAM2],
-            Waypoint.defaultParameterValue(self.waypointType, MAVWaypointParameter.PARAM3) \
-                if MAVWaypointParameter.PARAM3 not in self.mavlinkParameters \
-                else self.mavlinkParameters[MAVWaypointParameter.PARAM3],
-            Waypoint.defaultParameterValue(self.waypointType, MAVWaypointParameter.PARAM4) \
-                if MAVWaypointParameter.PARAM4 not in self.mavlinkParameters \
-                else self.mavlinkParameters[MAVWaypointParameter.PARAM4],
-            self.mavlinkParameters[MAVWaypointParameter.PARAM5],
-            self.mavlinkParameters[MAVWaypointParameter.PARAM6],
-            self.mavlinkParameters[MAVWaypointParameter.PARAM7])
-        return item
+    def parameterValue(self, param):
+        '''The value of `param` set for this waypoint, or the default of its type (NaN if none)'''
+        if param in self.mavlinkParameters:
+            return self.mavlinkParameters[param]
+        value = Waypoint.defaultParameterValue(self.waypointType, param)
+        return nan if value == None else value
 
     @staticmethod
     def defaultParameterValue(wpType, param):